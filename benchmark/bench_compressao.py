@@ -0,0 +1,205 @@
+"""
+Benchmark da compressão dos estados (snapshot_codec.py), sem sockets e sem threads.
+
+Gera sequências reais de estados com a lógica do servidor (game_tick, com as
+raquetes dos traços sintéticos do bench_fisica) e passa a sequência de cada jogo
+por cada variante de compressão, como uma conexão recebendo os estados em ordem:
+  - bytes por estado e razão em relação ao pickle puro
+  - µs para comprimir e para descomprimir um estado
+  - bytes alocados pelo contexto de compressão de uma conexão (via tracemalloc)
+
+As variantes sem contexto comprimem cada estado isoladamente, para separar o ganho
+do dicionário do ganho da janela com os estados anteriores. Os resultados são
+salvos em JSON para comparação entre commits.
+"""
+
+import argparse
+import json
+import os
+import pickle
+import platform
+import sys
+import time
+import tracemalloc
+import zlib
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import server
+import snapshot_codec
+from bench_fisica import RESULTS_DIR, _apply_inputs, _new_games
+from build_info import git_commit
+
+DEFAULT_GAMES = 20
+DEFAULT_TICKS = 600
+
+class _Identity:
+    """Sem compressão: o pickle puro que o servidor manda hoje"""
+    def compress(self, data: bytes):
+        return data
+
+    def decompress(self, data: bytes):
+        return data
+
+class _ZlibFrame:
+    """zlib em cada estado isolado, com ou sem o dicionário"""
+    def __init__(self, zdict: bytes = None):
+        self.zdict = zdict
+
+    def compress(self, data: bytes):
+        if self.zdict is None:
+            return zlib.compress(data, snapshot_codec.ZLIB_LEVEL)
+        context = zlib.compressobj(snapshot_codec.ZLIB_LEVEL, zdict=self.zdict)
+        return context.compress(data) + context.flush()
+
+    def decompress(self, data: bytes):
+        if self.zdict is None:
+            return zlib.decompress(data)
+        context = zlib.decompressobj(zdict=self.zdict)
+        return context.decompress(data) + context.flush()
+
+class _ZstdFrame:
+    """zstd com o dicionário em cada estado isolado"""
+    def __init__(self):
+        dictionary = snapshot_codec._zstd_dictionary()
+        self.compressor = snapshot_codec.zstandard.ZstdCompressor(
+            level=snapshot_codec.ZSTD_LEVEL, dict_data=dictionary)
+        self.decompressor = snapshot_codec.zstandard.ZstdDecompressor(dict_data=dictionary)
+
+    def compress(self, data: bytes):
+        return self.compressor.compress(data)
+
+    def decompress(self, data: bytes):
+        return self.decompressor.decompress(data)
+
+class _Stream:
+    """Contexto persistente de uma conexão, exatamente como o servidor e o cliente usam"""
+    def __init__(self, codec: str):
+        self.compressor = snapshot_codec.Compressor(codec)
+        self.decompressor = snapshot_codec.Decompressor(codec)
+
+    def compress(self, data: bytes):
+        return self.compressor.compress(data)
+
+    def decompress(self, data: bytes):
+        return self.decompressor.decompress(data)
+
+# Variantes: cada uma cria o par compressor/descompressor de uma conexão
+VARIANTS = {
+    "nenhum": _Identity,
+    "zlib": _ZlibFrame,
+    "zlib+dic": lambda: _ZlibFrame(snapshot_codec.SNAPSHOT_DICTIONARY),
+    "zlib+contexto": lambda: _Stream(snapshot_codec.ZLIB_CODEC),
+}
+if snapshot_codec.zstandard:
+    VARIANTS["zstd+dic"] = _ZstdFrame
+    VARIANTS["zstd+contexto"] = lambda: _Stream(snapshot_codec.ZSTD_CODEC)
+
+def generate_snapshots(num_games: int, num_ticks: int):
+    """Sequência de estados serializados de cada jogo, como encoded_state os produz"""
+    games = _new_games(num_games)
+    for index, game in enumerate(games):
+        game.set_player_name(0, f"Jogador{index}")
+        game.set_player_name(1, f"Fulano{index}")
+    sequences = [[] for _ in games]
+    for tick in range(num_ticks):
+        _apply_inputs(games, tick)
+        for game, sequence in zip(games, sequences):
+            server.game_tick(game)
+            sequence.append(pickle.dumps(game.state.copy()))
+    return sequences
+
+def run_variant(name: str, sequences):
+    """Passa a sequência de cada jogo por uma conexão nova da variante e mede"""
+    factory = VARIANTS[name]
+    raw_bytes = wire_bytes = frames = 0
+    compress_ns = decompress_ns = 0
+    for sequence in sequences:
+        connection = factory()
+        for snapshot in sequence:
+            start = time.perf_counter_ns()
+            packed = connection.compress(snapshot)
+            middle = time.perf_counter_ns()
+            unpacked = connection.decompress(packed)
+            decompress_ns += time.perf_counter_ns() - middle
+            compress_ns += middle - start
+            if unpacked != snapshot:
+                raise AssertionError(f"{name}: estado diferente depois de descomprimir")
+            raw_bytes += len(snapshot)
+            wire_bytes += len(packed)
+            frames += 1
+
+    # Memória do contexto de uma conexão depois do primeiro estado
+    tracemalloc.start()
+    try:
+        connection = factory()
+        connection.compress(sequences[0][0])
+        context_bytes, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "variante": name,
+        "estados": frames,
+        "bytes_por_estado": wire_bytes / frames,
+        "razao": raw_bytes / wire_bytes,
+        "us_comprimir": compress_ns / frames / 1000,
+        "us_descomprimir": decompress_ns / frames / 1000,
+        "bytes_contexto": context_bytes,
+    }
+
+def compare(current: dict, baseline_path: str):
+    """Imprime a variação de bytes e de µs para comprimir em relação a um resultado salvo."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    reference = {r["variante"]: r for r in baseline["resultados"]}
+    print(f"\nComparação com {baseline_path} (commit {baseline.get('commit')}):")
+    for result in current["resultados"]:
+        old = reference.get(result["variante"])
+        if not old:
+            continue
+        print(f"  {result['variante']:>14} | {old['bytes_por_estado']:>6.1f} -> {result['bytes_por_estado']:>6.1f} B | "
+              f"{old['us_comprimir']:>6.1f} -> {result['us_comprimir']:>6.1f} µs")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da compressão dos estados do servidor Air Hockey")
+    parser.add_argument("--jogos", type=int, default=DEFAULT_GAMES, help="Jogos (uma conexão por jogo)")
+    parser.add_argument("--quadros", type=int, default=DEFAULT_TICKS, help="Estados por jogo")
+    parser.add_argument("--variantes", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--saida", help="Arquivo JSON de saída (padrão: benchmark/resultados/)")
+    parser.add_argument("--comparar", help="JSON de um resultado anterior para comparação")
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "compressao",
+        "commit": git_commit(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "dicionario": snapshot_codec.DICTIONARY_ID,
+        "dicionario_zstd": snapshot_codec.ZSTD_DICTIONARY_ID,
+        "resultados": [],
+    }
+
+    sequences = generate_snapshots(args.jogos, args.quadros)
+    print(f"{'variante':>14} | {'B/estado':>8} | {'razão':>6} | {'µs comp':>7} | {'µs desc':>7} | {'B contexto':>10}")
+    for name in args.variantes:
+        result = run_variant(name, sequences)
+        report["resultados"].append(result)
+        print(f"{name:>14} | {result['bytes_por_estado']:>8.1f} | {result['razao']:>6.2f} | "
+              f"{result['us_comprimir']:>7.1f} | {result['us_descomprimir']:>7.1f} | {result['bytes_contexto']:>10}")
+
+    output = args.saida
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"bench_compressao_{report['commit']}_{timestamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados salvos em: {output}")
+
+    if args.comparar:
+        compare(report, args.comparar)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark da física do servidor, sem sockets e sem threads.
+
+Executa a lógica de um quadro do servidor (game_tick) para N jogos x M quadros,
+com raquetes controladas por traços sintéticos, e mede:
+  - ns por jogo-quadro
+  - blocos de memória líquidos por jogo-quadro (detecta vazamentos)
+  - pico de bytes alocados em um quadro de todos os jogos (via tracemalloc, em uma
+    passada separada). O pico não é dividido pelo número de jogos: a memória de um
+    jogo é liberada antes do próximo, então o pico não cresce com N.
+
+Os resultados são salvos em JSON para comparação entre commits.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import server
+from build_info import git_commit
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+
+DEFAULT_GAMES = [1, 10, 100, 1000]
+DEFAULT_TICKS = 600
+
+# Motores de física disponíveis: cada um avança todos os jogos em um quadro.
+# Motores alternativos devem ser registrados aqui com a mesma assinatura.
+def _engine_padrao(games):
+    for game in games:
+        server.game_tick(game)
+
+ENGINES = {
+    "padrao": _engine_padrao,
+}
+
+def _paddle_trace(game_index: int, player_id: int, tick: int, ball_x: float):
+    """
+    Traço sintético da raquete: metade dos jogadores segue a bola com um pequeno
+    erro, a outra metade oscila em uma senoide (e eventualmente deixa a bola passar).
+    """
+    if (game_index + player_id) % 2 == 0:
+        offset = 40 * math.sin(tick / 15 + game_index)
+        x = ball_x - server.PADDLE_WIDTH / 2 + offset
+    else:
+        amplitude = (server.WIDTH - server.PADDLE_WIDTH) / 2
+        x = amplitude + amplitude * math.sin(tick / 40 + game_index + player_id)
+    return max(0, min(server.WIDTH - server.PADDLE_WIDTH, int(x)))
+
+def _new_games(num_games: int):
+    """
+    Cria jogos já em andamento (contagem zerada). connected_players fica em 0
+    para não imprimir o vencedor de cada partida durante a medição.
+    """
+    games = []
+    for i in range(num_games):
+        game = server.Game(f"bench_{i}")
+        game.state["countdown"] = 0
+        game.state["game_started"] = True
+        games.append(game)
+    return games
+
+def _apply_inputs(games, tick: int):
+    """Atualiza as raquetes e reinicia partidas terminadas. Retorna o número de reinícios."""
+    restarts = 0
+    for index, game in enumerate(games):
+        if game.state["winner_id"] is not None:
+            game.reset_game()
+            game.state["countdown"] = 0
+            game.state["game_started"] = True
+            restarts += 1
+        ball_x = game.state["ball"].centerx
+        for player_id, paddle in enumerate(game.state["paddles"]):
+            paddle.x = _paddle_trace(index, player_id, tick, ball_x)
+    return restarts
+
+def run_case(engine_name: str, num_games: int, num_ticks: int):
+    """Mede um caso (N jogos x M quadros) e retorna um dicionário com os resultados."""
+    step = ENGINES[engine_name]
+    pairs = num_games * num_ticks
+
+    # Passada 1: tempo e blocos líquidos (sem tracemalloc, que distorce o tempo)
+    games = _new_games(num_games)
+    restarts = 0
+    step_ns = 0
+    blocks_before = sys.getallocatedblocks()
+    for tick in range(num_ticks):
+        restarts += _apply_inputs(games, tick)
+        start = time.perf_counter_ns()
+        step(games)
+        step_ns += time.perf_counter_ns() - start
+    blocks_after = sys.getallocatedblocks()
+
+    # Passada 2: pico de memória alocada dentro do passo da física, quadro a quadro
+    games = _new_games(num_games)
+    peaks = []
+    tracemalloc.start()
+    try:
+        for tick in range(num_ticks):
+            _apply_inputs(games, tick)
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            step(games)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - base)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "engine": engine_name,
+        "games": num_games,
+        "ticks": num_ticks,
+        "ns_por_jogo_quadro": step_ns / pairs,
+        "quadros_por_segundo_por_nucleo": pairs / (step_ns / 1e9) if step_ns else 0,
+        "blocos_liquidos_por_jogo_quadro": (blocks_after - blocks_before) / pairs,
+        "pico_bytes_por_quadro": max(peaks, default=0),
+        "pico_bytes_medio_por_quadro": sum(peaks) / num_ticks if num_ticks else 0,
+        "reinicios": restarts,
+    }
+
+def compare(current: dict, baseline_path: str):
+    """Imprime a variação de ns/jogo-quadro em relação a um resultado salvo."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    reference = {(r["engine"], r["games"]): r for r in baseline["resultados"]}
+    print(f"\nComparação com {baseline_path} (commit {baseline.get('commit')}):")
+    for result in current["resultados"]:
+        old = reference.get((result["engine"], result["games"]))
+        if not old:
+            continue
+        delta = (result["ns_por_jogo_quadro"] / old["ns_por_jogo_quadro"] - 1) * 100
+        print(f"  {result['engine']:>8} | {result['games']:>6} jogos | "
+              f"{old['ns_por_jogo_quadro']:>9.0f} -> {result['ns_por_jogo_quadro']:>9.0f} ns ({delta:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da física do servidor Air Hockey")
+    parser.add_argument("--jogos", type=int, nargs="+", default=DEFAULT_GAMES,
+                        help="Quantidades de jogos simultâneos (curva de escala)")
+    parser.add_argument("--quadros", type=int, default=DEFAULT_TICKS, help="Quadros por caso")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--saida", help="Arquivo JSON de saída (padrão: benchmark/resultados/)")
+    parser.add_argument("--comparar", help="JSON de um resultado anterior para comparação")
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "fisica",
+        "commit": git_commit(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "resultados": [],
+    }
+
+    print(f"{'engine':>8} | {'jogos':>6} | {'ns/jogo-quadro':>14} | {'blocos/jq':>9} | {'pico B/quadro':>13}")
+    for engine_name in args.engines:
+        for num_games in args.jogos:
+            result = run_case(engine_name, num_games, args.quadros)
+            report["resultados"].append(result)
+            print(f"{engine_name:>8} | {num_games:>6} | {result['ns_por_jogo_quadro']:>14.0f} | "
+                  f"{result['blocos_liquidos_por_jogo_quadro']:>9.3f} | {result['pico_bytes_por_quadro']:>13}")
+
+    output = args.saida
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"bench_fisica_{report['commit']}_{timestamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados salvos em: {output}")
+
+    if args.comparar:
+        compare(report, args.comparar)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark da inicialização do servidor, para nós criados pelo autoscaling.
+
+Inicia o servidor várias vezes em processos novos ("python -m server", que usa o
+bytecode em cache; "python server.py" compila o arquivo inteiro a cada início)
+e mede, a partir do fork:
+  - interpretador: um "python -c pass", o piso que nenhuma mudança no servidor reduz
+  - importacao: "python -c 'import server'" (interpretador + imports do servidor, com o
+    pygame completo: os módulos opcionais do pygame só são pulados no processo do servidor)
+  - escutando: até a porta aceitar conexões
+  - handshake: até o primeiro jogador receber a resposta do handshake (pronto para jogar)
+
+Com --importacoes mostra também os módulos que mais pesam no import do servidor
+(python -X importtime). Os resultados são salvos em JSON para comparação entre commits.
+"""
+
+import argparse
+import json
+import os
+import pickle
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_fisica import RESULTS_DIR
+from build_info import git_commit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_RUNS = 10
+POLL_INTERVAL = 0.001  # segundos entre tentativas de conectar
+STARTUP_TIMEOUT = 30.0
+TOP_IMPORTS = 10
+STAGES = ("interpretador", "importacao", "escutando", "handshake")
+
+def _free_port(host: str):
+    with socket.socket() as probe:
+        probe.bind((host, 0))
+        return probe.getsockname()[1]
+
+def _timed_run(args):
+    """Segundos de um processo Python do início ao fim"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=ROOT_DIR, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def _connect(host: str, port: int, deadline: float, process: subprocess.Popen):
+    """Tenta conectar até a porta aceitar; o servidor não pode morrer no caminho"""
+    while True:
+        try:
+            return socket.create_connection((host, port), timeout=STARTUP_TIMEOUT)
+        except ConnectionRefusedError:
+            if process.poll() is not None:
+                raise RuntimeError(f"servidor encerrou durante a inicialização (código {process.returncode})")
+            if time.perf_counter() > deadline:
+                raise RuntimeError("servidor não começou a escutar a tempo")
+            time.sleep(POLL_INTERVAL)
+
+def measure_server(host: str):
+    """(segundos até escutar, segundos até a resposta do primeiro handshake) de um processo novo"""
+    port = _free_port(host)
+    start = time.perf_counter()
+    # Configuração só pela linha de comando: sem .env, como num contêiner
+    process = subprocess.Popen([sys.executable, "-m", "server", "--sem-env", "--host", host, "--porta", str(port)],
+                               cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        conn = _connect(host, port, start + STARTUP_TIMEOUT, process)
+        listening = time.perf_counter() - start
+        with conn:
+            conn.sendall(pickle.dumps({"name": "Bench"}))
+            if not conn.recv(4096):
+                raise RuntimeError("servidor fechou a conexão no handshake")
+            handshake = time.perf_counter() - start
+    finally:
+        process.kill()
+        process.wait()
+    return listening, handshake
+
+def import_profile(top: int = TOP_IMPORTS):
+    """Módulos com o maior tempo acumulado de import no "import server" (µs)"""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"], cwd=ROOT_DIR,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True).stderr
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(cumulative)))
+    return sorted(modules, key=lambda item: item[1], reverse=True)[:top]
+
+def _summary(samples):
+    return {"mediana_ms": statistics.median(samples) * 1000, "min_ms": min(samples) * 1000,
+            "max_ms": max(samples) * 1000}
+
+def compare(current: dict, baseline_path: str):
+    """Imprime a variação da mediana de cada etapa em relação a um resultado salvo."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nComparação com {baseline_path} (commit {baseline.get('commit')}):")
+    for stage in STAGES:
+        old, new = baseline["etapas"].get(stage), current["etapas"][stage]
+        if old:
+            print(f"  {stage:>13} | {old['mediana_ms']:>7.1f} -> {new['mediana_ms']:>7.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da inicialização do servidor Air Hockey")
+    parser.add_argument("--execucoes", type=int, default=DEFAULT_RUNS, help="Processos iniciados por etapa")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--importacoes", action="store_true", help="Mostra os imports mais lentos do servidor")
+    parser.add_argument("--saida", help="Arquivo JSON de saída (padrão: benchmark/resultados/)")
+    parser.add_argument("--comparar", help="JSON de um resultado anterior para comparação")
+    args = parser.parse_args()
+
+    samples = {stage: [] for stage in STAGES}
+    for _ in range(args.execucoes):
+        samples["interpretador"].append(_timed_run(["-c", "pass"]))
+        samples["importacao"].append(_timed_run(["-c", "import server"]))
+        listening, handshake = measure_server(args.host)
+        samples["escutando"].append(listening)
+        samples["handshake"].append(handshake)
+
+    report = {
+        "benchmark": "inicio",
+        "commit": git_commit(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "execucoes": args.execucoes,
+        "etapas": {stage: _summary(values) for stage, values in samples.items()},
+    }
+    print(f"{'etapa':>13} | {'mediana':>9} | {'min':>9} | {'max':>9}")
+    for stage, summary in report["etapas"].items():
+        print(f"{stage:>13} | {summary['mediana_ms']:>6.1f} ms | {summary['min_ms']:>6.1f} ms | {summary['max_ms']:>6.1f} ms")
+
+    if args.importacoes:
+        report["importacoes_us"] = import_profile()
+        print("\nImports mais lentos (tempo acumulado):")
+        for name, cumulative in report["importacoes_us"]:
+            print(f"  {name:<40} {cumulative / 1000:>7.1f} ms")
+
+    output = args.saida
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"bench_inicio_{report['commit']}_{timestamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados salvos em: {output}")
+
+    if args.comparar:
+        compare(report, args.comparar)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Treina o dicionário do zstd usado na compressão dos estados (snapshot_codec.py).
+
+Grava os estados de partidas simuladas com a lógica do servidor (os mesmos de
+bench_compressao.py: game_tick com as raquetes dos traços sintéticos), treina um
+dicionário com zstandard.train_dictionary e salva em snapshot_dictionary.zstd, na
+raiz do repositório. Os jogos usados pelo bench_compressao ficam de fora do
+treino, para o benchmark não medir o dicionário nos próprios estados de treino.
+
+O zlib não usa dicionários treinados (o zdict é só conteúdo) e continua com o
+dicionário de estados típicos montado pelo snapshot_codec. Trocar o dicionário
+muda o nome do codec zstd: clientes e servidores precisam do mesmo arquivo.
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import snapshot_codec
+from bench_compressao import DEFAULT_GAMES as BENCH_GAMES, generate_snapshots
+
+DEFAULT_GAMES = 40
+DEFAULT_TICKS = 300
+DEFAULT_SIZE = 2048  # bytes; o contexto de uma conexão guarda só 2 KB (ZSTD_WINDOW_LOG)
+SAMPLE_EVERY = 5  # quadros seguidos são quase iguais: um estado a cada N quadros basta
+# Segmentos longos: cada estado tem ~300 bytes e muda pouco de um jogo para outro
+SEGMENT_SIZE, DMER_SIZE = 1024, 8
+
+def record_samples(num_games: int, num_ticks: int, seed: int = 0):
+    """Estados serializados dos jogos de treino, embaralhados"""
+    sequences = generate_snapshots(BENCH_GAMES + num_games, num_ticks)[BENCH_GAMES:]
+    samples = [snapshot for sequence in sequences for snapshot in sequence[::SAMPLE_EVERY]]
+    random.Random(seed).shuffle(samples)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Treina o dicionário zstd dos estados do servidor Air Hockey")
+    parser.add_argument("--jogos", type=int, default=DEFAULT_GAMES, help="Jogos simulados para o treino")
+    parser.add_argument("--quadros", type=int, default=DEFAULT_TICKS, help="Quadros por jogo")
+    parser.add_argument("--tamanho", type=int, default=DEFAULT_SIZE, help="Tamanho do dicionário (bytes)")
+    parser.add_argument("--saida", default=snapshot_codec.ZSTD_DICTIONARY_PATH, help="Arquivo do dicionário")
+    args = parser.parse_args()
+
+    zstandard = snapshot_codec.zstandard
+    if zstandard is None:
+        print("O treino precisa do pacote zstandard")
+        return
+
+    samples = record_samples(args.jogos, args.quadros)
+    # threads=0 e k/d fixos: o mesmo conjunto de estados sempre gera o mesmo dicionário
+    dictionary = zstandard.train_dictionary(args.tamanho, samples, k=SEGMENT_SIZE, d=DMER_SIZE,
+                                            threads=0, level=snapshot_codec.ZSTD_LEVEL)
+
+    # Comparação com o dicionário de estados típicos, comprimindo cada estado isolado
+    raw = zstandard.ZstdCompressionDict(snapshot_codec.SNAPSHOT_DICTIONARY,
+                                        dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    held_out = [snapshot for sequence in generate_snapshots(BENCH_GAMES, args.quadros) for snapshot in sequence]
+    for label, candidate in (("estados típicos", raw), ("treinado", dictionary)):
+        compressor = zstandard.ZstdCompressor(level=snapshot_codec.ZSTD_LEVEL, dict_data=candidate)
+        size = sum(len(compressor.compress(snapshot)) for snapshot in held_out) / len(held_out)
+        print(f"{label:>15}: {size:.1f} bytes por estado isolado")
+
+    with open(args.saida, "wb") as f:
+        f.write(dictionary.as_bytes())
+    print(f"\nDicionário de {len(dictionary.as_bytes())} bytes ({len(samples)} estados) salvo em: {args.saida}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""
+Identificação da versão do código nos resultados salvos pelos benchmarks
+(benchmark/) e pelos testes de carga (teste_carga_v1/), para comparar entre commits.
+"""
+import os
+import subprocess
+
+def git_commit():
+    """Hash curto do commit atual, ou "desconhecido" fora de um repositório git"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
@@ -4,6 +4,9 @@ from dotenv import load_dotenv
 import os
 import socket
 import pickle
+import threading
+import time
+from snapshot_codec import DecompressingReader, Decompressor, supported_codecs
 
 pygame.init()
 pygame.font.init()
@@ -19,6 +22,11 @@ GREEN_BTN = (0, 180, 0)
 PADDLE_SPEED = 12
 COLOR_INACTIVE = pygame.Color('lightskyblue3')
 COLOR_ACTIVE = pygame.Color('dodgerblue2')
+RECV_TIMEOUT = 5  # sem estado do servidor por esse tempo, a conexão é considerada perdida
+RECONNECT_TIMEOUT = 15  # mesmo prazo em que o servidor guarda a vaga
+TEXT_CACHE_SIZE = 256  # textos renderizados guardados (o cache é limpo quando enche)
+# Eventos em que a janela precisa ser redesenhada inteira (janela descoberta ou restaurada)
+EXPOSE_EVENTS = (pygame.VIDEOEXPOSE, getattr(pygame, "WINDOWEXPOSED", pygame.VIDEOEXPOSE))
 
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Cliente Air Hockey")
@@ -29,95 +37,156 @@ small_font = pygame.font.Font(None, 40)
 input_font = pygame.font.Font(None, 50)
 countdown_font = pygame.font.Font(None, 200)
 
+# Superfícies de texto já renderizadas, por (fonte, texto, cor)
+text_cache = {}
+
+def render_text(text_font, text, color=WHITE):
+    """font.render com cache: cada texto é rasterizado uma vez só"""
+    key = (text_font, text, color)
+    surface = text_cache.get(key)
+    if surface is None:
+        if len(text_cache) >= TEXT_CACHE_SIZE:
+            text_cache.clear()
+        surface = text_cache[key] = text_font.render(text, True, color)
+    return surface
+
+class Painter:
+    """
+    Desenha na janela atualizando só os retângulos sujos.
+    Cada quadro apaga o que foi desenhado no quadro anterior, desenha o novo
+    conteúdo e manda para a tela apenas esses retângulos, em vez de um flip da
+    tela inteira. Um quadro igual ao anterior não é redesenhado.
+    """
+    def __init__(self, win):
+        self.win = win
+        self.drawn = []  # retângulos desenhados no último quadro
+        self.dirty = []
+        self.last_frame = None
+        self.full = True  # próximo quadro redesenha e atualiza a janela inteira
+
+    def invalidate(self):
+        """A janela foi descoberta ou restaurada: redesenha tudo no próximo quadro"""
+        self.full = True
+
+    def begin(self, frame):
+        """
+        Começa um quadro descrito por frame (valores que definem o que aparece na tela).
+        Retorna False se nada mudou desde o último quadro.
+        """
+        if frame == self.last_frame and not self.full:
+            return False
+        self.last_frame = frame
+        if self.full:
+            self.win.fill(BLACK)
+        else:
+            for rect in self.drawn:
+                self.win.fill(BLACK, rect)
+        self.dirty = []
+        return True
+
+    def text(self, text_font, text, color=WHITE, **position):
+        surface = render_text(text_font, text, color)
+        self.dirty.append(self.win.blit(surface, surface.get_rect(**position)))
+
+    def rect(self, color, rect, width=0, border_radius=0):
+        self.dirty.append(pygame.draw.rect(self.win, color, rect, width, border_radius=border_radius))
+
+    def ellipse(self, color, rect):
+        self.dirty.append(pygame.draw.ellipse(self.win, color, rect))
+
+    def present(self):
+        if self.full:
+            pygame.display.flip()
+            self.full = False
+        else:
+            pygame.display.update(self.drawn + self.dirty)
+        self.drawn = self.dirty
+
+painter = Painter(screen)
+
 def draw_name_input_screen(win, text, input_box, ok_button, is_active):
     """Desenha a tela de entrada de nome"""
-    win.fill(BLACK)
+    if not win.begin(("nome", text, is_active)):
+        return
     
     # Prompt
-    prompt_surface = input_font.render("Digite seu nome:", True, WHITE)
-    prompt_rect = prompt_surface.get_rect(center=(WIDTH/2, HEIGHT/2 - 80))
-    win.blit(prompt_surface, prompt_rect)
+    win.text(input_font, "Digite seu nome:", center=(WIDTH/2, HEIGHT/2 - 80))
     
     # Input box
     color = COLOR_ACTIVE if is_active else COLOR_INACTIVE
-    pygame.draw.rect(win, color, input_box, 2)
+    win.rect(color, input_box, 2)
     
     # Texto digitado
-    text_surface = input_font.render(text, True, WHITE)
-    win.blit(text_surface, (input_box.x + 10, input_box.y + 10))
+    win.text(input_font, text, topleft=(input_box.x + 10, input_box.y + 10))
     
     # Botão OK
-    pygame.draw.rect(win, GREEN_BTN, ok_button, border_radius=10)
-    ok_text = small_font.render("OK", True, WHITE)
-    ok_rect = ok_text.get_rect(center=ok_button.center)
-    win.blit(ok_text, ok_rect)
+    win.rect(GREEN_BTN, ok_button, border_radius=10)
+    win.text(small_font, "OK", center=ok_button.center)
     
-    pygame.display.flip()
+    win.present()
+
+def draw_message_screen(win, message):
+    """Desenha uma tela com uma mensagem centralizada"""
+    if not win.begin(("mensagem", message)):
+        return
+    win.text(small_font, message, center=(WIDTH/2, HEIGHT/2))
+    win.present()
 
 def redraw_window(win, p1, p2, ball, winner, players_online, countdown_val, button, voted, opponent_name, no_opponent, player_id):
     """Desenha o estado atual do jogo"""
-    win.fill(BLACK)
+    frame = ("jogo", tuple(p1), tuple(p2), tuple(ball), winner, players_online, countdown_val,
+             voted, opponent_name, no_opponent, player_id)
+    if not win.begin(frame):
+        return
     
     # Jogo inativo por falta de oponente
     if no_opponent:
-        text = small_font.render("Seu oponente se desconectou. Inicie outra sessão.", True, WHITE)
-        text_rect = text.get_rect(center=(WIDTH/2, HEIGHT/2))
-        win.blit(text, text_rect)
+        win.text(small_font, "Seu oponente se desconectou. Inicie outra sessão.", center=(WIDTH/2, HEIGHT/2))
     
     # Aguardando jogadores
     elif players_online < 2:
-        text = small_font.render("Aguardando oponente...", True, WHITE)
-        text_rect = text.get_rect(center=(WIDTH/2, HEIGHT/2))
-        win.blit(text, text_rect)
+        win.text(small_font, "Aguardando oponente...", center=(WIDTH/2, HEIGHT/2))
     
     # Countdown
     elif countdown_val > 0:
         # Nome do oponente
         if opponent_name:
-            opponent_text = small_font.render(f"Oponente: {opponent_name}", True, WHITE)
-            opponent_rect = opponent_text.get_rect(center=(WIDTH/2, HEIGHT/2 + 150))
-            win.blit(opponent_text, opponent_rect)
+            win.text(small_font, f"Oponente: {opponent_name}", center=(WIDTH/2, HEIGHT/2 + 150))
         
         # Countdown
-        countdown_text = countdown_font.render(str(countdown_val), True, WHITE)
-        countdown_rect = countdown_text.get_rect(center=(WIDTH/2, HEIGHT/2))
-        win.blit(countdown_text, countdown_rect)
+        win.text(countdown_font, str(countdown_val), center=(WIDTH/2, HEIGHT/2))
     
     # Jogo iniciado
     elif countdown_val == 0 and not winner:
         # Cada jogador vê seu paddle embaixo
         if player_id == 0:
             # Jogador 0 - Seu paddle (p1) embaixo em azul
-            pygame.draw.rect(win, BLUE, p1)
+            win.rect(BLUE, p1)
             # O oponente (p2) em cima em vermelho
-            pygame.draw.rect(win, RED, p2)
-            pygame.draw.ellipse(win, WHITE, ball)
+            win.rect(RED, p2)
+            win.ellipse(WHITE, ball)
         else:
             # Inverte a visualização para o jogador 1
             my_paddle_inverted = pygame.Rect(p2.x, HEIGHT - 20 - PADDLE_HEIGHT, p2.width, p2.height)
             opponent_paddle_inverted = pygame.Rect(p1.x, 20, p1.width, p1.height)
             ball_inverted = pygame.Rect(ball.x, HEIGHT - ball.y - ball.height, ball.width, ball.height)   
             
-            pygame.draw.rect(win, RED, my_paddle_inverted)
-            pygame.draw.rect(win, BLUE, opponent_paddle_inverted)
-            pygame.draw.ellipse(win, WHITE, ball_inverted)
+            win.rect(RED, my_paddle_inverted)
+            win.rect(BLUE, opponent_paddle_inverted)
+            win.ellipse(WHITE, ball_inverted)
     
     # Tela de vitória
     if winner and not no_opponent:
-        winner_text = font.render(winner, True, WHITE)
-        winner_rect = winner_text.get_rect(center=(WIDTH/2, HEIGHT/2 - 50))
-        win.blit(winner_text, winner_rect)
+        win.text(font, winner, center=(WIDTH/2, HEIGHT/2 - 50))
         
         # Botão de reiniciar
         button_color = (150, 150, 0) if voted else (0, 150, 0)
-        pygame.draw.rect(win, button_color, button, border_radius=10)
+        win.rect(button_color, button, border_radius=10)
         
         button_text = "Aguardando..." if voted else "Revanche"
-        button_surface = small_font.render(button_text, True, WHITE)
-        button_rect = button_surface.get_rect(center=button.center)
-        win.blit(button_surface, button_rect)
+        win.text(small_font, button_text, center=button.center)
     
-    pygame.display.flip()
+    win.present()
 
 def get_winner_text(winner_id:int, player_id:int):
     """
@@ -131,45 +200,211 @@ def get_winner_text(winner_id:int, player_id:int):
     else:
         return "Você perdeu!"
 
+def initial_paddle(player_id: int):
+    """Raquete do jogador na posição inicial (jogador 0 embaixo, jogador 1 em cima)"""
+    return pygame.Rect(WIDTH/2 - PADDLE_WIDTH/2, 
+                       HEIGHT - 30 if player_id == 0 else 20, 
+                       PADDLE_WIDTH, PADDLE_HEIGHT)
+
+def connect_to_server(address, hello):
+    """
+    Conecta e faz o handshake: envia o nome ({"name": ...}) ou o token de uma
+    sessão ({"resume": ...}). Retorna (socket, leitor do socket, resposta do servidor).
+    As mensagens são lidas com pickle.load do leitor, que separa mensagens que
+    chegam juntas (a resposta do handshake e o primeiro estado, por exemplo).
+    Se o servidor aceitou um dos codecs oferecidos em hello["compress"], o leitor
+    descomprime tudo o que vem depois da resposta do handshake.
+    """
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(RECV_TIMEOUT)
+    try:
+        client_socket.connect(address)
+        client_socket.send(pickle.dumps(hello))
+        stream = client_socket.makefile("rb")
+        welcome = pickle.load(stream)
+        if welcome.get("compress"):
+            stream = DecompressingReader(stream, Decompressor(welcome["compress"]))
+    except Exception:
+        client_socket.close()
+        raise
+    return client_socket, stream, welcome
+
+class ServerConnection(threading.Thread):
+    """
+    Conversa com o servidor em uma thread própria, para a janela nunca esperar o recv.
+    O servidor manda um estado e espera a resposta; a thread guarda o último estado
+    recebido e responde quando a janela termina um quadro (frame_done), com a raquete
+    mais recente ou um comando pendente ("play_again", "quit"). Redirecionamentos do
+    lobby, vagas de torneio e a retomada da sessão depois de uma queda também são
+    tratados aqui; enquanto reconecta, status tem a mensagem para mostrar na tela.
+    """
+    def __init__(self, address, hello, client_socket, stream, welcome):
+        super().__init__(daemon=True)
+        self.address = address
+        self.hello = hello
+        self.socket, self.stream = client_socket, stream
+        self.lock = threading.Lock()
+        self.frame = threading.Event()
+        self.player_id = welcome["player_id"]
+        self.token = welcome["token"]
+        self.paddle = initial_paddle(self.player_id)
+        self.commands = []
+        self.state = None  # último estado do jogo recebido
+        self.status = None
+        self.finished = False
+
+    def latest(self):
+        """Último estado recebido (ou None), sem bloquear"""
+        with self.lock:
+            return self.state
+
+    def set_paddle(self, paddle, player_id: int):
+        """Raquete a mandar na próxima resposta; ignorada se o jogador acabou de mudar de vaga"""
+        with self.lock:
+            if player_id == self.player_id:
+                self.paddle = paddle.copy()
+
+    def send_command(self, command: str):
+        with self.lock:
+            self.commands.append(command)
+
+    def frame_done(self):
+        """A janela terminou um quadro: libera a resposta ao último estado"""
+        self.frame.set()
+
+    def close(self, quit: bool):
+        """Encerra a conexão; com quit o servidor libera a vaga sem esperar a reconexão"""
+        if quit and not self.finished:
+            self.send_command("quit")
+            self.frame.set()
+            self.join(1)
+        self.finished = True
+        self._disconnect()
+
+    def _disconnect(self):
+        # O socket só é fechado de verdade junto com o leitor; o shutdown acorda a thread no recv
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.stream.close()
+        self.socket.close()
+
+    def _reply(self):
+        """Responde ao último estado no próximo quadro da janela. Retorna False depois do quit."""
+        self.frame.wait(RECV_TIMEOUT)
+        self.frame.clear()
+        with self.lock:
+            message = self.commands.pop(0) if self.commands else self.paddle
+        self.socket.send(pickle.dumps(message))
+        return message != "quit"
+
+    def _open(self, address, hello):
+        """Troca a conexão atual por uma nova; retorna a resposta do handshake"""
+        self._disconnect()
+        self.address = address
+        self.socket, self.stream, welcome = connect_to_server(address, hello)
+        return welcome
+
+    def _take_seat(self, player_id: int, token=None):
+        with self.lock:
+            self.player_id, self.token = player_id, token
+            self.paddle = initial_paddle(player_id)
+
+    def _resume_hello(self, token: str):
+        """Handshake de retomada, com a mesma oferta de compressão do handshake original"""
+        hello = {"resume": token}
+        if "compress" in self.hello:
+            hello["compress"] = self.hello["compress"]
+        return hello
+
+    def _resume(self):
+        """
+        Tenta retomar a sessão no mesmo jogo até o prazo acabar.
+        Retorna False se não foi possível.
+        """
+        self.status = "Conexão perdida. Reconectando..."
+        deadline = time.time() + RECONNECT_TIMEOUT
+        while time.time() < deadline and not self.finished:
+            try:
+                welcome = self._open(self.address, self._resume_hello(self.token))
+            except (OSError, EOFError, pickle.UnpicklingError):
+                time.sleep(1)
+                continue
+            if "player_id" in welcome:
+                print("Sessão retomada")
+                self.status = None
+                return True
+            # A vaga expirou ou o jogo acabou
+            print(f"Não foi possível retomar a sessão: {welcome.get('error')}")
+            return False
+        return False
+
+    def run(self):
+        while not self.finished:
+            try:
+                message = pickle.load(self.stream)
+                if "redirect" in message:
+                    # Lobby: a partida foi criada em um nó; segue para lá com o token da vaga
+                    # (ou com o mesmo handshake, para torneios)
+                    address, token = tuple(message["redirect"]), message["token"]
+                    welcome = self._open(address, self._resume_hello(token) if token else self.hello)
+                    if "error" in welcome:
+                        # Reserva expirada ou partida recusada pelo nó
+                        print(f"Não foi possível começar a partida: {welcome['error']}")
+                        break
+                    self._take_seat(welcome["player_id"], welcome["token"])
+                    print(f"Partida no servidor {address[0]}:{address[1]}")
+                    continue
+                if "error" in message:
+                    print(f"Não foi possível começar a partida: {message['error']}")
+                    break
+                if "ball" not in message:
+                    # Torneio: o servidor avisa a vaga na próxima partida
+                    self._take_seat(message["player_id"])
+                    print(f"Próxima partida do torneio: {message['match']}")
+                else:
+                    with self.lock:
+                        self.state = message
+                if not self._reply():
+                    break
+            except (ConnectionError, EOFError, pickle.UnpicklingError, OSError) as e:
+                if self.finished:
+                    break
+                print(f"Erro de conexão: {e}")
+                # Tenta voltar para a mesma partida com um socket novo (torneios não têm retomada)
+                if not self.token or not self._resume():
+                    break
+            except Exception as e:
+                print(f"Erro geral: {e}")
+                break
+        self.finished = True
+
 def main():
     # Configuração de conexão
     load_dotenv()
     ip_address = os.getenv("SERVER_IP")
     port_number = int(os.getenv("SERVER_PORT"))
 
-    # TCP socket
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    
-    try:
-        client_socket.connect((ip_address, port_number))
-        print(f"Conectado ao servidor {ip_address}:{port_number}")
-    except Exception as e:
-        print(f"Erro de conexão: {e}")
-        pygame.quit()
-        sys.exit()
-    
-    # Recebe ID do jogador
-    try:
-        player_id = pickle.loads(client_socket.recv(2048))
-        print(f"Sou o jogador {player_id+1}")
-    except Exception as e:
-        print(f"Erro ao receber ID: {e}")
-        pygame.quit()
-        sys.exit()
-    
-    # Entrada de nome
+    # Entrada de nome (antes de conectar, para não segurar o handshake enquanto o jogador digita)
     player_name = ""
     input_box = pygame.Rect(WIDTH/2 - 200, HEIGHT/2 - 25, 400, 50)
     ok_button = pygame.Rect(WIDTH/2 - 75, HEIGHT/2 + 50, 150, 60)
     active = True
     name_entered = False
+    clock = pygame.time.Clock()
     
     while not name_entered:
+        # A tela só é redesenhada quando algo muda; o clock evita girar o loop à toa
+        clock.tick(60)
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
             
+            if event.type in EXPOSE_EVENTS:
+                painter.invalidate()
+            
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if input_box.collidepoint(event.pos):
                     active = True
@@ -188,32 +423,44 @@ def main():
                     if len(player_name) < 15 and event.unicode.isprintable():
                         player_name += event.unicode
         
-        draw_name_input_screen(screen, player_name, input_box, ok_button, active)
+        draw_name_input_screen(painter, player_name, input_box, ok_button, active)
     
-    # Envia nome para o servidor
+    # Conecta, envia o nome e recebe o ID do jogador e o token da sessão.
+    # Com --torneio o jogador entra no próximo torneio em vez do pareamento comum.
+    # Com --comprimir o cliente oferece os codecs de compressão dos estados.
+    address = (ip_address, port_number)
+    hello = {"name": player_name, "tournament": "--torneio" in sys.argv}
+    if "--comprimir" in sys.argv:
+        hello["compress"] = supported_codecs()
     try:
-        client_socket.send(pickle.dumps(player_name))
+        client_socket, stream, welcome = connect_to_server(address, hello)
+        if "error" in welcome:
+            raise ConnectionRefusedError(f"servidor recusou a partida ({welcome['error']})")
+        connection = ServerConnection(address, hello, client_socket, stream, welcome)
+        print(f"Conectado ao servidor {ip_address}:{port_number}")
         print(f"Nome enviado: {player_name}")
+        print(f"Sou o jogador {connection.player_id+1}")
     except Exception as e:
-        print(f"Erro ao enviar nome: {e}")
+        print(f"Erro de conexão: {e}")
         pygame.quit()
         sys.exit()
     
     pygame.display.set_caption(f"Air hockey - {player_name}")
     
     # Inicialização das raquetes
-    my_paddle = pygame.Rect(WIDTH/2 - PADDLE_WIDTH/2, 
-                           HEIGHT - 30 if player_id == 0 else 20, 
-                           PADDLE_WIDTH, PADDLE_HEIGHT)
+    player_id = connection.player_id
+    my_paddle = initial_paddle(player_id)
     
     play_again_button = pygame.Rect(WIDTH/2 - 100, HEIGHT/2 + 50, 200, 60)
     voted_for_reset = False
-    clock = pygame.time.Clock()
     running = True
     
+    # A rede roda em outra thread: o loop abaixo só lê o último estado recebido,
+    # então o tempo de cada quadro depende apenas da renderização
+    connection.start()
     print("Entrando no loop principal...")
     winner_text = None
-    while running:
+    while running and not connection.finished:
         clock.tick(60)
         
         # Processar eventos
@@ -221,15 +468,19 @@ def main():
             if event.type == pygame.QUIT:
                 running = False
             
+            if event.type in EXPOSE_EVENTS:
+                painter.invalidate()
+            
             if winner_text is not None and event.type == pygame.MOUSEBUTTONDOWN:
                 if play_again_button.collidepoint(event.pos) and not voted_for_reset:
-                    try:
-                        client_socket.send(pickle.dumps("play_again"))
-                        voted_for_reset = True
-                        print("Voto para reiniciar enviado")
-                        continue
-                    except Exception as e:
-                        print(f"Erro ao enviar voto: {e}")
+                    connection.send_command("play_again")
+                    voted_for_reset = True
+                    print("Voto para reiniciar enviado")
+        
+        # Mudança de vaga (redirecionamento do lobby ou nova partida do torneio)
+        if connection.player_id != player_id:
+            player_id = connection.player_id
+            my_paddle = initial_paddle(player_id)
             
         # Controle dos paddles
         keys = pygame.key.get_pressed()
@@ -237,19 +488,12 @@ def main():
             my_paddle.x -= PADDLE_SPEED
         if keys[pygame.K_RIGHT] and my_paddle.right < WIDTH:
             my_paddle.x += PADDLE_SPEED
+        connection.set_paddle(my_paddle, player_id)
         
-        try:
-            # Envia posição da raquete
-            client_socket.send(pickle.dumps(my_paddle))
-            
-            # Recebe estado do jogo
-            data = client_socket.recv(4096)
-            if not data:
-                print("Estado do jogo vazio - desconectando")
-                break
-            
-            game_state = pickle.loads(data)
-            
+        game_state = connection.latest()
+        if connection.status:
+            draw_message_screen(painter, connection.status)
+        elif game_state is not None:
             # Extrai informações do estado
             p1_server = game_state.get("paddles")[0]
             p2_server = game_state.get("paddles")[1]
@@ -271,19 +515,14 @@ def main():
             winner_text = get_winner_text(winner_id, player_id)
             
             # Renderização
-            redraw_window(screen, p1_server, p2_server, ball_server, 
+            redraw_window(painter, p1_server, p2_server, ball_server, 
                          winner_text, players_online, countdown, 
                          play_again_button, voted_for_reset, opponent_name, no_opponent, player_id)
-            
-        except (ConnectionResetError, EOFError, socket.error) as e:
-            print(f"Erro de conexão: {e}")
-            break
-        except Exception as e:
-            print(f"Erro geral: {e}")
-            break
+        connection.frame_done()
     
     print("Encerrando cliente...")
-    client_socket.close()
+    # Saída voluntária: o servidor libera a vaga sem esperar a reconexão
+    connection.close(quit=not running)
     pygame.quit()
     sys.exit()
 
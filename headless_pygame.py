@@ -0,0 +1,43 @@
+"""
+pygame para o servidor, que só usa o pygame.Rect.
+
+O pickle de um Rect referencia o pacote pygame (o copyreg registrado no
+pygame/__init__.py), então o servidor precisa importar o pacote de verdade para os
+clientes entenderem os estados. Mas o pygame/__init__.py também tenta importar
+módulos opcionais pesados (surfarray e sndarray puxam o numpy, pkgdata puxa o
+pkg_resources), que tomam a maior parte do tempo de importação. Esses imports
+estão protegidos por "except ImportError" no próprio pygame, então com
+skip_optional=True eles falham de propósito só durante o import do pygame: o
+numpy e o pkg_resources continuam importáveis normalmente depois, mas o
+pygame.surfarray, o pygame.sndarray e o pygame.pkgdata ficam indisponíveis no
+processo inteiro. Por isso só o processo do servidor (server.py como __main__)
+pede skip_optional; quem apenas importa o módulo server (benchmarks, testes de
+carga) recebe o pygame completo.
+
+Nenhum subsistema do SDL é iniciado (sem pygame.init()): o Rect não precisa deles.
+"""
+import os
+import sys
+
+# Dependências opcionais do pygame que o servidor não usa
+SKIPPED_MODULES = ("numpy", "pkg_resources")
+
+def import_pygame(skip_optional: bool = False):
+    """
+    Importa o pygame (se ele ainda não foi importado). Com skip_optional=True,
+    sem os módulos opcionais pesados.
+    """
+    if "pygame" in sys.modules:
+        return sys.modules["pygame"]
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    # None em sys.modules faz o import levantar ImportError
+    skipped = [name for name in SKIPPED_MODULES if skip_optional and name not in sys.modules]
+    for name in skipped:
+        sys.modules[name] = None
+    try:
+        import pygame
+    finally:
+        for name in skipped:
+            if name in sys.modules and sys.modules[name] is None:
+                del sys.modules[name]
+    return pygame
@@ -0,0 +1,360 @@
+import argparse
+import socket
+import threading
+import pickle
+import secrets
+from dotenv import load_dotenv
+import os
+import time
+from server import (Game, HandshakeTracker, HANDSHAKE_TIMEOUT, HEARTBEAT_INTERVAL, IDLE_TIMEOUT,
+                    LISTEN_BACKLOG, WILDCARD_HOSTS, configure_socket, receive_hello)
+
+HEARTBEAT_TIMEOUT = 3 * HEARTBEAT_INTERVAL  # sem heartbeat por esse tempo, o nó sai da lista
+RESERVE_TIMEOUT = 5  # segundos esperando um nó confirmar a reserva de um par
+RESERVE_TOTAL_TIMEOUT = 10  # segundos máximos tentando reservar um par, somando todos os nós
+MAX_LATE_RATIO = 0.05  # nós com mais quadros atrasados só recebem partidas se todos estiverem assim
+
+class Node:
+    """Nó de jogo (server.py com LOBBY_CONTROL) registrado no lobby"""
+    def __init__(self, address: tuple):
+        self.address = address
+        self.status = {}  # último heartbeat
+        self.games = set()
+        self.pending = []  # reservas a mandar na resposta do próximo heartbeat
+        self.unconfirmed = {}  # primeiro token -> reserva enviada e ainda não confirmada
+        self.reserved = 0  # partidas reservadas depois do último heartbeat
+        self.draining = False
+        self.drained = False
+        self.wakeup = threading.Event()
+
+    def load(self):
+        return self.status.get("matches", 0) + self.reserved
+
+    def describe(self):
+        status = self.status
+        return (f"{self.address[0]}:{self.address[1]} | partidas {status.get('matches', 0)} | "
+                f"jogadores {status.get('players', 0)} | quadro médio {status.get('tick_ms', 0):.2f} ms, "
+                f"pior {status.get('tick_max_ms', 0):.2f} ms | atrasados {status.get('late_ratio', 0):.1%}"
+                + (f" | degradado: {', '.join(status['degraded'])}" if status.get("degraded") else "")
+                + (" | em drenagem" if self.draining else ""))
+
+class Reservation:
+    """Par de jogadores esperando um nó criar o jogo"""
+    def __init__(self, names: list):
+        self.names = names
+        self.tokens = [secrets.token_hex(16) for _ in names]
+        self.game_id = None
+        self.done = threading.Event()
+
+class LobbyPlayer:
+    """Jogador conectado ao lobby esperando um oponente"""
+    def __init__(self, name: str):
+        self.name = name
+        self.redirect = None  # mensagem que manda o jogador para o nó da partida
+
+class Lobby:
+    """
+    Recebe os jogadores, forma os pares e manda cada par para o nó de jogo com
+    menor carga. Os nós se registram pelo canal de controle e mandam heartbeats
+    com o número de partidas e a saúde dos quadros; nós sem heartbeat saem da
+    lista e nós em drenagem não recebem partidas novas.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.nodes = {}  # (host, porta) -> Node
+        self.waiting = None  # jogador esperando um oponente
+
+    def pick_node(self, exclude=()):
+        """
+        Nó com menor carga entre os que não estão em drenagem nem recusando partidas
+        por sobrecarga, preferindo os saudáveis
+        """
+        with self.lock:
+            nodes = [node for node in self.nodes.values()
+                     if not node.draining and node.status.get("admitting", True) and node not in exclude]
+        healthy = [node for node in nodes if node.status.get("late_ratio", 0) <= MAX_LATE_RATIO]
+        return min(healthy or nodes, key=lambda node: node.load(), default=None)
+
+    def tournament_node(self):
+        """Todos os inscritos em torneios vão para o mesmo nó, para formar os grupos juntos"""
+        with self.lock:
+            nodes = [node for node in self.nodes.values() if not node.draining]
+        return min(nodes, key=lambda node: node.address, default=None)
+
+    def find_node(self, game_id: str = None):
+        """Nó de um jogo para um espectador; sem id, o nó com mais partidas"""
+        with self.lock:
+            nodes = list(self.nodes.values())
+        if game_id is not None:
+            return next((node for node in nodes if str(game_id) in node.games), None)
+        return max(nodes, key=lambda node: node.status.get("matches", 0), default=None)
+
+    def reserve(self, names: list):
+        """
+        Pede a um nó um jogo com as vagas guardadas para o par.
+        Se o nó não confirmar a tempo, tenta o próximo, até RESERVE_TOTAL_TIMEOUT
+        segundos no total. Retorna (nó, reserva) ou None.
+        """
+        tried = []
+        deadline = time.monotonic() + RESERVE_TOTAL_TIMEOUT
+        while True:
+            node = self.pick_node(exclude=tried)
+            remaining = deadline - time.monotonic()
+            if node is None or remaining <= 0:
+                return None
+            reservation = Reservation(names)
+            with self.lock:
+                node.pending.append(reservation)
+                node.reserved += 1
+            node.wakeup.set()
+            if reservation.done.wait(min(RESERVE_TIMEOUT, remaining)) and reservation.game_id is not None:
+                return node, reservation
+            tried.append(node)
+
+    def join(self, player: LobbyPlayer):
+        """
+        Coloca o jogador na espera ou forma um par com quem estava esperando. A
+        reserva é feita em outra thread: os dois jogadores continuam recebendo o
+        estado de espera até o redirecionamento ficar pronto.
+        """
+        with self.lock:
+            if self.waiting is None:
+                self.waiting = player
+                return
+            partner, self.waiting = self.waiting, None
+        threading.Thread(target=self.match, args=(partner, player), daemon=True).start()
+
+    def match(self, partner: LobbyPlayer, player: LobbyPlayer):
+        """Reserva o jogo do par em um nó e prepara o redirecionamento dos dois"""
+        result = self.reserve([partner.name, player.name])
+        if result is None:
+            print(f"Nenhum nó disponível para {partner.name} x {player.name}")
+            partner.redirect = player.redirect = {"error": "sem_nos"}
+            return
+        node, reservation = result
+        print(f"{partner.name} x {player.name} -> jogo {reservation.game_id} no nó {node.address[0]}:{node.address[1]}")
+        partner.redirect = {"redirect": node.address, "token": reservation.tokens[0]}
+        player.redirect = {"redirect": node.address, "token": reservation.tokens[1]}
+
+    def leave(self, player: LobbyPlayer):
+        with self.lock:
+            if self.waiting is player:
+                self.waiting = None
+
+    def heartbeat(self, node: Node, heartbeat: dict):
+        """Atualiza a carga do nó e confirma as reservas feitas"""
+        with self.lock:
+            node.status = heartbeat
+            node.games = set(heartbeat.get("games", ()))
+            node.reserved = 0
+            # O nó lembra da drenagem se o canal de controle cair e voltar
+            node.draining = node.draining or heartbeat.get("draining", False)
+            confirmed = [(node.unconfirmed.pop(token, None), game_id) for token, game_id in heartbeat["reserved"]]
+        for reservation, game_id in confirmed:
+            if reservation is not None:
+                reservation.game_id = game_id
+                reservation.done.set()
+        if node.draining and not node.drained and heartbeat.get("players", 0) == 0:
+            node.drained = True
+            print(f"Nó {node.address[0]}:{node.address[1]} drenado: pode ser desligado")
+
+    def node_session(self, conn: socket.socket, stream, heartbeat: dict):
+        """
+        Canal de controle de um nó. A cada heartbeat o lobby responde em até
+        HEARTBEAT_INTERVAL segundos, antes se houver pares para reservar.
+        """
+        node = Node(tuple(heartbeat["node"]))
+        if node.address[0] in WILDCARD_HOSTS:
+            # Os clientes seriam mandados para um endereço em que não conseguem conectar
+            print(f"Nó {node.address[0]}:{node.address[1]} recusado: anuncie um endereço alcançável (NODE_HOST)")
+            return
+        with self.lock:
+            self.nodes[node.address] = node
+        print(f"Nó {node.address[0]}:{node.address[1]} registrado")
+        conn.settimeout(HEARTBEAT_TIMEOUT)
+        try:
+            while True:
+                self.heartbeat(node, heartbeat)
+                node.wakeup.wait(HEARTBEAT_INTERVAL)
+                node.wakeup.clear()
+                with self.lock:
+                    reservations, node.pending = node.pending, []
+                    node.unconfirmed.update((reservation.tokens[0], reservation) for reservation in reservations)
+                    draining = node.draining
+                conn.sendall(pickle.dumps({"reserve": [(r.tokens, r.names) for r in reservations],
+                                           "drain": draining}))
+                heartbeat = pickle.load(stream)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            print(f"Nó {node.address[0]}:{node.address[1]} fora do ar: {e}")
+        finally:
+            with self.lock:
+                if self.nodes.get(node.address) is node:
+                    del self.nodes[node.address]
+                lost = node.pending + list(node.unconfirmed.values())
+            # Reservas sem confirmação são tentadas em outro nó
+            for reservation in lost:
+                reservation.done.set()
+
+    def admin(self, command: dict):
+        """Comandos do operador: drenar um nó ou listar os nós"""
+        if "drain" in command:
+            with self.lock:
+                node = self.nodes.get(tuple(command["drain"]))
+                if node is not None:
+                    node.draining = True
+            if node is None:
+                return {"ok": False}
+            print(f"Nó {node.address[0]}:{node.address[1]} em drenagem")
+            node.wakeup.set()
+            return {"ok": True}
+        with self.lock:
+            return {"nodes": [node.describe() for node in self.nodes.values()]}
+
+def control_thread(conn: socket.socket, lobby: Lobby):
+    """Conexão no canal de controle: um nó se registrando ou um comando do operador"""
+    try:
+        conn.settimeout(HANDSHAKE_TIMEOUT)
+        stream = conn.makefile("rb")
+        message = pickle.load(stream)
+        if "node" in message:
+            lobby.node_session(conn, stream, message)
+        else:
+            conn.sendall(pickle.dumps(lobby.admin(message)))
+    except (OSError, EOFError, pickle.UnpicklingError) as e:
+        print(f"Erro no canal de controle: {e}")
+    finally:
+        conn.close()
+
+def client_thread(conn: socket.socket, addr, lobby: Lobby, handshakes: HandshakeTracker, waiting_state: bytes):
+    """
+    Thread de um cliente no lobby. Espectadores e inscritos em torneios são mandados
+    direto para um nó. Jogadores recebem o estado de espera até formar um par e então
+    a mensagem {"redirect": (host, porta), "token": token}, com a qual retomam no nó a
+    vaga reservada ({"resume": token}).
+    """
+    player_name = "Fulano"
+    player = None
+    try:
+        try:
+            conn.settimeout(HANDSHAKE_TIMEOUT)
+            hello = receive_hello(conn)
+        except Exception as e:
+            outcome = "timeout" if isinstance(e, socket.timeout) else \
+                      "desconectado" if isinstance(e, ConnectionError) else "erro"
+            handshakes.finish(outcome)
+            return
+
+        if "spectate" in hello or "resume" in hello:
+            # As sessões ficam nos nós: o cliente retoma direto no nó da partida
+            handshakes.finish("espectador" if "spectate" in hello else "retomada_invalida")
+            node = lobby.find_node(hello["spectate"]) if "spectate" in hello else None
+            if node is None:
+                error = "jogo_inexistente" if "spectate" in hello else "sessao_expirada"
+                conn.send(pickle.dumps({"error": error}))
+            else:
+                conn.send(pickle.dumps({"redirect": node.address, "token": None}))
+            return
+
+        handshakes.finish("concluido")
+        player_name = hello.get("name", "Fulano")
+        player = LobbyPlayer(player_name)
+        conn.send(pickle.dumps({"player_id": 0, "token": None}))
+        conn.settimeout(IDLE_TIMEOUT)
+        if hello.get("tournament"):
+            node = lobby.tournament_node()
+            player.redirect = {"redirect": node.address, "token": None} if node else {"error": "sem_nos"}
+        else:
+            lobby.join(player)
+
+        # Espera o oponente recebendo o estado de espera, no mesmo ritmo do jogo
+        while player.redirect is None:
+            conn.send(waiting_state)
+            data = conn.recv(2048)
+            if not data or pickle.loads(data) == "quit":
+                return
+        conn.send(pickle.dumps(player.redirect))
+    except Exception as e:
+        print(f"Erro na thread do cliente {player_name} ({addr}): {e}")
+    finally:
+        if player is not None:
+            lobby.leave(player)
+        conn.close()
+
+def serve(ip_address: str, port_number: int, control_port: int):
+    lobby = Lobby()
+    handshakes = HandshakeTracker()
+
+    # Estado mostrado enquanto o jogador espera um oponente ("Aguardando oponente...")
+    waiting_game = Game("lobby")
+    waiting_game.state["connected_players"] = 1
+    waiting_state = waiting_game.encoded_state()
+
+    control = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    players = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        control.bind((ip_address, control_port))
+        control.listen(LISTEN_BACKLOG)
+        players.bind((ip_address, port_number))
+        players.listen(LISTEN_BACKLOG)
+        print(f"Lobby Air Hockey iniciado em {ip_address}:{port_number} (controle na porta {control_port})")
+    except socket.error as e:
+        print(f"Erro ao iniciar lobby: {e}")
+        return
+
+    def accept_control():
+        while True:
+            conn, _ = control.accept()
+            threading.Thread(target=control_thread, args=(conn, lobby), daemon=True).start()
+
+    threading.Thread(target=accept_control, daemon=True).start()
+
+    try:
+        while True:
+            conn, addr = players.accept()
+            if not handshakes.try_begin():
+                conn.close()
+                continue
+            configure_socket(conn)
+            client_logic = threading.Thread(target=client_thread, args=(conn, addr, lobby, handshakes, waiting_state))
+            client_logic.start()
+    except KeyboardInterrupt:
+        print("\nLobby interrompido pelo usuário")
+    finally:
+        print(f"Handshakes: {handshakes.counters}")
+        players.close()
+        control.close()
+
+def send_command(ip_address: str, control_port: int, command: dict):
+    """Manda um comando do operador para o canal de controle do lobby"""
+    with socket.create_connection((ip_address, control_port), timeout=HANDSHAKE_TIMEOUT) as conn:
+        conn.sendall(pickle.dumps(command))
+        return pickle.load(conn.makefile("rb"))
+
+def main():
+    """
+    Lobby na porta do .env (SERVER_IP/SERVER_PORT) e canal de controle dos nós em
+    LOBBY_CONTROL_PORT (padrão SERVER_PORT + 1). Cada nó é um server.py em outra
+    porta, iniciado com LOBBY_CONTROL=host:porta_de_controle.
+    """
+    load_dotenv()
+    ip_address = os.getenv("SERVER_IP")
+    port_number = int(os.getenv("SERVER_PORT"))
+    control_port = int(os.getenv("LOBBY_CONTROL_PORT", port_number + 1))
+
+    parser = argparse.ArgumentParser(description="Lobby que distribui as partidas entre nós de jogo")
+    parser.add_argument("--drenar", metavar="HOST:PORTA", help="Para de mandar partidas novas para o nó")
+    parser.add_argument("--nos", action="store_true", help="Lista os nós registrados e a carga de cada um")
+    args = parser.parse_args()
+
+    if args.drenar:
+        host, _, port = args.drenar.rpartition(":")
+        reply = send_command(ip_address, control_port, {"drain": (host, int(port))})
+        print("Nó em drenagem" if reply["ok"] else "Nó não encontrado")
+    elif args.nos:
+        nodes = send_command(ip_address, control_port, {"status": True})["nodes"]
+        print("\n".join(nodes) or "Nenhum nó registrado")
+    else:
+        serve(ip_address, port_number, control_port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Contabilidade de memória do servidor: quanto custa cada partida e cada conexão
+e se algo fica vivo depois do fim.
+
+Em produção são só contadores: objetos vivos de cada tipo (WeakSet, então um
+jogo que ninguém mais usa some sozinho e um que continua vivo é vazamento),
+threads e o RSS do processo. No modo de depuração o tracemalloc registra as
+alocações, que são atribuídas a "jogo", "conexao" ou "outros" pela função do
+servidor que as fez, e o relatório mostra os bytes por jogo e por conexão e as
+linhas onde a memória mais cresceu desde o relatório anterior.
+"""
+import os
+import threading
+import tracemalloc
+import weakref
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRACE_FRAMES = 16  # frames guardados por alocação: o suficiente para sair do pickle e do pygame
+TOP_GROWTH = 5  # linhas no relatório de crescimento
+# As alocações do próprio relatório (snapshots do tracemalloc, cache dos frames) ficam de fora
+_OWN_ALLOCATIONS = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+
+def rss_bytes(pid: int = None):
+    """Memória residente de um processo (o atual, por padrão); None se não dá para medir"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None and pid is None:
+        # Sem /proc (macOS): só o pico, em KB no Linux e em bytes no macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+    return None
+
+def thread_count(pid: int = None):
+    """Threads de um processo (do atual sem /proc, pelo módulo threading)"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as status:
+            for line in status:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return threading.active_count() if pid is None else None
+
+def _code_ranges(targets):
+    """(arquivo, primeira linha, última linha) de cada função ou método dos alvos"""
+    import inspect  # só no modo de depuração: fora do caminho de inicialização do servidor
+    ranges = []
+    for target in targets:
+        functions = [member for _, member in inspect.getmembers(target, inspect.isfunction)] \
+            if inspect.isclass(target) else [target]
+        for function in functions:
+            source, first = inspect.getsourcelines(function)
+            ranges.append((function.__code__.co_filename, first, first + len(source) - 1))
+    return ranges
+
+class MemoryAccounting:
+    """
+    Objetos vivos por tipo e, com o tracemalloc ligado, bytes por categoria.
+    categories: categoria -> funções e classes do servidor cujas alocações são dela.
+    """
+    def __init__(self):
+        self.live = {}  # tipo -> WeakSet dos objetos vivos
+        self.lock = threading.Lock()
+        self.categories = {}
+        self.frame_categories = {}  # (arquivo, linha) -> categoria (ou None), já resolvidos
+        self.baseline_rss = rss_bytes()
+        self.previous = None  # snapshot do tracemalloc do relatório anterior
+
+    def track(self, kind: str, obj):
+        """Passa a contar obj entre os vivos do tipo kind (até ele ser coletado)"""
+        with self.lock:
+            live = self.live.get(kind)
+            if live is None:
+                live = self.live[kind] = weakref.WeakSet()
+            live.add(obj)
+
+    def count(self, kind: str):
+        with self.lock:
+            live = self.live.get(kind)
+            return len(live) if live is not None else 0
+
+    def start_tracing(self, categories: dict, frames: int = TRACE_FRAMES):
+        """Modo de depuração: liga o tracemalloc (deixa o servidor bem mais lento)"""
+        self.categories = {category: _code_ranges(targets) for category, targets in categories.items()}
+        tracemalloc.start(frames)
+        self.previous = tracemalloc.take_snapshot().filter_traces(_OWN_ALLOCATIONS)
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def _frame_category(self, filename: str, lineno: int):
+        key = (filename, lineno)
+        if key not in self.frame_categories:
+            self.frame_categories[key] = next(
+                (category for category, ranges in self.categories.items()
+                 for path, first, last in ranges if path == filename and first <= lineno <= last), None)
+        return self.frame_categories[key]
+
+    def _category(self, traceback):
+        # O frame mais próximo da alocação que for de uma função conhecida decide a categoria
+        for frame in traceback:
+            category = self._frame_category(frame.filename, frame.lineno)
+            if category is not None:
+                return category
+        return "outros"
+
+    def report(self):
+        """Contadores (e, no modo de depuração, a memória por categoria e o crescimento)"""
+        rss = rss_bytes()
+        with self.lock:
+            counts = {kind: len(live) for kind, live in self.live.items()}
+        report = {
+            "rss_mb": rss / 2**20 if rss is not None else None,
+            "rss_inicial_mb": self.baseline_rss / 2**20 if self.baseline_rss is not None else None,
+            "threads": thread_count(),
+            "vivos": counts,
+        }
+        if not self.tracing:
+            return report
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(_OWN_ALLOCATIONS)
+        by_category = {}
+        for statistic in snapshot.statistics("traceback"):
+            category = self._category(statistic.traceback)
+            by_category[category] = by_category.get(category, 0) + statistic.size
+        report["rastreado_mb"] = sum(by_category.values()) / 2**20
+        report["bytes_por_categoria"] = by_category
+        for category, kind in (("jogo", "jogos"), ("conexao", "conexoes")):
+            if counts.get(kind):
+                report[f"bytes_por_{category}"] = by_category.get(category, 0) / counts[kind]
+        growth = snapshot.compare_to(self.previous, "lineno")[:TOP_GROWTH]
+        report["crescimento"] = [(str(stat.traceback[0]), stat.size_diff, stat.count_diff)
+                                 for stat in growth if stat.size_diff > 0]
+        self.previous = snapshot
+        return report
+
+def format_report(report: dict):
+    """Linhas do relatório para o log do servidor"""
+    live = " | ".join(f"{kind} {count}" for kind, count in sorted(report["vivos"].items()))
+    rss = f"{report['rss_mb']:.1f} MB" if report["rss_mb"] is not None else "?"
+    lines = [f"Memória: RSS {rss} | threads {report['threads']} | vivos: {live or 'nenhum'}"]
+    if "registrados" in report:
+        registered = " | ".join(f"{kind} {count}" for kind, count in sorted(report["registrados"].items()))
+        lines[0] += f" | registrados: {registered}"
+    if "rastreado_mb" in report:
+        per_object = ", ".join(f"{report[key] / 1024:.1f} KB por {key[len('bytes_por_'):]}"
+                               for key in ("bytes_por_jogo", "bytes_por_conexao") if key in report)
+        categories = ", ".join(f"{category} {size / 2**20:.2f} MB"
+                               for category, size in sorted(report["bytes_por_categoria"].items()))
+        lines.append(f"  tracemalloc: {report['rastreado_mb']:.2f} MB ({categories}){'; ' + per_object if per_object else ''}")
+        for line, size_diff, count_diff in report["crescimento"]:
+            lines.append(f"  +{size_diff / 1024:.1f} KB ({count_diff:+d} blocos) em {line}")
+    return "\n".join(lines)
@@ -0,0 +1,277 @@
+"""
+Medição de onde o servidor gasta tempo, ligada e desligada com o servidor rodando.
+
+- PhaseTimers: temporizadores por fase (serializar, esperar o lock, enviar, receber,
+  física...) com tempo de parede e de CPU da thread em histogramas. Desligados
+  custam uma chamada por iteração do loop e um teste por fase.
+- SamplingProfiler: amostra as pilhas de todas as threads por alguns segundos e
+  grava no formato "collapsed" (uma pilha por linha, frames separados por ";" e
+  o peso no fim), que o flamegraph.pl e o speedscope abrem direto.
+"""
+import math
+import os
+import sys
+import threading
+import time
+
+# Histograma com buckets de 5% de largura a partir de 1 µs (também usado por teste_carga_v1/metricas.py)
+_BUCKET_BASE = 1.05
+_BUCKET_MIN = 1e-6
+
+PROFILE_INTERVAL = 0.005  # segundos entre duas amostras das pilhas
+PROFILE_CPU = "cpu"  # peso de cada amostra: µs de CPU da thread desde a amostra anterior
+PROFILE_WALL = "parede"  # peso de cada amostra: 1 (threads paradas no recv também contam)
+
+class Histogram:
+    """
+    Histograma logarítmico de durações em segundos. Ocupa memória fixa (independente
+    do número de amostras) e pode ser somado entre threads e entre processos.
+    """
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        index = 0 if value <= _BUCKET_MIN else int(math.log(value / _BUCKET_MIN, _BUCKET_BASE)) + 1
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction: float):
+        """Limite superior do bucket que contém o percentil pedido"""
+        if not self.total:
+            return 0.0
+        target = fraction * self.total
+        cumulative = 0
+        for index in sorted(self.counts):
+            cumulative += self.counts[index]
+            if cumulative >= target:
+                return min(self.max, _BUCKET_MIN * _BUCKET_BASE ** index)
+        return self.max
+
+    def fraction_above(self, threshold: float):
+        """Fração das amostras acima de threshold (na resolução dos buckets)"""
+        if not self.total:
+            return 0.0
+        above = sum(count for index, count in self.counts.items()
+                    if _BUCKET_MIN * _BUCKET_BASE ** (index - 1) >= threshold)
+        return above / self.total
+
+    def summary_ms(self):
+        """Resumo p50/p95/p99/max em milissegundos"""
+        return {
+            "p50": self.percentile(0.50) * 1000,
+            "p95": self.percentile(0.95) * 1000,
+            "p99": self.percentile(0.99) * 1000,
+            "max": self.max * 1000,
+            "amostras": self.total,
+        }
+
+    def summary_us(self):
+        """Resumo em microssegundos: média, p50, p99, máximo e o total em segundos"""
+        return {
+            "amostras": self.total,
+            "media": self.sum / self.total * 1e6 if self.total else 0.0,
+            "p50": self.percentile(0.50) * 1e6,
+            "p99": self.percentile(0.99) * 1e6,
+            "max": self.max * 1e6,
+            "total_s": self.sum,
+        }
+
+    def to_dict(self):
+        return {"counts": self.counts, "total": self.total, "sum": self.sum, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        histogram = cls()
+        histogram.counts = {int(k): v for k, v in data["counts"].items()}
+        histogram.total = data["total"]
+        histogram.sum = data.get("sum", 0.0)
+        histogram.max = data["max"]
+        return histogram
+
+class _Lap:
+    """
+    Cronômetro de uma iteração de um loop. Cada chamada lap("fase") atribui à fase
+    "<loop>.<fase>" o tempo desde a marca anterior (ou desde a criação) e começa a próxima.
+    """
+    __slots__ = ("timers", "loop", "wall", "cpu")
+
+    def __init__(self, timers: "PhaseTimers", loop: str):
+        self.timers = timers
+        self.loop = loop
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+
+    def __call__(self, phase: str):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        self.timers.record(f"{self.loop}.{phase}", wall - self.wall, cpu - self.cpu)
+        self.wall, self.cpu = wall, cpu
+        return True
+
+class PhaseTimers:
+    """
+    Tempo de parede e de CPU de cada fase dos loops do servidor.
+
+    Os loops pegam um cronômetro por iteração com lap(loop) e marcam o fim de cada fase
+    com "lap and lap(fase)". Com os temporizadores desligados lap() retorna None e
+    as marcas não fazem nada. A diferença entre parede e CPU de uma fase é espera:
+    lock disputado, socket sem dados ou a thread esperando o GIL.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.phases = {}  # fase -> (histograma de parede, histograma de CPU)
+        self.started = time.time()
+
+    def lap(self, loop: str):
+        return _Lap(self, loop) if self.enabled else None
+
+    def record(self, phase: str, wall: float, cpu: float):
+        with self.lock:
+            histograms = self.phases.get(phase)
+            if histograms is None:
+                histograms = self.phases[phase] = (Histogram(), Histogram())
+            histograms[0].add(wall)
+            histograms[1].add(cpu)
+
+    def enable(self):
+        """Liga os temporizadores e começa uma janela nova"""
+        with self.lock:
+            self.phases = {}
+            self.started = time.time()
+        self.enabled = True
+
+    def disable(self):
+        """Desliga os temporizadores e retorna o relatório da janela"""
+        self.enabled = False
+        return self.report()
+
+    def report(self):
+        """Resumo de cada fase (parede e CPU, em µs) desde que a janela começou"""
+        with self.lock:
+            phases = dict(self.phases)
+            seconds = time.time() - self.started
+        return {
+            "segundos": seconds,
+            "fases": {phase: {"parede": wall.summary_us(), "cpu": cpu.summary_us()}
+                      for phase, (wall, cpu) in sorted(phases.items())},
+        }
+
+def format_report(report: dict):
+    """Tabela do relatório para o log do servidor, das fases com mais CPU para as com menos"""
+    seconds = report["segundos"] or 1
+    lines = [f"Fases em {report['segundos']:.1f}s (µs por ocorrência; CPU/s = segundos de CPU por segundo)",
+             f"  {'fase':<26} {'vezes':>9} {'parede méd':>10} {'p99':>8} {'cpu méd':>8} {'p99':>8} {'CPU/s':>6}"]
+    phases = sorted(report["fases"].items(), key=lambda item: item[1]["cpu"]["total_s"], reverse=True)
+    for phase, times in phases:
+        wall, cpu = times["parede"], times["cpu"]
+        lines.append(f"  {phase:<26} {wall['amostras']:>9} {wall['media']:>10.1f} {wall['p99']:>8.1f} "
+                     f"{cpu['media']:>8.1f} {cpu['p99']:>8.1f} {cpu['total_s'] / seconds:>6.3f}")
+    return "\n".join(lines)
+
+def _thread_kind(thread: threading.Thread):
+    """Nome da thread sem o número ("Thread-12 (client_thread)" vira client_thread)"""
+    return thread.name.split(" ", 1)[-1].strip("()")
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def _thread_cpu(ident: int):
+    """Tempo de CPU de outra thread (Unix); None se não dá para medir"""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):
+        return None
+
+class SamplingProfiler:
+    """
+    Amostrador de pilhas de todas as threads do processo, sem parar o servidor.
+    No modo "cpu" cada pilha pesa os µs de CPU que a thread usou desde a amostra
+    anterior, então threads esperando no recv ou no sleep quase não aparecem; no
+    modo "parede" (ou onde o tempo de CPU por thread não existe) cada amostra pesa 1.
+    Só uma amostragem roda por vez.
+    """
+    def __init__(self, interval: float = PROFILE_INTERVAL, mode: str = PROFILE_CPU):
+        self.interval = interval
+        self.mode = mode if hasattr(time, "pthread_getcpuclockid") else PROFILE_WALL
+        self.thread = None
+
+    def start(self, seconds: float, path: str):
+        """Amostra por seconds segundos em outra thread e grava em path. False se já está amostrando."""
+        if self.thread is not None and self.thread.is_alive():
+            return False
+        self.thread = threading.Thread(target=self._run, args=(seconds, path), daemon=True)
+        self.thread.start()
+        return True
+
+    def _run(self, seconds: float, path: str):
+        # Com o GIL a amostra só sai quando a thread que está rodando solta o GIL; um
+        # intervalo de troca menor faz a amostra pegar essa thread no meio do código
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, self.interval / 10))
+        try:
+            samples, stacks = self._sample(seconds)
+        finally:
+            sys.setswitchinterval(switch_interval)
+        try:
+            with open(path, "w", encoding="utf-8") as output:
+                for key, weight in sorted(stacks.items()):
+                    output.write(f"{key} {weight}\n")
+        except OSError as e:
+            print(f"Perfil de {seconds:.0f}s não gravado em {path}: {e}")
+            return
+        print(f"Perfil de {seconds:.0f}s ({self.mode}, {samples} amostras, {len(stacks)} pilhas) gravado em {path}")
+
+    def _sample(self, seconds: float):
+        """Amostra as pilhas até o prazo; retorna (amostras, pilha -> peso)"""
+        me = threading.get_ident()
+        names = {}
+        cpu_times = {}
+        stacks = {}
+        samples = 0
+        deadline = time.perf_counter() + seconds
+        next_sample = time.perf_counter()
+        while next_sample < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                weight = 1
+                if self.mode == PROFILE_CPU:
+                    cpu = _thread_cpu(ident)
+                    last, cpu_times[ident] = cpu_times.get(ident), cpu
+                    if cpu is None or last is None:
+                        continue
+                    weight = int((cpu - last) * 1e6)
+                    if weight <= 0:
+                        continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                # Threads de jogadores diferentes entram na mesma raiz (o nome sem o número)
+                if ident not in names:
+                    names.update((thread.ident, _thread_kind(thread)) for thread in threading.enumerate())
+                stack.append(names.get(ident, "thread"))
+                key = ";".join(reversed(stack))
+                stacks[key] = stacks.get(key, 0) + weight
+            samples += 1
+            next_sample += self.interval
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_sample = time.perf_counter()
+        return samples, stacks
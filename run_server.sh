@@ -7,4 +7,4 @@ source venv/bin/activate
 
 # Roda o servidor
 echo "Iniciando o programa server..."
-python3 server.py
\ No newline at end of file
+python3 -m server
\ No newline at end of file
@@ -1,13 +1,25 @@
+import argparse
 import socket
 import threading
 import pickle
-import pygame
 import time
 import math
-from dotenv import load_dotenv
 import os
 from random import randint
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import json
 import time
+from headless_pygame import import_pygame
+# Só o Rect, sem iniciar o SDL; o processo do servidor também pula os módulos opcionais (numpy)
+pygame = import_pygame(skip_optional=__name__ == "__main__")
+from state_arena import StateArena, DEFAULT_SLOTS as ARENA_SLOTS
+from snapshot_codec import CompressedSocket, negotiate, supported_codecs
+from phase_profiler import PROFILE_CPU, PhaseTimers, SamplingProfiler, format_report
+from memory_accounting import MemoryAccounting, format_report as format_memory_report
 
 WIDTH, HEIGHT = 960, 600
 PADDLE_WIDTH, PADDLE_HEIGHT = 120, 10
@@ -16,8 +28,72 @@ BALL_SPEED_X_INITIAL, BALL_SPEED_Y_INITIAL = 4, 4
 SPEED_INCREASE_PER_FRAME = 0.005
 MAX_SPEED = 12
 
-# Inicializar pygame para usar Rect
-pygame.init()
+# Limites de conexão
+LISTEN_BACKLOG = 128
+HANDSHAKE_TIMEOUT = 10  # segundos para o cliente enviar o nome
+IDLE_TIMEOUT = 30  # segundos sem nenhuma mensagem do cliente durante o jogo
+MAX_PENDING_HANDSHAKES = 512
+ACCEPT_ERROR_BACKOFF = 0.1  # segundos de pausa depois de um erro no accept (sem descritores livres)
+KEEPALIVE_IDLE, KEEPALIVE_INTERVAL, KEEPALIVE_COUNT = 10, 5, 3
+RESUME_GRACE = 15  # segundos que a vaga de um jogador que caiu fica guardada
+COUNTDOWN_PAUSE_POLL = 0.1  # segundos entre verificações da pausa durante a contagem regressiva
+SPECTATOR_MAX_SKIPPED = 120  # quadros seguidos sem conseguir enviar antes de derrubar um espectador
+
+# Nó atrás do lobby (lobby.py)
+HEARTBEAT_INTERVAL = 1  # segundos máximos entre dois heartbeats para o lobby
+LOBBY_RETRY_INTERVAL = 2  # segundos entre tentativas de conectar ao lobby
+WILDCARD_HOSTS = ("", "0.0.0.0", "::")  # endereços de escuta que não servem para um cliente conectar
+
+# Drenagem e reinício a quente
+DRAIN_TIMEOUT = 600  # segundos máximos esperando as partidas em andamento terminarem
+DRAIN_RESULT_DELAY = 5  # segundos mostrando o resultado antes de liberar os jogadores de uma partida decidida
+DRAIN_POLL_INTERVAL = 1
+
+# Degradação sob sobrecarga (OVERLOAD_POLICY no .env escolhe os passos e a ordem)
+DEGRADE_SEND = "envio"  # snapshots a 30 Hz para jogadores e espectadores
+DEGRADE_PHYSICS = "fisica"  # lógica a 30 Hz, com dois passos de física por quadro
+DEGRADE_ADMISSION = "admissao"  # sem partidas novas (retomadas e espectadores continuam)
+OVERLOAD_POLICY = f"{DEGRADE_SEND},{DEGRADE_PHYSICS},{DEGRADE_ADMISSION}"
+OVERLOAD_INTERVAL = 1  # segundos entre duas avaliações da carga
+OVERLOAD_LATE_RATIO = 0.05  # fração de quadros atrasados que indica sobrecarga
+OVERLOAD_CPU = 0.9  # fração de um núcleo usada pelo processo (o GIL limita o processo a ~1 núcleo)
+RECOVER_LATE_RATIO = 0.01
+RECOVER_CPU = 0.6
+RECOVER_INTERVALS = 5  # avaliações seguidas com folga antes de desfazer um passo
+RECOVER_MAX_INTERVALS = 60  # limite da espera, que dobra quando um passo desfeito volta logo
+
+# Medição com o servidor rodando (phase_profiler.py): SIGUSR1 grava um perfil das pilhas,
+# SIGUSR2 liga e desliga os temporizadores de fase
+PROFILE_SECONDS = 10  # duração de cada perfil das pilhas
+PHASE_TIMERS = PhaseTimers()  # desligados até o SIGUSR2 (ou PHASE_TIMERS=1 no .env)
+
+# Contabilidade de memória (memory_accounting.py): jogos, conexões e espectadores vivos,
+# threads e RSS a cada MEMORY_REPORT_INTERVAL segundos (0 desliga); MEMORY_DEBUG=1 liga o
+# tracemalloc e mostra os bytes por jogo e por conexão
+MEMORY_REPORT_INTERVAL = 0
+MEMORY = MemoryAccounting()
+
+# Compressão dos estados (snapshot_codec.py), em ordem de preferência. O zstd gasta
+# menos CPU por estado e o zlib menos memória por conexão; vazio desliga a compressão.
+COMPRESSION_CODECS = "zstd,zlib"
+
+# Estados de cada vaga de um jogo
+SEAT_READY = "pronto"
+SEAT_DISCONNECTED = "desconectado"
+
+# Resultado de Matchmaker.detach
+DETACH_LEFT = "saiu"
+DETACH_HELD = "guardada"
+DETACH_REPLACED = "substituida"
+
+# Resultado de play_session
+SESSION_DROPPED = "caiu"
+SESSION_QUIT = "saiu"
+SESSION_ENDED = "encerrada"
+
+# Torneios
+TOURNAMENT_SIZE = 8  # jogadores por torneio (pode ser mudado com TOURNAMENT_SIZE no .env)
+TOURNAMENT_END_DELAY = 5  # segundos mostrando o resultado da final antes de encerrar o torneio
 
 class Game:
     """
@@ -27,6 +103,7 @@ class Game:
     def __init__(self, game_id: str):
         self.game_id = game_id
         self.lock = threading.Lock() 
+        MEMORY.track("jogos", self)
         self.state = {
             "paddles": [
                 pygame.Rect(WIDTH/2 - PADDLE_WIDTH/2, HEIGHT - 20 - PADDLE_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT),
@@ -41,8 +118,26 @@ class Game:
             "connected_players": 0,
             "active": True,
             "play_again_votes": 0,
-            "player_leaved": False
+            "player_leaved": False,
+            "paused": False
         }
+        # Estado de cada vaga (None = livre), protegido pelo lock do Matchmaker
+        self.seats = [None, None]
+        # Estado serializado compartilhado por jogadores e espectadores.
+        # Cada mudança no estado incrementa version; o snapshot só é refeito quando muda.
+        self.version = 0
+        self.snapshot = None
+        self.snapshot_version = -1
+        self.spectators = []
+        # Partidas de torneio não têm revanche
+        self.rematch = True
+        self.logic_started = False
+        self.tournament = None  # id do torneio dono do jogo
+        # Drenagem com reinício a quente: os jogadores são mandados para o novo processo
+        self.moved = False
+        # Tokens das sessões das vagas e slot do jogo na arena de estado (state_arena.py)
+        self.tokens = [None, None]
+        self.arena_slot = None
     
     def get_state_copy(self):
         """Pega uma cópia segura do estado atual do jogo"""
@@ -53,21 +148,25 @@ class Game:
         """Atualiza o número de jogadores conectados de forma segura"""
         with self.lock:
             self.state["connected_players"] += delta
+            self.version += 1
     
     def set_player_name(self, player_id: int, name: str):
         """Define o nome de um jogador de forma segura"""
         with self.lock:
             self.state["player_names"][player_id] = name
+            self.version += 1
     
     def update_paddle(self, player_id: int, paddle_rect):
         """Atualiza a posição da raquete de um jogador"""
         with self.lock:
             self.state["paddles"][player_id] = paddle_rect
+            self.version += 1
     
     def increment_play_again_votes(self):
         """Adiciona um voto para jogar novamente"""
         with self.lock:
             self.state["play_again_votes"] += 1
+            self.version += 1
             return self.state["play_again_votes"]
     
     def reset_game(self):
@@ -83,17 +182,764 @@ class Game:
             self.state["countdown"] = 3
             self.state["ball_speed"] = [BALL_SPEED_X_INITIAL, BALL_SPEED_Y_INITIAL]
             self.state["play_again_votes"] = 0
+            self.version += 1
     
     def set_player_left(self):
         """Marca que um jogador saiu da partida"""
         with self.lock:
             self.state["player_leaved"] = True
+            self.version += 1
     
     def deactivate(self):
         """Desativa o jogo (encerra a partida)"""
         with self.lock:
             self.state["active"] = False
 
+    def persist(self, arena: StateArena):
+        """Grava o estado no slot do jogo na arena, alocado na primeira gravação"""
+        with self.lock:
+            if not self.state["active"]:
+                return
+            if self.arena_slot is None:
+                self.arena_slot = arena.allocate()
+                if self.arena_slot is None:
+                    return
+            arena.write(self.arena_slot, self.game_id, self.state, self.version, self.tokens)
+
+    def release_slot(self, arena: StateArena):
+        """Libera o slot de um jogo encerrado"""
+        with self.lock:
+            slot, self.arena_slot = self.arena_slot, None
+        if slot is not None:
+            arena.release(slot)
+
+    def publish(self):
+        """
+        Marca o fim de um quadro da lógica e retorna o snapshot serializado.
+        Mudanças feitas direto no estado (física, countdown) aparecem a partir daqui.
+        """
+        with self.lock:
+            self.version += 1
+        return self.encoded_state()
+
+    def encoded_state(self):
+        """
+        Estado serializado, compartilhado entre todas as conexões do jogo.
+        Só serializa de novo quando o estado mudou desde o último snapshot.
+        """
+        with self.lock:
+            if self.snapshot_version == self.version:
+                return self.snapshot
+            version = self.version
+            state = self.state.copy()
+        snapshot = pickle.dumps(state)
+        with self.lock:
+            if version > self.snapshot_version:
+                self.snapshot, self.snapshot_version = snapshot, version
+        return snapshot
+
+    def add_spectator(self, spectator: "Spectator"):
+        """Inscreve um espectador; retorna False se o jogo já terminou"""
+        with self.lock:
+            if not self.state["active"]:
+                return False
+            self.spectators.append(spectator)
+            return True
+
+    def broadcast(self, snapshot: bytes):
+        """Envia o snapshot do quadro para todos os espectadores, sem bloquear"""
+        with self.lock:
+            spectators = list(self.spectators)
+        if not spectators:
+            return
+        dropped = [spectator for spectator in spectators if not spectator.push(snapshot)]
+        if dropped:
+            with self.lock:
+                self.spectators = [s for s in self.spectators if s not in dropped]
+            for spectator in dropped:
+                print(f"Espectador {spectator.addr} desconectado do jogo {self.game_id}")
+                spectator.close()
+
+    def close_spectators(self):
+        with self.lock:
+            spectators, self.spectators = self.spectators, []
+        for spectator in spectators:
+            spectator.close()
+
+class Spectator:
+    """
+    Conexão somente leitura inscrita em um jogo.
+    O socket não bloqueia: o que não couber no buffer do kernel fica pendente e,
+    enquanto houver bytes pendentes, os quadros novos são pulados (o espectador
+    recebe sempre snapshots inteiros, mas pode perder quadros se for lento).
+    """
+    def __init__(self, conn: socket.socket, addr):
+        self.conn = conn
+        self.addr = addr
+        self.pending = b""
+        self.skipped = 0
+        conn.setblocking(False)
+        MEMORY.track("espectadores", self)
+
+    def push(self, snapshot: bytes):
+        """Retorna False se o espectador caiu ou está travado há tempo demais"""
+        try:
+            if self.pending:
+                self.pending = self.pending[self.conn.send(self.pending):]
+            if self.pending:
+                self.skipped += 1
+            else:
+                self.pending = snapshot[self.conn.send(snapshot):]
+                self.skipped = 0
+        except BlockingIOError:
+            self.skipped += 1
+        except OSError:
+            return False
+        return self.skipped < SPECTATOR_MAX_SKIPPED
+
+    def close(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+class TickHealth:
+    """
+    Saúde dos quadros da lógica de todas as partidas do processo: tempo médio e
+    pior tempo de quadro e fração de quadros atrasados (intervalo maior que o
+    dobro do período do quadro) desde a última leitura. Cada leitor (o heartbeat
+    do lobby e o controle de sobrecarga) tem a sua própria janela de contadores.
+    """
+    def __init__(self, windows=("lobby", "sobrecarga")):
+        self.lock = threading.Lock()
+        self.windows = {window: [0, 0, 0.0, 0.0] for window in windows}  # quadros, atrasados, total, pior
+
+    def record(self, tick_time: float, interval: float, period: float = 1/60):
+        late = interval > 2 * period
+        with self.lock:
+            for counters in self.windows.values():
+                counters[0] += 1
+                counters[1] += late
+                counters[2] += tick_time
+                counters[3] = max(counters[3], tick_time)
+
+    def read(self, window: str = "lobby"):
+        """Retorna os valores da janela desde a última leitura dela e zera os contadores"""
+        with self.lock:
+            ticks, late, total, worst = self.windows[window]
+            self.windows[window] = [0, 0, 0.0, 0.0]
+        ticks = ticks or 1
+        return {"tick_ms": total / ticks * 1000, "tick_max_ms": worst * 1000, "late_ratio": late / ticks}
+
+class OverloadController:
+    """
+    Degrada o processo de forma previsível quando a lógica não dá conta.
+    A cada OVERLOAD_INTERVAL segundos olha a fração de quadros atrasados e o uso de
+    CPU do processo; sob sobrecarga aplica o próximo passo da política (DEGRADE_SEND,
+    DEGRADE_PHYSICS, DEGRADE_ADMISSION, na ordem escolhida) e, depois de
+    RECOVER_INTERVALS avaliações seguidas com folga, desfaz o último passo aplicado.
+    Se a sobrecarga volta logo depois de um passo ser desfeito, a espera para
+    desfazê-lo de novo dobra (até RECOVER_MAX_INTERVALS), evitando oscilar.
+    As threads dos jogos leem send_interval, physics_steps e admitting sem lock.
+    """
+    def __init__(self, health: TickHealth, policy: str = OVERLOAD_POLICY):
+        self.health = health
+        steps = [step.strip() for step in policy.split(",") if step.strip()]
+        known = (DEGRADE_SEND, DEGRADE_PHYSICS, DEGRADE_ADMISSION)
+        for step in steps:
+            if step not in known:
+                print(f"Passo de degradação desconhecido ignorado: {step}")
+        self.policy = [step for step in steps if step in known]
+        self.level = 0  # passos da política aplicados
+        self.calm = 0  # avaliações seguidas com folga
+        self.recover_after = RECOVER_INTERVALS
+        self.since_recover = None  # avaliações desde o último passo desfeito
+        self.send_interval = 1  # quadros de 1/60 s entre dois snapshots
+        self.physics_steps = 1  # passos de física por quadro da lógica
+        self.admitting = True
+
+    def steps(self):
+        return self.policy[:self.level]
+
+    def _apply(self):
+        steps = self.steps()
+        self.send_interval = 2 if DEGRADE_SEND in steps else 1
+        self.physics_steps = 2 if DEGRADE_PHYSICS in steps else 1
+        self.admitting = DEGRADE_ADMISSION not in steps
+
+    def evaluate(self, late_ratio: float, cpu: float):
+        """Uma avaliação da carga; retorna True se o nível de degradação mudou"""
+        if self.since_recover is not None:
+            self.since_recover += 1
+            if self.since_recover > RECOVER_MAX_INTERVALS:
+                # Estável por bastante tempo: volta à espera normal
+                self.since_recover, self.recover_after = None, RECOVER_INTERVALS
+        if late_ratio > OVERLOAD_LATE_RATIO or cpu > OVERLOAD_CPU:
+            self.calm = 0
+            if self.level < len(self.policy):
+                if self.since_recover is not None and self.since_recover <= self.recover_after:
+                    self.recover_after = min(2 * self.recover_after, RECOVER_MAX_INTERVALS)
+                self.level += 1
+                self._apply()
+                return True
+        elif late_ratio < RECOVER_LATE_RATIO and cpu < RECOVER_CPU:
+            self.calm += 1
+            if self.level > 0 and self.calm >= self.recover_after:
+                self.level -= 1
+                self.calm = 0
+                self.since_recover = 0
+                self._apply()
+                return True
+        else:
+            self.calm = 0
+        return False
+
+    def run(self):
+        last_cpu, last_wall = time.process_time(), time.monotonic()
+        while True:
+            time.sleep(OVERLOAD_INTERVAL)
+            now_cpu, now_wall = time.process_time(), time.monotonic()
+            cpu = (now_cpu - last_cpu) / (now_wall - last_wall)
+            last_cpu, last_wall = now_cpu, now_wall
+            late_ratio = self.health.read("sobrecarga")["late_ratio"]
+            if self.evaluate(late_ratio, cpu):
+                steps = ", ".join(self.steps()) or "nenhuma"
+                print(f"Sobrecarga: degradação agora {steps} | quadros atrasados {late_ratio:.1%}, CPU {cpu:.0%}")
+
+class Matchmaker:
+    """
+    Pareia as conexões em jogos e guarda as sessões dos jogadores.
+    Cada jogador recebe um token no handshake; se a conexão cair durante uma
+    partida, a vaga fica guardada por RESUME_GRACE segundos e o jogo fica pausado
+    até o jogador retomar a sessão com o token (em um socket novo) ou a vaga expirar.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.unmatched_games = list()
+        self.sessions = {}  # token -> [jogo, player_id, conexão atual, timer da vaga guardada]
+        self.games = {}  # game_id -> jogo, para os espectadores
+        self.health = TickHealth()
+        # Sem a thread do controle (OverloadController.run) fica sempre na qualidade máxima
+        self.overload = OverloadController(self.health)
+        self.draining = False  # sem partidas novas (drenagem do processo ou do lobby)
+        self.handed_off = False  # reinício a quente: o novo processo assumiu o endereço
+        self.arena = None  # StateArena com o estado dos jogos (ARENA_PATH no .env)
+        self.codecs = supported_codecs()  # codecs aceitos no handshake, do preferido ao último
+
+    def _new_game_id(self):
+        game_id = str(randint(1000, 9999))
+        while game_id in self.games:
+            game_id = str(randint(1000, 9999))
+        return game_id
+
+    def assign(self, conn: socket.socket):
+        """Retorna (jogo, player_id, token) para um novo jogador, ou None se o processo está drenando"""
+        token = secrets.token_hex(16)
+        with self.lock:
+            if self.draining:
+                return None
+            game = None
+            while self.unmatched_games:
+                candidate = self.unmatched_games.pop()
+                with candidate.lock:
+                    is_active = candidate.state["active"]
+                if is_active:
+                    game, player_id = candidate, 1
+                    print(f"Adicionando jogador ao jogo {game.game_id}")
+                    break
+            if game is None:
+                game_id = self._new_game_id()
+                game, player_id = Game(game_id), 0
+                self.games[game_id] = game
+                self.unmatched_games.append(game)
+                print(f"Criando novo jogo {game.game_id}")
+            game.seats[player_id] = SEAT_READY
+            game.tokens[player_id] = token
+            self.sessions[token] = [game, player_id, conn, None]
+        return game, player_id, token
+
+    def reserve(self, tokens: list, names: list):
+        """
+        Cria um jogo para um par formado pelo lobby, com as duas vagas guardadas.
+        Cada jogador entra com {"resume": token}; quem não chegar em RESUME_GRACE
+        segundos perde a vaga como se a conexão tivesse caído.
+        """
+        with self.lock:
+            game = Game(self._new_game_id())
+            self.games[game.game_id] = game
+            for player_id, (token, name) in enumerate(zip(tokens, names)):
+                game.state["player_names"][player_id] = name
+                self._hold(game, player_id, token)
+            game.state["paused"] = True
+        print(f"Jogo {game.game_id} reservado pelo lobby para {names[0]} e {names[1]}")
+        return game
+
+    def restore(self, record: dict):
+        """
+        Recria um jogo gravado na arena por um processo que caiu. As duas vagas
+        ficam guardadas como num reserve e a partida continua de onde parou quando
+        os jogadores voltarem com {"resume": token}. Retorna None se o jogo não
+        pode ser retomado (já encerrado ou sem as duas sessões).
+        """
+        if not record["active"] or record["player_leaved"] or None in record["tokens"]:
+            return None
+        game = Game(record["game_id"])
+        with game.lock:
+            game.state["paddles"] = [pygame.Rect(x, y, PADDLE_WIDTH, PADDLE_HEIGHT) for x, y in record["paddles"]]
+            game.state["ball"] = pygame.Rect(*record["ball"], BALL_RADIUS * 2, BALL_RADIUS * 2)
+            game.state["ball_speed"] = record["ball_speed"]
+            game.state["winner_id"] = record["winner_id"]
+            game.state["countdown"] = record["countdown"]
+            game.state["game_started"] = record["game_started"]
+            game.state["play_again_votes"] = record["play_again_votes"]
+            game.state["player_names"] = record["player_names"]
+            game.state["paused"] = True
+            game.version = record["version"]
+            game.arena_slot = record["slot"]
+        with self.lock:
+            if game.game_id in self.games:
+                return None
+            self.games[game.game_id] = game
+            for player_id, token in enumerate(record["tokens"]):
+                self._hold(game, player_id, token)
+        return game
+
+    def _hold(self, game: "Game", player_id: int, token: str):
+        """Guarda a vaga de um jogador ainda sem conexão por RESUME_GRACE segundos"""
+        game.seats[player_id] = SEAT_DISCONNECTED
+        game.tokens[player_id] = token
+        timer = threading.Timer(RESUME_GRACE, self._expire, args=(token, game, player_id))
+        timer.daemon = True
+        timer.start()
+        self.sessions[token] = [game, player_id, None, timer]
+
+    def resume(self, token: str, conn: socket.socket):
+        """Retorna (jogo, player_id) se a sessão do token ainda puder ser retomada"""
+        with self.lock:
+            session = self.sessions.get(token)
+            if session is None:
+                return None
+            game, player_id, old_conn, timer = session
+            with game.lock:
+                if not game.state["active"]:
+                    return None
+            session[2] = conn
+            if game.seats[player_id] == SEAT_DISCONNECTED:
+                timer.cancel()
+                session[3] = None
+                game.seats[player_id] = SEAT_READY
+                with game.lock:
+                    game.state["connected_players"] += 1
+                    game.state["paused"] = SEAT_DISCONNECTED in game.seats
+            elif old_conn is not None:
+                # A conexão antiga ainda não percebeu a queda (meio aberta): é substituída
+                try:
+                    old_conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            return game, player_id
+
+    def detach(self, token: str, conn: socket.socket, dropped: bool):
+        """
+        Desliga a conexão de um jogador do jogo.
+        Se a conexão caiu no meio de uma partida a vaga é guardada (DETACH_HELD),
+        se outra conexão já retomou a sessão nada muda (DETACH_REPLACED) e, caso
+        contrário, o jogador sai do jogo (DETACH_LEFT).
+        """
+        with self.lock:
+            session = self.sessions.get(token)
+            if session is None or session[2] is not conn:
+                return DETACH_REPLACED
+            game, player_id = session[0], session[1]
+            with game.lock:
+                game.state["connected_players"] -= 1
+                resumable = (dropped and RESUME_GRACE > 0 and game.state["active"]
+                             and not game.state["player_leaved"]
+                             and game.seats[1 - player_id] is not None)
+                if resumable:
+                    game.state["paused"] = True
+            if resumable:
+                game.seats[player_id] = SEAT_DISCONNECTED
+                session[2] = None
+                session[3] = threading.Timer(RESUME_GRACE, self._expire, args=(token, game, player_id))
+                session[3].daemon = True
+                session[3].start()
+                return DETACH_HELD
+            game.seats[player_id] = None
+            del self.sessions[token]
+
+        self._leave(game)
+        return DETACH_LEFT
+
+    def _expire(self, token: str, game: "Game", player_id: int):
+        """Libera a vaga guardada se o jogador não voltou a tempo"""
+        with self.lock:
+            if game.seats[player_id] != SEAT_DISCONNECTED:
+                return
+            game.seats[player_id] = None
+            self.sessions.pop(token, None)
+        print(f"Sessão do Jogador {player_id+1} do jogo {game.game_id} expirou")
+        self._leave(game)
+
+    def _leave(self, game: "Game"):
+        leave_game(game)
+        with game.lock:
+            is_active = game.state["active"]
+        if not is_active:
+            with self.lock:
+                self.games.pop(game.game_id, None)
+                # Jogo que ficou sozinho na fila sairia dela só no próximo assign
+                if game in self.unmatched_games:
+                    self.unmatched_games.remove(game)
+            # Jogos que nunca chegaram a rodar a lógica (recuperados da arena) liberam o slot aqui
+            if self.arena is not None:
+                game.release_slot(self.arena)
+
+    def find_game(self, game_id: str = None):
+        """
+        Jogo para um espectador: o game_id pedido ou, sem id, a partida em andamento
+        com mais espectadores (a partida em destaque).
+        """
+        with self.lock:
+            if game_id is not None:
+                return self.games.get(str(game_id))
+            # Jogadores e espectadores de cada jogo lidos sob o lock do jogo, como no assign
+            featured, most_watched = None, -1
+            for game in self.games.values():
+                with game.lock:
+                    running = game.state["connected_players"] == 2
+                    watching = len(game.spectators)
+                if running and watching > most_watched:
+                    featured, most_watched = game, watching
+        return featured
+
+    def status(self):
+        """Carga do nó enviada ao lobby em cada heartbeat"""
+        with self.lock:
+            games = list(self.games.values())
+        return {"matches": len(games), "games": [game.game_id for game in games],
+                "players": sum(game.state["connected_players"] for game in games),
+                "draining": self.draining, "admitting": self.overload.admitting,
+                "degraded": self.overload.steps(), **self.health.read("lobby")}
+
+    def memory_report(self):
+        """Relatório de memória com os jogos registrados (os vivos além deles estão vazando)"""
+        report = MEMORY.report()
+        with self.lock:
+            report["registrados"] = {"jogos": len(self.games), "fila": len(self.unmatched_games),
+                                     "sessoes": len(self.sessions)}
+        return report
+
+    def register(self, game: "Game"):
+        """Deixa um jogo criado fora do pareamento (torneio) visível para os espectadores"""
+        with self.lock:
+            self.games[game.game_id] = game
+
+    def unregister(self, game: "Game"):
+        with self.lock:
+            self.games.pop(game.game_id, None)
+
+class HandshakeTracker:
+    """
+    Limita os handshakes simultâneos e conta como cada um terminou
+    (concluido, retomado, espectador, encaminhado, sobrecarga, retomada_invalida, timeout,
+    desconectado, erro, recusado).
+    """
+    def __init__(self, max_pending: int = MAX_PENDING_HANDSHAKES):
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def try_begin(self):
+        """Reserva um handshake; retorna False se o limite foi atingido"""
+        if self.pending.acquire(blocking=False):
+            return True
+        self.count("recusado")
+        return False
+
+    def finish(self, outcome: str):
+        """Libera o handshake reservado e conta o resultado"""
+        self.pending.release()
+        return self.count(outcome)
+
+    def count(self, outcome: str):
+        with self.lock:
+            self.counters[outcome] = self.counters.get(outcome, 0) + 1
+            return self.counters[outcome]
+
+    def aborted(self):
+        with self.lock:
+            return sum(n for outcome, n in self.counters.items()
+                       if outcome not in ("concluido", "retomado", "espectador", "encaminhado", "sobrecarga"))
+
+class Entrant:
+    """Jogador inscrito em um torneio; a partida atual é trocada pela thread do torneio"""
+    def __init__(self, name: str, lobby: Game):
+        self.name = name
+        self.lobby = lobby  # sala de espera até a primeira partida
+        self.assignment = None  # (jogo, vaga) da partida atual
+        self.eliminated = False
+        self.left = False
+
+class Tournament:
+    """
+    Torneio eliminatório para um grupo fechado de jogadores.
+    Uma única thread (run) conduz todas as partidas da rodada (countdown, física e
+    snapshots), sem threads por partida. As partidas de uma rodada começam juntas,
+    com todas as contagens regressivas ao mesmo tempo, e os vencedores (winner_id)
+    avançam quando a última termina. Com número ímpar, o último jogador passa direto.
+    """
+    def __init__(self, tournament_id: int, entrants: list, lobby: Game, matchmaker: Matchmaker):
+        self.tournament_id = tournament_id
+        self.entrants = entrants
+        self.lobby = lobby
+        self.matchmaker = matchmaker
+        self.round = 0
+        self.matches = []  # [(jogo, [inscrito da vaga 0, inscrito da vaga 1])] da rodada atual
+        self.bye = None
+        self.games = []  # todos os jogos do torneio, encerrados no final
+        self.finished = False
+        self.cancelled = False  # fim do prazo da drenagem
+
+    def start_round(self, players: list):
+        """Cria as partidas da próxima rodada e avisa cada jogador da sua vaga"""
+        self.round += 1
+        self.matches = []
+        for index in range(0, len(players) - 1, 2):
+            pair = players[index:index + 2]
+            game = Game(f"T{self.tournament_id}-R{self.round}-{index // 2 + 1}")
+            game.rematch = False
+            game.tournament = self.tournament_id
+            with game.lock:
+                game.state["player_names"] = [entrant.name for entrant in pair]
+                game.state["connected_players"] = 2
+                game.state["game_started"] = True
+            game.seats = [SEAT_READY, SEAT_READY]
+            self.matches.append((game, pair))
+            self.games.append(game)
+            self.matchmaker.register(game)
+            for seat, entrant in enumerate(pair):
+                entrant.assignment = (game, seat)
+        self.bye = players[-1] if len(players) % 2 else None
+        bye_text = f" ({self.bye.name} passa direto)" if self.bye else ""
+        print(f"Torneio {self.tournament_id}: rodada {self.round} com {len(self.matches)} partidas{bye_text}")
+
+    def tick(self, round_tick: int, broadcast: bool = True):
+        """Executa um quadro de todas as partidas da rodada; retorna quantas ainda não terminaram"""
+        countdown = max(0, 3 - round_tick // 60)
+        running = 0
+        for game, pair in self.matches:
+            with game.lock:
+                if game.state["winner_id"] is not None:
+                    continue
+                game.state["countdown"] = countdown
+                # Quem saiu ou caiu perde por W.O.
+                left = [entrant.left for entrant in pair]
+                if any(left):
+                    game.state["winner_id"] = 0 if all(left) else left.index(False)
+            lap = PHASE_TIMERS.lap("torneio")
+            game_tick(game, lap)
+            snapshot = game.publish()
+            if lap:
+                lap("publicar")
+            if broadcast:
+                game.broadcast(snapshot)
+                if lap:
+                    lap("espectadores")
+            if self.matchmaker.arena is not None:
+                game.persist(self.matchmaker.arena)
+                if lap:
+                    lap("arena")
+            with game.lock:
+                running += game.state["winner_id"] is None
+        return running
+
+    def play_round(self):
+        """
+        Conduz a rodada a 60 quadros por segundo até a última partida terminar
+        (sob sobrecarga, menos quadros com mais passos de física e menos snapshots).
+        """
+        overload = self.matchmaker.overload
+        started = time.perf_counter()
+        next_tick = last_tick_start = started
+        round_tick, loops, late, total, worst = 0, 0, 0, 0.0, 0.0
+        unsent = 0  # quadros de 1/60 s desde o último snapshot para os espectadores
+        while True:
+            steps = overload.physics_steps
+            tick_start = time.perf_counter()
+            for step in range(steps):
+                unsent += 1
+                broadcast = step == steps - 1 and unsent >= overload.send_interval
+                running = self.tick(round_tick, broadcast)
+                round_tick += 1
+                unsent = 0 if broadcast else unsent
+            tick_time = time.perf_counter() - tick_start
+            self.matchmaker.health.record(tick_time, tick_start - last_tick_start, steps/60)
+            last_tick_start = tick_start
+            total += tick_time
+            worst = max(worst, tick_time)
+            loops += 1
+            if not running or self.cancelled:
+                break
+            next_tick += steps/60
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Quadro atrasado: não tenta compensar os quadros perdidos
+                late += 1
+                next_tick = time.perf_counter()
+        print(f"Torneio {self.tournament_id}: rodada {self.round} terminou em {time.perf_counter() - started:.1f}s | "
+              f"{len(self.matches)} partidas | quadro médio {total / loops * 1000:.2f} ms, "
+              f"pior {worst * 1000:.2f} ms | quadros atrasados: {late}/{loops}")
+
+    def advance(self):
+        """Retorna os jogadores da próxima rodada e marca os eliminados"""
+        winners = []
+        for game, pair in self.matches:
+            with game.lock:
+                winner_id = game.state["winner_id"]
+            pair[1 - winner_id].eliminated = True
+            winners.append(pair[winner_id])
+        if self.bye:
+            winners.append(self.bye)
+        return winners
+
+    def run(self):
+        print(f"Torneio {self.tournament_id} iniciado com {len(self.entrants)} jogadores")
+        players = list(self.entrants)
+        while len(players) > 1 and not self.cancelled:
+            self.start_round(players)
+            self.play_round()
+            if self.cancelled:
+                print(f"Torneio {self.tournament_id} cancelado na rodada {self.round}")
+                break
+            players = self.advance()
+        if len(players) == 1:
+            print(f"Torneio {self.tournament_id}: {players[0].name} é o campeão!")
+
+        # Mostra o resultado da final por alguns segundos e encerra todas as partidas
+        time.sleep(TOURNAMENT_END_DELAY)
+        for game in self.games + [self.lobby]:
+            game.deactivate()
+            game.close_spectators()
+            self.matchmaker.unregister(game)
+            if self.matchmaker.arena is not None:
+                game.release_slot(self.matchmaker.arena)
+        self.finished = True
+        print(f"Torneio {self.tournament_id} encerrado")
+
+class TournamentManager:
+    """
+    Forma os grupos de inscritos em torneios: quando o grupo chega a size jogadores,
+    o torneio começa na sua própria thread e um novo grupo começa a se formar.
+    """
+    def __init__(self, matchmaker: Matchmaker, size: int = TOURNAMENT_SIZE):
+        self.matchmaker = matchmaker
+        self.size = max(2, size)
+        self.lock = threading.Lock()
+        self.count = 0
+        self.waiting = []
+        self.lobby = self._new_lobby()
+        self.tournaments = []
+        self.closed = False
+
+    def _new_lobby(self):
+        # Estado mostrado enquanto o grupo se forma ("Aguardando oponente...")
+        lobby = Game(f"T{self.count + 1}-espera")
+        lobby.rematch = False
+        with lobby.lock:
+            lobby.state["connected_players"] = 1
+        return lobby
+
+    def join(self, name: str):
+        """Inscreve um jogador no grupo atual e retorna o Entrant"""
+        with self.lock:
+            entrant = Entrant(name, self.lobby)
+            self.waiting.append(entrant)
+            print(f"{name} inscrito no torneio {self.count + 1} ({len(self.waiting)}/{self.size})")
+            if len(self.waiting) < self.size or self.closed:
+                return entrant
+            self.count += 1
+            tournament = Tournament(self.count, self.waiting, self.lobby, self.matchmaker)
+            self.tournaments = [t for t in self.tournaments if not t.finished] + [tournament]
+            self.waiting = []
+            self.lobby = self._new_lobby()
+        threading.Thread(target=tournament.run).start()
+        return entrant
+
+    def close(self):
+        """Drenagem: não começa mais torneios; retorna a sala de espera do grupo incompleto"""
+        with self.lock:
+            self.closed = True
+            self.waiting = []
+            return self.lobby
+
+    def running(self):
+        with self.lock:
+            return [t for t in self.tournaments if not t.finished]
+
+    def leave(self, entrant: Entrant):
+        """Tira do grupo quem saiu antes do início; depois disso a saída vira W.O."""
+        with self.lock:
+            if entrant in self.waiting:
+                self.waiting.remove(entrant)
+        entrant.left = True
+
+def configure_socket(conn: socket.socket):
+    """Ativa o TCP keepalive para detectar conexões meio abertas"""
+    conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # Opções disponíveis apenas em alguns sistemas (Linux)
+    for option, value in (("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+                          ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+                          ("TCP_KEEPCNT", KEEPALIVE_COUNT)):
+        if hasattr(socket, option):
+            conn.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+def receive_hello(conn: socket.socket):
+    """
+    Recebe a primeira mensagem do cliente respeitando o prazo do handshake:
+    {"name": nome} para uma sessão nova, {"name": nome, "tournament": True} para
+    entrar em um torneio, {"resume": token} para retomar uma sessão ou
+    {"spectate": game_id} para assistir a um jogo.
+    Lança socket.timeout ou ConnectionError se o cliente não responder e ValueError
+    se os campos do handshake tiverem tipos inválidos.
+    """
+    data = conn.recv(2048)
+    if not data:
+        raise ConnectionError("conexão encerrada durante o handshake")
+    try:
+        hello = pickle.loads(data)
+    except Exception as e:
+        print(f"Erro ao receber nome: {e}")
+        return {"name": "Fulano"}
+    # Clientes de teste mandam apenas o nome
+    hello = hello if isinstance(hello, dict) else {"name": hello}
+    validate_hello(hello)
+    return hello
+
+def validate_hello(hello: dict):
+    """Lança ValueError se um campo do handshake não tiver o tipo esperado"""
+    if not isinstance(hello.get("name", ""), str):
+        raise ValueError("nome inválido no handshake")
+    if "resume" in hello and not isinstance(hello["resume"], str):
+        raise ValueError("token de retomada inválido no handshake")
+    if "spectate" in hello and not isinstance(hello["spectate"], (str, int, type(None))):
+        raise ValueError("jogo inválido no handshake")
+    offered = hello.get("compress")
+    if offered is not None and not (isinstance(offered, (list, tuple))
+                                    and all(isinstance(codec, str) for codec in offered)):
+        raise ValueError("lista de codecs inválida no handshake")
+
+def leave_game(game: Game):
+    """Marca a saída de um jogador e desativa o jogo se ninguém mais estiver conectado"""
+    game.set_player_left()
+    with game.lock:
+        empty = game.state["connected_players"] == 0
+    if empty:
+        game.deactivate()
+        print(f"Jogo {game.game_id} encerrado - sem jogadores")
+
 def countdown_thread(game: Game):
     """
     Faz a contagem regressiva antes do jogo começar
@@ -104,11 +950,18 @@ def countdown_thread(game: Game):
         with game.lock:
             is_active = game.state["active"]
             current_countdown = game.state["countdown"]
+            paused = game.state["paused"]
         if not is_active:
             break
-        if current_countdown > 0:
+        if paused:
+            # Jogador caído com a vaga guardada: a contagem para, como a física
+            time.sleep(COUNTDOWN_PAUSE_POLL)
+        elif current_countdown > 0:
             time.sleep(1)
             with game.lock:
+                # A pausa pode ter começado durante o segundo: esse segundo não conta
+                if game.state["paused"]:
+                    continue
                 game.state["countdown"] -= 1
                 print(f"Jogo {game.game_id}: Countdown = {game.state['countdown']+1}")
         else:
@@ -118,105 +971,366 @@ def countdown_thread(game: Game):
     
     print(f"Countdown do jogo {game.game_id} finalizado")
 
-def game_logic_thread(game: Game):
+def physics_step(ball, ball_speed, paddles):
+    """
+    Calcula um passo da física da bola a partir de cópias do estado.
+    Retorna (nova_x, nova_y, velocidade_x, velocidade_y, vencedor).
+    """
+    ball_speed_x, ball_speed_y = ball_speed
+    
+    # Aumenta velocidade gradualmente
+    if abs(ball_speed_y) < MAX_SPEED:
+        new_speed_y = abs(ball_speed_y) + SPEED_INCREASE_PER_FRAME
+        ball_speed_y = math.copysign(new_speed_y, ball_speed_y)
+    
+    if abs(ball_speed_x) < MAX_SPEED:
+        new_speed_x = abs(ball_speed_x) + SPEED_INCREASE_PER_FRAME
+        ball_speed_x = math.copysign(new_speed_x, ball_speed_x)
+    
+    # Calcula nova posição da bola
+    new_ball_x = ball.x + ball_speed_x
+    new_ball_y = ball.y + ball_speed_y
+    
+    # Colisões com paredes laterais
+    if new_ball_x <= 0 or new_ball_x >= WIDTH - ball.width:
+        ball_speed_x *= -1
+        new_ball_x = ball.x + ball_speed_x  # Recalcula posição
+    
+    # Cria rect temporário para teste de colisão
+    temp_ball = pygame.Rect(new_ball_x, new_ball_y, ball.width, ball.height)
+    
+    # Colisões com raquetes
+    if (temp_ball.colliderect(paddles[0]) and ball_speed_y > 0):
+        ball_speed_y = -abs(ball_speed_y)
+        new_ball_y = ball.y + ball_speed_y
+    elif (temp_ball.colliderect(paddles[1]) and ball_speed_y < 0):
+        ball_speed_y = abs(ball_speed_y)
+        new_ball_y = ball.y + ball_speed_y
+    
+    # Verifica condições de vitória
+    new_winner_id = None
+    if new_ball_y <= 0:
+        new_winner_id = 0
+    elif new_ball_y >= HEIGHT - ball.height:
+        new_winner_id = 1
+    
+    return new_ball_x, new_ball_y, ball_speed_x, ball_speed_y, new_winner_id
+
+def game_tick(game: Game, lap=None):
+    """
+    Executa um quadro da lógica do jogo.
+    Retorna False quando o jogo foi desativado e a thread deve encerrar.
+    lap marca as fases do quadro nos temporizadores de fase (PHASE_TIMERS).
+    """
+    # Leitura rápida do estado com lock mínimo
+    with game.lock:
+        if lap:
+            lap("espera_lock")
+        is_active = game.state["active"]
+        countdown = game.state["countdown"]
+        winner_id = game.state["winner_id"]
+        paused = game.state["paused"]
+    if lap:
+        lap("leitura")
+    
+    # Verifica se deve continuar
+    if not is_active:
+        return False
+
+    # Só processa física se jogo está rodando (e não pausado esperando uma reconexão)
+    if countdown <= 0 and winner_id is None and not paused:
+        
+        # Captura snapshot do estado atual com lock mínimo
+        with game.lock:
+            if lap:
+                lap("espera_lock")
+            current_ball = game.state["ball"].copy()
+            current_speed = game.state["ball_speed"].copy()
+            current_paddles = [paddle.copy() for paddle in game.state["paddles"]]
+            connected_players = game.state["connected_players"]
+        if lap:
+            lap("copia")
+        
+        new_ball_x, new_ball_y, ball_speed_x, ball_speed_y, new_winner_id = physics_step(
+            current_ball, current_speed, current_paddles)
+        if lap:
+            lap("fisica")
+        
+        #  Aplicação dos resultados com lock mínimo
+        with game.lock:
+            if lap:
+                lap("espera_lock")
+            game.state["ball"].x = new_ball_x
+            game.state["ball"].y = new_ball_y
+            game.state["ball_speed"] = [ball_speed_x, ball_speed_y]
+            
+            if new_winner_id is not None:
+                game.state["winner_id"] = new_winner_id
+                if connected_players == 2:
+                    print(f'Jogo {game.game_id}: Jogador {new_winner_id+1} venceu!')
+        if lap:
+            lap("aplicar")
+    return True
+
+def game_logic_thread(game: Game, matchmaker: Matchmaker):
     """
     Controla o movimento da bola e verifica quem ganhou.
     """
     print(f"Iniciando lógica do jogo {game.game_id}")
 
+    arena = matchmaker.arena
+    overload = matchmaker.overload
+    unsent = 0  # quadros de 1/60 s desde o último snapshot para os espectadores
+    last_tick_start = tick_start = time.perf_counter()
     while True:
-        # Leitura rápida do estado com lock mínimo
-        with game.lock:
-            is_active = game.state["active"]
-            countdown = game.state["countdown"]
-            winner_id = game.state["winner_id"]
-        
-        # Verifica se deve continuar
-        if not is_active:
+        # Sob sobrecarga a lógica roda a 30 Hz com dois passos de física por quadro
+        steps = overload.physics_steps
+        lap = PHASE_TIMERS.lap("logica")
+        if not all(game_tick(game, lap) for _ in range(steps)):
             break
+        # Serializa o quadro uma vez e distribui para os espectadores
+        snapshot = game.publish()
+        if lap:
+            lap("publicar")
+        unsent += steps
+        if unsent >= overload.send_interval:
+            game.broadcast(snapshot)
+            unsent = 0
+            if lap:
+                lap("espectadores")
+        if arena is not None:
+            game.persist(arena)
+            if lap:
+                lap("arena")
+        matchmaker.health.record(time.perf_counter() - tick_start, tick_start - last_tick_start, steps/60)
+        time.sleep(steps/60)  # 60 quadros por segundo
+        last_tick_start, tick_start = tick_start, time.perf_counter()
+    game.close_spectators()
+    if arena is not None:
+        game.release_slot(arena)
+    print(f"Encerrando lógica do jogo {game.game_id}")
 
-        # Só processa física se jogo está rodando
-        if countdown <= 0 and winner_id is None:
-            
-            # Captura snapshot do estado atual com lock mínimo
-            with game.lock:
-                current_ball = game.state["ball"].copy()
-                current_speed = game.state["ball_speed"].copy()
-                current_paddles = [paddle.copy() for paddle in game.state["paddles"]]
-                connected_players = game.state["connected_players"]
-            
-            ball_speed_x, ball_speed_y = current_speed
-            
-            # Aumenta velocidade gradualmente
-            if abs(ball_speed_y) < MAX_SPEED:
-                new_speed_y = abs(ball_speed_y) + SPEED_INCREASE_PER_FRAME
-                ball_speed_y = math.copysign(new_speed_y, ball_speed_y)
-            
-            if abs(ball_speed_x) < MAX_SPEED:
-                new_speed_x = abs(ball_speed_x) + SPEED_INCREASE_PER_FRAME
-                ball_speed_x = math.copysign(new_speed_x, ball_speed_x)
-            
-            # Calcula nova posição da bola
-            new_ball_x = current_ball.x + ball_speed_x
-            new_ball_y = current_ball.y + ball_speed_y
-            
-            # Colisões com paredes laterais
-            if new_ball_x <= 0 or new_ball_x >= WIDTH - current_ball.width:
-                ball_speed_x *= -1
-                new_ball_x = current_ball.x + ball_speed_x  # Recalcula posição
+def start_game(game: Game, matchmaker: Matchmaker):
+    """Inicia a lógica do jogo e o countdown quando os dois jogadores estão conectados"""
+    with game.lock:
+        if game.state["connected_players"] < 2 or game.logic_started:
+            return
+        game.logic_started = True
+        game.state["game_started"] = True
+    game_logic = threading.Thread(target=game_logic_thread, args=(game, matchmaker))
+    game_logic.start()
+    countdown_logic = threading.Thread(target=countdown_thread, args=(game,))
+    countdown_logic.start()
+
+def memory_report_thread(matchmaker: Matchmaker, interval: float):
+    """Mostra periodicamente a memória do processo e os objetos vivos"""
+    while True:
+        time.sleep(interval)
+        print(format_memory_report(matchmaker.memory_report()))
+
+def lobby_link_thread(matchmaker: Matchmaker, lobby_address, node_address):
+    """
+    Mantém o nó registrado no lobby. O nó manda um heartbeat com a sua carga e a
+    saúde dos quadros; o lobby responde (em até HEARTBEAT_INTERVAL) com os pares
+    a reservar e se o nó está em drenagem. As reservas feitas voltam no próximo
+    heartbeat, que é enviado logo em seguida.
+    """
+    while not matchmaker.handed_off:
+        try:
+            with socket.create_connection(lobby_address, timeout=3 * HEARTBEAT_INTERVAL) as link:
+                stream = link.makefile("rb")
+                print(f"Nó {node_address[0]}:{node_address[1]} registrado no lobby {lobby_address[0]}:{lobby_address[1]}")
+                reserved = []
+                # Depois de um reinício a quente quem fala com o lobby é o novo processo
+                while not matchmaker.handed_off:
+                    heartbeat = {"node": node_address, "reserved": reserved, **matchmaker.status()}
+                    link.sendall(pickle.dumps(heartbeat))
+                    reply = pickle.load(stream)
+                    if reply.get("drain") and not matchmaker.draining:
+                        print("Nó em drenagem: o lobby não manda mais partidas novas")
+                    matchmaker.draining = matchmaker.draining or reply.get("drain", False)
+                    reserved = [(tokens[0], matchmaker.reserve(tokens, names).game_id)
+                                for tokens, names in reply.get("reserve", [])]
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            print(f"Sem conexão com o lobby ({e}); tentando de novo em {LOBBY_RETRY_INTERVAL}s")
+            time.sleep(LOBBY_RETRY_INTERVAL)
+
+def play_session(conn: socket.socket, game: Game, player_id: int, player_name: str,
+                 overload: OverloadController, until=None):
+    """
+    Loop principal de um jogador: manda o estado e recebe a raquete ou um comando.
+    Retorna SESSION_DROPPED se a conexão caiu, SESSION_QUIT se o jogador saiu e
+    SESSION_ENDED se o jogo terminou (ou until() ficou verdadeiro).
+    """
+    last_send = 0.0
+    while game.state["active"] and not (until and until()):
+        lap = PHASE_TIMERS.lap("sessao")
+        try:
+            if game.moved:
+                # Reinício a quente: o cliente volta como jogador novo no novo processo
+                conn.send(pickle.dumps({"redirect": conn.getsockname()[:2], "token": None}))
+                return SESSION_QUIT
+
+            # Sob sobrecarga o estado sai em intervalos maiores (o cliente responde a cada estado)
+            if overload.send_interval > 1:
+                delay = last_send + overload.send_interval / 60 - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                if lap:
+                    lap("atraso_sobrecarga")
+
+            # Manda o estado atual do jogo (serializado uma vez por quadro) para o cliente
+            snapshot = game.encoded_state()
+            if lap:
+                lap("estado")
+            conn.send(snapshot)
+            last_send = time.perf_counter()
+            if lap:
+                lap("envio")
             
-            # Cria rect temporário para teste de colisão
-            temp_ball = pygame.Rect(new_ball_x, new_ball_y, current_ball.width, current_ball.height)
+            data = conn.recv(2048)
+            if not data: # Cliente desconectou
+                return SESSION_DROPPED
+            if lap:
+                lap("recv")
             
-            # Colisões com raquetes
-            if (temp_ball.colliderect(current_paddles[0]) and ball_speed_y > 0):
-                ball_speed_y = -abs(ball_speed_y)
-                new_ball_y = current_ball.y + ball_speed_y
-            elif (temp_ball.colliderect(current_paddles[1]) and ball_speed_y < 0):
-                ball_speed_y = abs(ball_speed_y)
-                new_ball_y = current_ball.y + ball_speed_y
+            received_data = pickle.loads(data)
+            if lap:
+                lap("desserializar")
             
-            # Verifica condições de vitória
-            new_winner_id = None
-            if new_ball_y <= 0:
-                new_winner_id = 0
-            elif new_ball_y >= HEIGHT - current_ball.height:
-                new_winner_id = 1
+            if isinstance(received_data, str) and received_data == "quit":
+                return SESSION_QUIT
             
-            #  Aplicação dos resultados com lock mínimo
-            with game.lock:
-                game.state["ball"].x = new_ball_x
-                game.state["ball"].y = new_ball_y
-                game.state["ball_speed"] = [ball_speed_x, ball_speed_y]
+            if isinstance(received_data, str) and received_data == "play_again" and game.rematch:
+                votes = game.increment_play_again_votes()
+                print(f"Voto para reiniciar jogo {game.game_id}: {votes}/2")
                 
-                if new_winner_id is not None:
-                    game.state["winner_id"] = new_winner_id
-                    if connected_players == 2:
-                        print(f'Jogo {game.game_id}: Jogador {new_winner_id+1} venceu!')
-        
-        time.sleep(1/60)  # 60 quadros por segundo
-    print(f"Encerrando lógica do jogo {game.game_id}")
+                # Se ambos votaram, reinicia o jogo
+                if votes >= 2:
+                    print(f"Reiniciando jogo {game.game_id}")
+                    game.reset_game()
+                    countdown_logic = threading.Thread(target=countdown_thread, args=(game,))
+                    countdown_logic.start()
+                    
+            elif isinstance(received_data, pygame.Rect):
+                # Atualiza onde está a raquete do jogador
+                game.update_paddle(player_id, received_data)
+                if lap:
+                    lap("aplicar")
+            
+        except Exception as e:
+            print(f"Erro na comunicação com {player_name}: {e}")
+            return SESSION_DROPPED
+    return SESSION_ENDED
 
-def client_thread(conn: socket.socket, game: Game, player_id: int):
+def tournament_session(conn: socket.socket, entrant: Entrant, overload: OverloadController):
+    """
+    Loop de um jogador de torneio. Antes de cada partida o servidor manda, no lugar
+    de um estado, a vaga do jogador ({"player_id": vaga, "match": game_id}); entre
+    as partidas ele continua recebendo o estado da anterior (ou da sala de espera).
+    Não há retomada de sessão: quem cai ou sai perde a partida atual por W.O.
+    Retorna o resultado de play_session.
+    """
+    current = None
+    while True:
+        assignment = entrant.assignment
+        if assignment is not current:
+            current = assignment
+            game, seat = current
+            conn.send(pickle.dumps({"player_id": seat, "match": game.game_id}))
+            data = conn.recv(2048)
+            if not data:
+                return SESSION_DROPPED
+            if pickle.loads(data) == "quit":
+                return SESSION_QUIT
+        game, seat = current if current else (entrant.lobby, 0)
+        result = play_session(conn, game, seat, entrant.name, overload,
+                              until=lambda: entrant.assignment is not current)
+        if result != SESSION_ENDED or not game.state["active"]:
+            return result
+
+def forward_resume(conn: socket.socket, hello: dict):
+    """
+    Reinício a quente: manda para o processo anterior (ainda drenando) a conexão
+    que quer retomar uma sessão que ficou lá. Retorna False se não há para onde mandar.
+    """
+    path = os.getenv("PREDECESSOR_SOCKET")
+    if not path or not hasattr(socket, "send_fds"):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as link:
+            link.connect(path)
+            socket.send_fds(link, [pickle.dumps(hello)], [conn.fileno()])
+        return True
+    except OSError:
+        return False
+
+def handoff_thread(listener: socket.socket, matchmaker: Matchmaker, handshakes: HandshakeTracker,
+                   tournaments: TournamentManager):
+    """Processo antigo durante a drenagem: recebe do novo processo as retomadas das sessões daqui"""
+    while True:
+        try:
+            link, _ = listener.accept()
+        except OSError:
+            # Socket do handoff fechado no fim da drenagem
+            break
+        # Uma conexão repassada com problema (cliente que já saiu, mensagem cortada) não
+        # pode parar a thread: as retomadas seguintes ficariam presas na fila do listen()
+        conn = None
+        try:
+            with link:
+                data, fds, _, _ = socket.recv_fds(link, 4096, 1)
+            if not fds:
+                continue
+            conn = socket.socket(fileno=fds[0])
+            if not handshakes.try_begin():
+                conn.close()
+                continue
+        except OSError as e:
+            print(f"Erro ao receber conexão repassada: {e}")
+            if conn is not None:
+                conn.close()
+            continue
+        try:
+            addr = conn.getpeername()
+            hello = pickle.loads(data)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"Conexão repassada descartada: {e}")
+            handshakes.finish("desconectado" if isinstance(e, OSError) else "erro")
+            conn.close()
+            continue
+        threading.Thread(target=client_thread, args=(conn, addr, matchmaker, handshakes, tournaments, hello)).start()
+
+def client_thread(conn: socket.socket, addr, matchmaker: Matchmaker, handshakes: HandshakeTracker,
+                  tournaments: TournamentManager, hello: dict = None):
     """
     Thread que cuida da comunicação com um cliente específico.
+    hello vem preenchido quando a conexão foi repassada por outro processo do servidor.
     """
+    player_name = "Fulano"
+    MEMORY.track("conexoes", conn)
+    # O handshake reservado no accept é liberado uma única vez, mesmo se algo falhar no meio
+    finished = []
+    def finish_handshake(outcome: str):
+        finished.append(outcome)
+        return handshakes.finish(outcome)
     try:
-        print(f"Cliente conectado: Jogo {game.game_id}, Jogador {player_id+1}")
-        
-        # Manda qual jogador ele é (0 ou 1)
-        conn.send(pickle.dumps(player_id))
-        
-        # Recebe o nome que o jogador digitou
+        # Handshake com prazo: o cliente manda o nome (ou o token de uma sessão)
         try:
-            player_name = pickle.loads(conn.recv(2048))
+            conn.settimeout(HANDSHAKE_TIMEOUT)
+            if hello is None:
+                hello = receive_hello(conn)
         except Exception as e:
-            print(f"Erro ao receber nome: {e}")
-            player_name = "Fulano"
-        
-        if player_name == "\0testando\0":
+            outcome = "timeout" if isinstance(e, socket.timeout) else \
+                      "desconectado" if isinstance(e, ConnectionError) else "erro"
+            finish_handshake(outcome)
+            print(f"Handshake abortado ({outcome}) de {addr} | total de abortados: {handshakes.aborted()}")
+            return
+
+        if hello.get("name") == "\0testando\0":
+            finish_handshake("concluido")
+            conn.settimeout(IDLE_TIMEOUT)
             print("Requisição de teste.")
-            game.deactivate()
             while True:
                 data = conn.recv(2048)
                 if not data: # Cliente desconectou
@@ -226,7 +1340,88 @@ def client_thread(conn: socket.socket, game: Game, player_id: int):
                     conn.send(pickle.dumps("testando"))
                 except ConnectionError: # Socket cliente encerrado
                     break
+            return
+
+        if "spectate" in hello:
+            # Espectador: recebe os snapshots do jogo, enviados pela thread da lógica
+            finish_handshake("espectador")
+            game = matchmaker.find_game(hello["spectate"])
+            if game is None:
+                conn.send(pickle.dumps({"error": "jogo_inexistente"}))
+                return
+            conn.send(pickle.dumps({"spectating": game.game_id}))
+            # A thread do cliente termina aqui; o socket duplicado fica com o jogo
+            spectator = Spectator(conn.dup(), addr)
+            if not game.add_spectator(spectator):
+                spectator.close()
+                return
+            print(f"Espectador {addr} assistindo ao jogo {game.game_id}")
+            return
+
+        if not matchmaker.overload.admitting and "resume" not in hello:
+            # Sobrecarga: só as sessões em andamento continuam sendo atendidas
+            finish_handshake("sobrecarga")
+            conn.send(pickle.dumps({"error": "servidor_cheio"}))
+            return
+
+        if matchmaker.draining and "resume" not in hello:
+            # Drenagem: o socket continua aberto só para quem caiu retomar a sessão
+            finish_handshake("drenando")
+            conn.send(pickle.dumps({"error": "servidor_drenando"}))
+            return
+
+        # Compressão opcional do que o servidor manda, se o cliente ofereceu algum codec conhecido.
+        # O envelope é criado antes das vagas para a retomada reconhecer a mesma conexão.
+        codec = negotiate(hello.get("compress"), matchmaker.codecs)
+        if codec:
+            conn = CompressedSocket(conn, codec)
+
+        if hello.get("tournament"):
+            # Torneio: o jogador entra no grupo atual e a thread do torneio escolhe as partidas
+            finish_handshake("concluido")
+            player_name = hello.get("name", "Fulano")
+            entrant = tournaments.join(player_name)
+            try:
+                conn.send(pickle.dumps({"player_id": 0, "token": None, "tournament": True, "compress": codec}))
+                if codec:
+                    conn.start()
+                conn.settimeout(IDLE_TIMEOUT)
+                tournament_session(conn, entrant, matchmaker.overload)
+            finally:
+                tournaments.leave(entrant)
+                print(f"{player_name} saiu do torneio")
+            return
+
+        if "resume" in hello:
+            # Retoma a vaga guardada de uma conexão que caiu
+            token = hello["resume"]
+            session = matchmaker.resume(token, conn)
+            if session is None and forward_resume(conn, hello):
+                finish_handshake("encaminhado")
+                return
+            if session is None:
+                finish_handshake("retomada_invalida")
+                conn.send(pickle.dumps({"error": "sessao_expirada"}))
+                return
+            finish_handshake("retomado")
+            game, player_id = session
+            with game.lock:
+                player_name = game.state["player_names"][player_id]
+            print(f"{player_name} retomou a sessão no jogo {game.game_id}")
+            # Jogos reservados pelo lobby (ou recuperados da arena) começam quando o segundo jogador chega
+            start_game(game, matchmaker)
         else:
+            player_name = hello.get("name", "Fulano")
+            assigned = matchmaker.assign(conn)
+            if assigned is None:
+                # A drenagem começou depois da verificação acima
+                finish_handshake("drenando")
+                conn.send(pickle.dumps({"error": "servidor_drenando"}))
+                return
+            game, player_id, token = assigned
+            finish_handshake("concluido")
+            print(f"Cliente conectado: Jogo {game.game_id}, Jogador {player_id+1}")
+
             # Salva o nome do jogador no jogo
             game.set_player_name(player_id, player_name)
             print(f"Jogador {player_id+1} do jogo {game.game_id} definido como: {player_name}")
@@ -234,117 +1429,322 @@ def client_thread(conn: socket.socket, game: Game, player_id: int):
             # Aumenta o contador de jogadores conectados
             game.update_connected_players(1)
             
-            # Se ambos jogadores estão conectados, inicia countdown
-            with game.lock:
-                if game.state["connected_players"] == 2 and not game.state["game_started"]:
-                    countdown_logic = threading.Thread(target=countdown_thread, args=(game,))
-                    countdown_logic.start()
-                    game.state["game_started"] = True
-            
-            # Loop principal do cliente
-            while game.state["active"]:
-                try:
-                    # Manda o estado atual do jogo para o cliente
-                    conn.send(pickle.dumps(game.get_state_copy()))
-                    
-                    data = conn.recv(2048)
-                    if not data: # Cliente desconectou
-                        break
-                    
-                    received_data = pickle.loads(data)
-                    
-                    if isinstance(received_data, str) and received_data == "play_again":
-                        votes = game.increment_play_again_votes()
-                        print(f"Voto para reiniciar jogo {game.game_id}: {votes}/2")
-                        
-                        # Se ambos votaram, reinicia o jogo
-                        if votes >= 2:
-                            print(f"Reiniciando jogo {game.game_id}")
-                            game.reset_game()
-                            countdown_logic = threading.Thread(target=countdown_thread, args=(game,))
-                            countdown_logic.start()
-                            
-                    elif isinstance(received_data, pygame.Rect):
-                        # Atualiza onde está a raquete do jogador
-                        game.update_paddle(player_id, received_data)
-                    
-                except Exception as e:
-                    print(f"Erro na comunicação com {player_name}: {e}")
-                    break
-            
-            print(f"Desconectando {player_name} do jogo {game.game_id}")
-            game.update_connected_players(-1)
-            game.set_player_left()
-            
-            # Verifica se deve desativar o jogo
-            with game.lock:
-                if game.state["connected_players"] == 0:
-                    game.deactivate()
-                    print(f"Jogo {game.game_id} encerrado - sem jogadores")
+            # Se ambos jogadores estão conectados, inicia a lógica do jogo e o countdown
+            start_game(game, matchmaker)
+
+        dropped = True
+        try:
+            # Manda qual jogador ele é (0 ou 1) e o token para retomar a sessão
+            conn.send(pickle.dumps({"player_id": player_id, "token": token, "compress": codec}))
+            if codec:
+                conn.start()
+            conn.settimeout(IDLE_TIMEOUT)
+            dropped = play_session(conn, game, player_id, player_name, matchmaker.overload) == SESSION_DROPPED
+        finally:
+            result = matchmaker.detach(token, conn, dropped)
+            if result == DETACH_HELD:
+                print(f"Conexão de {player_name} caiu: vaga guardada por {RESUME_GRACE}s no jogo {game.game_id}")
+            elif result == DETACH_LEFT:
+                print(f"Desconectando {player_name} do jogo {game.game_id}")
     except Exception as e:
-        print(f"Erro na thread do cliente {player_name} do jogo {game.game_id}: {e}")
-    
+        print(f"Erro na thread do cliente {player_name} ({addr}): {e}")
+    finally:
+        if not finished:
+            handshakes.finish("erro")
+        try:
+            conn.close()
+        except:
+            pass
+
+def accept_loop(listener: socket.socket, matchmaker: Matchmaker, handshakes: HandshakeTracker,
+                tournaments: TournamentManager, keep_running):
+    """Aceita conexões enquanto keep_running() for verdadeiro (verificado a cada timeout do accept)"""
+    while keep_running():
+        try:
+            conn, addr = listener.accept()
+        except socket.timeout:
+            continue
+        except OSError as e:
+            # EMFILE/ENFILE ou ECONNABORTED numa rajada de conexões: espera um pouco e continua
+            print(f"Erro ao aceitar conexão: {e}")
+            time.sleep(ACCEPT_ERROR_BACKOFF)
+            continue
+        print(f"Nova conexão de {addr}")
+
+        # Recusa conexões além do limite de handshakes pendentes
+        if not handshakes.try_begin():
+            print(f"Conexão de {addr} recusada: handshakes pendentes demais")
+            conn.close()
+            continue
+        configure_socket(conn)
+
+        # Inicia thread do cliente. O pareamento só acontece depois do handshake,
+        # então conexões que não mandam o nome não ocupam vaga nem criam jogo.
+        client_logic = threading.Thread(target=client_thread, args=(conn, addr, matchmaker, handshakes, tournaments))
+        client_logic.start()
+
+def write_phase_report(report: dict, path: str):
+    """Grava o relatório dos temporizadores de fase e mostra no log"""
     try:
-        conn.close()
-    except:
-        pass
+        with open(path, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+        saved = f"relatório em {path}"
+    except OSError as e:
+        saved = f"relatório não gravado em {path}: {e}"
+    print(f"Temporizadores de fase desligados ({saved})\n{format_report(report)}")
+
+def spawn_successor(listener: socket.socket, handoff_path: str):
+    """
+    Reinício a quente: inicia um novo processo do servidor herdando o socket de escuta.
+    Retomadas de sessões deste processo chegam de volta pelo socket Unix handoff_path.
+    """
+    env = dict(os.environ, LISTEN_FD=str(listener.fileno()), PREDECESSOR_SOCKET=handoff_path)
+    return subprocess.Popen([sys.executable] + sys.argv, pass_fds=[listener.fileno()], env=env)
+
+def release_game(game: Game, successor: bool):
+    """Libera os jogadores de um jogo na drenagem: para o novo processo ou encerrando o jogo"""
+    if successor:
+        game.moved = True
+    else:
+        game.deactivate()
+
+def drain(matchmaker: Matchmaker, tournaments: TournamentManager, successor: bool):
+    """
+    Espera as partidas em andamento terminarem, sem começar partidas novas nem
+    revanches. Jogos sem oponente, com um jogador que saiu ou já decididos (depois
+    de DRAIN_RESULT_DELAY segundos) são liberados na hora: com um sucessor os
+    jogadores voltam como jogadores novos no novo processo, sem ele o jogo é
+    encerrado. Torneios em andamento vão até a final. Depois de DRAIN_TIMEOUT
+    segundos tudo o que sobrou é liberado.
+    """
+    matchmaker.draining = True
+    release_game(tournaments.close(), successor)
+    deadline = time.time() + DRAIN_TIMEOUT
+    decided_at = {}
+    while True:
+        with matchmaker.lock:
+            games = [game for game in matchmaker.games.values() if game.tournament is None]
+        in_progress = 0
+        now = time.time()
+        for game in games:
+            game.rematch = False
+            with game.lock:
+                active = game.state["active"]
+                waiting = game.state["connected_players"] < 2 and not game.logic_started
+                finished = game.state["winner_id"] is not None or game.state["player_leaved"]
+            if not active or game.moved:
+                continue
+            if waiting or (finished and now - decided_at.setdefault(game, now) >= DRAIN_RESULT_DELAY):
+                release_game(game, successor)
+            elif not finished:
+                in_progress += 1
+        tournaments_left = tournaments.running()
+        if not in_progress and not tournaments_left:
+            break
+        if now > deadline:
+            print(f"Prazo da drenagem esgotado: liberando {in_progress} partidas e {len(tournaments_left)} torneios")
+            for tournament in tournaments_left:
+                tournament.cancelled = True
+            for game in games:
+                release_game(game, successor)
+            break
+        print(f"Drenagem: {in_progress} partidas e {len(tournaments_left)} torneios em andamento")
+        time.sleep(DRAIN_POLL_INTERVAL)
+
+    # Dá tempo para as threads dos clientes mandarem o redirecionamento e encerra o resto
+    time.sleep(DRAIN_POLL_INTERVAL)
+    with matchmaker.lock:
+        games = list(matchmaker.games.values())
+    for game in games:
+        game.deactivate()
+    print("Drenagem concluída")
+
+def load_env_file():
+    """
+    Carrega o .env do diretório atual ou do diretório do servidor, sem sobrescrever
+    o que já está no ambiente. Sem .env (contêineres configurados pelo ambiente) o
+    python-dotenv nem é importado. Retorna o caminho carregado ou None.
+    """
+    for directory in (os.getcwd(), os.path.dirname(os.path.abspath(__file__))):
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return path
+    return None
 
 def main():
-    load_dotenv()
-    
-    # Configurações do servidor
-    ip_address = os.getenv("SERVER_IP")
-    port_number = int(os.getenv("SERVER_PORT"))
-    
-    # TCP socket para o servidor
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM) 
+    parser = argparse.ArgumentParser(description="Servidor Air Hockey")
+    parser.add_argument("--host", help="Endereço de escuta (padrão: SERVER_IP do ambiente ou do .env)")
+    parser.add_argument("--porta", type=int, help="Porta de escuta (padrão: SERVER_PORT do ambiente ou do .env)")
+    parser.add_argument("--anunciar", metavar="HOST",
+                        help="Endereço que o lobby passa aos clientes (padrão: NODE_HOST ou o endereço de escuta)")
+    parser.add_argument("--sem-env", action="store_true",
+                        help="Não lê o .env: configuração só pelo ambiente e pela linha de comando")
+    args = parser.parse_args()
+    if not args.sem_env:
+        load_env_file()
+
+    # Configurações do servidor: linha de comando, ambiente e .env, nessa ordem
+    ip_address = args.host or os.getenv("SERVER_IP")
+    port_number = args.porta or os.getenv("SERVER_PORT")
+    if not ip_address or not port_number:
+        print("Configure o endereço com SERVER_IP e SERVER_PORT (ou --host e --porta)")
+        return
+    port_number = int(port_number)
     
+    # TCP socket para o servidor. Num reinício a quente o socket de escuta vem do
+    # processo anterior (LISTEN_FD) e as conexões na fila do listen() não se perdem.
+    listen_fd = os.getenv("LISTEN_FD")
     try:
-        s.bind((ip_address, port_number))
-        s.listen(5) 
-        print(f"Servidor Air Hockey iniciado em {ip_address}:{port_number}")
+        if listen_fd:
+            s = socket.socket(fileno=int(listen_fd))
+            print(f"Servidor Air Hockey assumiu o socket de escuta em {ip_address}:{port_number}")
+        else:
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM) 
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind((ip_address, port_number))
+            s.listen(LISTEN_BACKLOG) 
+            print(f"Servidor Air Hockey iniciado em {ip_address}:{port_number}")
         print("Aguardando conexões...")
     except socket.error as e:
         print(f"Erro ao iniciar servidor: {e}")
         return
     
-    # Lista de jogos esperando o segundo jogador
-    unmatched_games = list()  
+    # Pareamento dos jogos, sessões, torneios e controle dos handshakes em andamento
+    matchmaker = Matchmaker()
+    handshakes = HandshakeTracker()
+    tournaments = TournamentManager(matchmaker, int(os.getenv("TOURNAMENT_SIZE", TOURNAMENT_SIZE)))
+
+    # Controle de sobrecarga: OVERLOAD_POLICY=passos separados por vírgula (vazio desliga)
+    matchmaker.overload = OverloadController(matchmaker.health, os.getenv("OVERLOAD_POLICY", OVERLOAD_POLICY))
+    if matchmaker.overload.policy:
+        threading.Thread(target=matchmaker.overload.run, daemon=True).start()
+
+    # Compressão: COMPRESSION_CODECS=tipos de codec separados por vírgula (vazio desliga)
+    matchmaker.codecs = supported_codecs(os.getenv("COMPRESSION_CODECS", COMPRESSION_CODECS).split(","))
+
+    # Arena de estado (state_arena.py): ARENA_PATH=arquivo mapeado em memória com um slot
+    # por jogo. Partidas deixadas na arena por um processo que caiu são recuperadas.
+    arena_path = os.getenv("ARENA_PATH")
+    if arena_path:
+        matchmaker.arena = StateArena(arena_path, int(os.getenv("ARENA_SLOTS", ARENA_SLOTS)))
+        recovered = 0
+        for record in matchmaker.arena.take_orphans():
+            if matchmaker.restore(record) is None:
+                matchmaker.arena.release(record["slot"])
+            else:
+                recovered += 1
+        print(f"Arena de estado em {arena_path}: {recovered} partidas recuperadas "
+              f"(vagas guardadas por {RESUME_GRACE}s)")
+
+    # Nó de um lobby (lobby.py): LOBBY_CONTROL=host:porta do canal de controle do lobby
+    # O lobby manda os clientes para o endereço anunciado (--anunciar ou NODE_HOST), que
+    # precisa ser alcançável por eles: um nó escutando em 0.0.0.0 tem que anunciar outro
+    lobby_control = os.getenv("LOBBY_CONTROL")
+    advertised_host = args.anunciar or os.getenv("NODE_HOST") or ip_address
+    if lobby_control and advertised_host in WILDCARD_HOSTS:
+        print(f"Nó não registrado no lobby: {advertised_host!r} não é um endereço para os clientes; "
+              "configure NODE_HOST ou --anunciar")
+    elif lobby_control:
+        lobby_host, _, lobby_port = lobby_control.rpartition(":")
+        lobby_link = threading.Thread(target=lobby_link_thread, daemon=True,
+                                      args=(matchmaker, (lobby_host, int(lobby_port)), (advertised_host, port_number)))
+        lobby_link.start()
+
+    # SIGTERM ou Ctrl+C: drenagem (um segundo Ctrl+C interrompe na hora).
+    # SIGHUP: reinício a quente (novo processo no mesmo socket e drenagem deste).
+    drain_request = {}
+    def request_drain(signum, frame):
+        if signum == signal.SIGINT and drain_request:
+            raise KeyboardInterrupt
+        if not drain_request:
+            drain_request["restart"] = signum == getattr(signal, "SIGHUP", None)
+            print("\nReinício a quente solicitado" if drain_request["restart"] else "\nDrenagem solicitada")
+    signal.signal(signal.SIGINT, request_drain)
+    signal.signal(signal.SIGTERM, request_drain)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, request_drain)
+
+    # Medição sem reiniciar: SIGUSR1 amostra as pilhas por PROFILE_SECONDS segundos e grava
+    # o perfil (formato collapsed, pesos de PROFILE_MODE: cpu ou parede) em PROFILE_DIR; SIGUSR2 liga os temporizadores de fase
+    # e, no próximo SIGUSR2, desliga e mostra o relatório (também gravado em PROFILE_DIR)
+    profile_dir = os.getenv("PROFILE_DIR", tempfile.gettempdir())
+    profile_seconds = float(os.getenv("PROFILE_SECONDS", PROFILE_SECONDS))
+    profiler = SamplingProfiler(mode=os.getenv("PROFILE_MODE", PROFILE_CPU))
+    def request_profile(signum, frame):
+        path = os.path.join(profile_dir, f"perfil_{os.getpid()}_{time.strftime('%Y%m%d_%H%M%S')}.txt")
+        if profiler.start(profile_seconds, path):
+            print(f"Amostrando as pilhas por {profile_seconds:.0f}s")
+    def toggle_phase_timers(signum, frame):
+        if not PHASE_TIMERS.enabled:
+            PHASE_TIMERS.enable()
+            print("Temporizadores de fase ligados")
+            return
+        report = PHASE_TIMERS.disable()
+        path = os.path.join(profile_dir, f"fases_{os.getpid()}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        # O handler roda no meio do que a thread principal estiver fazendo (accept, drenagem):
+        # o relatório é gravado em outra thread, e um erro de disco não chega ao loop principal
+        threading.Thread(target=write_phase_report, args=(report, path), daemon=True).start()
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, request_profile)
+        signal.signal(signal.SIGUSR2, toggle_phase_timers)
+    if os.getenv("PHASE_TIMERS") == "1":
+        PHASE_TIMERS.enable()
+
+    # Memória: MEMORY_DEBUG=1 atribui as alocações (tracemalloc) às funções de cada jogo e
+    # de cada conexão; MEMORY_REPORT_INTERVAL=segundos entre os relatórios no log
+    if os.getenv("MEMORY_DEBUG") == "1":
+        MEMORY.start_tracing({
+            "jogo": [Game, game_tick, physics_step, game_logic_thread, countdown_thread, start_game],
+            "conexao": [client_thread, receive_hello, play_session, tournament_session,
+                        Spectator, CompressedSocket],
+        })
+        print("Contabilidade de memória com tracemalloc ligada (servidor mais lento)")
+    memory_interval = float(os.getenv("MEMORY_REPORT_INTERVAL", MEMORY_REPORT_INTERVAL))
+    if memory_interval > 0:
+        threading.Thread(target=memory_report_thread, daemon=True, args=(matchmaker, memory_interval)).start()
+    # O accept() acorda de tempos em tempos para perceber os pedidos de drenagem
+    s.settimeout(DRAIN_POLL_INTERVAL)
     
     try:
-        while True:
-            conn, addr = s.accept()
-            print(f"Nova conexão de {addr}")
-            
-            game = None
-            player_id = int()
+        accept_loop(s, matchmaker, handshakes, tournaments, lambda: not drain_request)
 
-            # Procura se tem algum jogo esperando jogador, senão cria um novo
-            if len(unmatched_games) > 0:
-                game = unmatched_games.pop()
-                player_id = 1
-                print(f"Adicionando jogador ao jogo {game.game_id}")
-            else:
-                # Cria um jogo novo
-                game_id = str(randint(1000, 9999))
-                game = Game(game_id)
-                unmatched_games.append(game)
-                player_id = 0
-                print(f"Criando novo jogo {game.game_id}")
-                
-                # Começa a lógica do jogo (movimento da bola)
-                game_logic = threading.Thread(target=game_logic_thread, args=(game,))
-                game_logic.start()
-            
-            # Inicia thread do cliente
-            client_logic = threading.Thread(target=client_thread, args=(conn, game, player_id))
-            client_logic.start()
+        successor = handoff = None
+        if drain_request["restart"]:
+            handoff_path = ""
+            if hasattr(socket, "AF_UNIX"):
+                handoff_path = os.path.join(tempfile.gettempdir(), f"air-hockey-{os.getpid()}.sock")
+                handoff = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                handoff.bind(handoff_path)
+                handoff.listen(LISTEN_BACKLOG)
+                threading.Thread(target=handoff_thread, daemon=True,
+                                 args=(handoff, matchmaker, handshakes, tournaments)).start()
+            successor = spawn_successor(s, handoff_path)
+            matchmaker.handed_off = True
+            print(f"Novo processo {successor.pid} atendendo em {ip_address}:{port_number}; drenando este")
+            # O socket de escuta agora é do novo processo; as retomadas chegam pelo handoff
+            s.close()
+        # Sem reinício o socket continua aberto durante a drenagem: quem cair no meio de uma
+        # partida retoma a sessão aqui, e só partidas novas são recusadas (matchmaker.draining)
+        matchmaker.draining = True
+        draining = threading.Thread(target=drain, daemon=True, args=(matchmaker, tournaments, successor is not None))
+        draining.start()
+        if successor is None:
+            accept_loop(s, matchmaker, handshakes, tournaments, draining.is_alive)
+        draining.join()
+        if matchmaker.arena is not None:
+            matchmaker.arena.release_all()
+        if handoff is not None:
+            handoff.close()
+            os.unlink(handoff_path)
             
     except KeyboardInterrupt:
         print("\nServidor interrompido pelo usuário")
     except Exception as e:
         print(f"Erro no servidor: {e}")
     finally:
+        print(f"Handshakes: {handshakes.counters}")
         s.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,213 @@
+"""
+Compressão opcional do fluxo servidor -> cliente, negociada no handshake.
+
+O cliente oferece os codecs que conhece ({"name": ..., "compress": [...]}) e o
+servidor responde com o escolhido na resposta do handshake ("compress": codec ou
+None). A partir daí tudo o que o servidor manda naquela conexão passa por um
+contexto de compressão persistente: a janela do compressor guarda os estados
+anteriores, então cada estado novo sai quase só como referência ao anterior.
+O contexto começa de um dicionário, para o primeiro estado já sair pequeno. O
+sentido cliente -> servidor (a raquete) continua sem compressão.
+
+- zstd: dicionário treinado com zstandard.train_dictionary sobre estados gravados
+  de partidas simuladas pela lógica do servidor (benchmark/treinar_dicionario.py),
+  salvo em snapshot_dictionary.zstd. Sem o arquivo, usa o dicionário do zlib.
+- zlib: o zdict é só conteúdo (não aceita dicionários treinados), então é feito
+  de alguns estados típicos serializados aqui mesmo.
+
+O nome de cada codec leva um hash do seu dicionário: como o dicionário do zlib é
+gerado com o pickle e o pygame de cada lado (e o do zstd vem de um arquivo),
+versões diferentes não combinam nenhum codec e a conexão segue sem compressão.
+"""
+import hashlib
+import os
+import pickle
+import zlib
+
+from headless_pygame import import_pygame
+
+# O mesmo pygame já carregado pelo servidor ou pelo cliente (só o Rect é usado aqui)
+pygame = import_pygame()
+
+try:
+    import zstandard
+except ImportError:  # zstd é opcional; zlib está sempre disponível
+    zstandard = None
+
+# Cada conexão comprimida tem o seu contexto no servidor, então a janela é pequena:
+# 2 KB guardam o dicionário ou os últimos estados (~300 bytes cada), e o contexto
+# do zlib fica em ~30 KB por conexão em vez dos ~270 KB do padrão
+ZLIB_LEVEL = 6
+ZLIB_WBITS = 11
+ZLIB_MEM_LEVEL = 4
+ZSTD_LEVEL = 3
+ZSTD_WINDOW_LOG = 11
+READ_SIZE = 65536
+
+# Valores típicos do jogo (os mesmos de server.py) usados para montar o dicionário
+WIDTH, HEIGHT = 960, 600
+PADDLE_WIDTH, PADDLE_HEIGHT = 120, 10
+BALL_RADIUS = 8
+
+def _sample_states():
+    """
+    Estados parecidos com os de uma partida real: countdown, vitória, pausa e jogo.
+    Os estados em jogo ficam por último, no fim da janela, que é onde o compressor
+    encontra as referências mais próximas.
+    """
+    for countdown, started, winner_id, paused, speed in (
+            (3, False, None, False, [4, 4]),
+            (0, True, 1, False, [-7.62, -7.62]),
+            (0, True, None, True, [4.1, -4.1]),
+            (0, True, None, False, [5.315, -5.315]),
+            (0, True, None, False, [-4.405, 4.405])):
+        yield {
+            "paddles": [
+                pygame.Rect(WIDTH/2 - PADDLE_WIDTH/2 + 37, HEIGHT - 20 - PADDLE_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT),
+                pygame.Rect(WIDTH/2 - PADDLE_WIDTH/2 - 122, 20, PADDLE_WIDTH, PADDLE_HEIGHT)
+            ],
+            "ball": pygame.Rect(WIDTH/2 - BALL_RADIUS + 85, HEIGHT/2 - BALL_RADIUS - 140, BALL_RADIUS * 2, BALL_RADIUS * 2),
+            "winner_id": winner_id,
+            "game_started": started,
+            "countdown": countdown,
+            "ball_speed": speed,
+            "player_names": ["Jogador", "Fulano"],
+            "connected_players": 2,
+            "active": True,
+            "play_again_votes": 0,
+            "player_leaved": False,
+            "paused": paused
+        }
+
+def build_dictionary():
+    """Dicionário inicial: estados serializados como o servidor serializa (pickle.dumps)"""
+    return b"".join(pickle.dumps(state) for state in _sample_states())
+
+def load_trained_dictionary(path: str):
+    """Dicionário do zstd treinado por benchmark/treinar_dicionario.py (None se não existir)"""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+ZSTD_DICTIONARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot_dictionary.zstd")
+SNAPSHOT_DICTIONARY = build_dictionary()
+ZSTD_TRAINED_DICTIONARY = load_trained_dictionary(ZSTD_DICTIONARY_PATH)
+DICTIONARY_ID = hashlib.sha1(SNAPSHOT_DICTIONARY).hexdigest()[:8]
+ZSTD_DICTIONARY_ID = hashlib.sha1(ZSTD_TRAINED_DICTIONARY or SNAPSHOT_DICTIONARY).hexdigest()[:8]
+ZLIB_CODEC = f"zlib-{DICTIONARY_ID}"
+ZSTD_CODEC = f"zstd-{ZSTD_DICTIONARY_ID}"
+
+def supported_codecs(kinds=("zstd", "zlib")):
+    """Codecs disponíveis neste processo entre os tipos pedidos, na ordem de kinds"""
+    codecs = {"zstd": ZSTD_CODEC if zstandard else None, "zlib": ZLIB_CODEC}
+    return [codecs[kind.strip()] for kind in kinds if codecs.get(kind.strip())]
+
+def negotiate(offered, preferred):
+    """Primeiro codec de preferred que o cliente ofereceu (ou None: sem compressão)"""
+    offered = set(offered or ())
+    for codec in preferred:
+        if codec in offered:
+            return codec
+    return None
+
+def _zstd_dictionary():
+    if ZSTD_TRAINED_DICTIONARY is not None:
+        return zstandard.ZstdCompressionDict(ZSTD_TRAINED_DICTIONARY)
+    return zstandard.ZstdCompressionDict(SNAPSHOT_DICTIONARY, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+
+class Compressor:
+    """Contexto de compressão de uma conexão; cada mensagem sai inteira (flush) no fim"""
+    def __init__(self, codec: str):
+        if codec == ZSTD_CODEC:
+            params = zstandard.ZstdCompressionParameters.from_level(
+                ZSTD_LEVEL, window_log=ZSTD_WINDOW_LOG, hash_log=ZSTD_WINDOW_LOG - 1, chain_log=ZSTD_WINDOW_LOG - 1)
+            compressor = zstandard.ZstdCompressor(compression_params=params, dict_data=_zstd_dictionary())
+            self.context = compressor.compressobj()
+            self.flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        elif codec == ZLIB_CODEC:
+            self.context = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, ZLIB_WBITS, ZLIB_MEM_LEVEL,
+                                            zdict=SNAPSHOT_DICTIONARY)
+            self.flush_mode = zlib.Z_SYNC_FLUSH
+        else:
+            raise ValueError(f"codec desconhecido: {codec}")
+
+    def compress(self, data: bytes):
+        return self.context.compress(data) + self.context.flush(self.flush_mode)
+
+class Decompressor:
+    """Contexto de descompressão correspondente ao Compressor do outro lado"""
+    def __init__(self, codec: str):
+        if codec == ZSTD_CODEC:
+            self.context = zstandard.ZstdDecompressor(dict_data=_zstd_dictionary()).decompressobj()
+        elif codec == ZLIB_CODEC:
+            self.context = zlib.decompressobj(ZLIB_WBITS, zdict=SNAPSHOT_DICTIONARY)
+        else:
+            raise ValueError(f"codec desconhecido: {codec}")
+
+    def decompress(self, data: bytes):
+        return self.context.decompress(data)
+
+class CompressedSocket:
+    """
+    Socket do servidor cujos envios passam pelo contexto de compressão da conexão.
+    Começa sem comprimir (a resposta do handshake sai pura); start() liga a
+    compressão. O resto (recv, settimeout, close...) vai direto para o socket.
+    """
+    def __init__(self, sock, codec: str):
+        self.sock = sock
+        self.codec = codec
+        self.compressor = None
+
+    def start(self):
+        self.compressor = Compressor(self.codec)
+
+    def send(self, data: bytes):
+        if self.compressor is None:
+            return self.sock.send(data)
+        # O contexto é contínuo: um envio parcial corromperia o fluxo, então manda tudo
+        self.sock.sendall(self.compressor.compress(data))
+        return len(data)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+class DecompressingReader:
+    """
+    Leitor para pickle.load que descomprime o fluxo de outro leitor (socket.makefile).
+    Bytes que o leitor de baixo já tinha no buffer são lidos normalmente por read1.
+    """
+    def __init__(self, stream, decompressor: Decompressor):
+        self.stream = stream
+        self.decompressor = decompressor
+        self.buffer = bytearray()
+
+    def _fill(self):
+        data = self.stream.read1(READ_SIZE)
+        if not data:
+            return False
+        self.buffer += self.decompressor.decompress(data)
+        return True
+
+    def read(self, size: int = -1):
+        while (size < 0 or len(self.buffer) < size) and self._fill():
+            pass
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readline(self, size: int = -1):
+        while b"\n" not in self.buffer and (size < 0 or len(self.buffer) < size) and self._fill():
+            pass
+        end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+        if size >= 0:
+            end = min(end, size)
+        data = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return data
+
+    def close(self):
+        self.stream.close()
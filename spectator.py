@@ -0,0 +1,97 @@
+import pygame
+import sys
+from dotenv import load_dotenv
+import os
+import socket
+import pickle
+
+WIDTH, HEIGHT = 960, 600
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+BLUE = (0, 0, 255)
+RED = (255, 0, 0)
+
+def draw_spectator_window(win, fonts, state, game_id):
+    """Desenha o jogo do ponto de vista de um espectador (jogador 1 embaixo)"""
+    font, small_font, countdown_font = fonts
+    win.fill(BLACK)
+
+    names = state.get("player_names")
+    header = small_font.render(f"Jogo {game_id}: {names[0]} x {names[1]}", True, WHITE)
+    win.blit(header, header.get_rect(center=(WIDTH/2, HEIGHT/2 - 200)))
+
+    if state.get("player_leaved"):
+        text = small_font.render("Um dos jogadores saiu da partida.", True, WHITE)
+        win.blit(text, text.get_rect(center=(WIDTH/2, HEIGHT/2)))
+    elif state.get("paused") or state.get("connected_players") < 2:
+        text = small_font.render("Aguardando jogador reconectar...", True, WHITE)
+        win.blit(text, text.get_rect(center=(WIDTH/2, HEIGHT/2)))
+    elif state.get("countdown") > 0:
+        text = countdown_font.render(str(state.get("countdown")), True, WHITE)
+        win.blit(text, text.get_rect(center=(WIDTH/2, HEIGHT/2)))
+    elif state.get("winner_id") is None:
+        pygame.draw.rect(win, BLUE, state["paddles"][0])
+        pygame.draw.rect(win, RED, state["paddles"][1])
+        pygame.draw.ellipse(win, WHITE, state["ball"])
+    else:
+        text = font.render(f"{names[state['winner_id']]} venceu!", True, WHITE)
+        win.blit(text, text.get_rect(center=(WIDTH/2, HEIGHT/2)))
+
+    pygame.display.flip()
+
+def main():
+    """
+    Assiste a uma partida sem jogar. Uso: python3 spectator.py [game_id]
+    Sem game_id, o servidor escolhe a partida em andamento com mais espectadores.
+    """
+    load_dotenv()
+    ip_address = os.getenv("SERVER_IP")
+    port_number = int(os.getenv("SERVER_PORT"))
+    game_id = sys.argv[1] if len(sys.argv) > 1 else None
+
+    try:
+        address = (ip_address, port_number)
+        while True:
+            client_socket = socket.create_connection(address)
+            client_socket.send(pickle.dumps({"spectate": game_id}))
+            # Os snapshots chegam em sequência, sem esperar resposta: lê um objeto pickle por vez
+            stream = client_socket.makefile("rb")
+            welcome = pickle.load(stream)
+            if "redirect" not in welcome:
+                break
+            # Lobby: o jogo está em um dos nós
+            client_socket.close()
+            address = tuple(welcome["redirect"])
+    except Exception as e:
+        print(f"Erro de conexão: {e}")
+        sys.exit()
+
+    if "spectating" not in welcome:
+        print(f"Não foi possível assistir: {welcome.get('error')}")
+        client_socket.close()
+        sys.exit()
+    game_id = welcome["spectating"]
+    print(f"Assistindo ao jogo {game_id}")
+
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption(f"Air hockey - espectador do jogo {game_id}")
+    fonts = (pygame.font.Font(None, 74), pygame.font.Font(None, 40), pygame.font.Font(None, 200))
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+        try:
+            state = pickle.load(stream)
+        except (EOFError, OSError, pickle.UnpicklingError):
+            print("Transmissão encerrada")
+            break
+        draw_spectator_window(screen, fonts, state, game_id)
+
+    client_socket.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: um único processo escreve na arena
+    fcntl = None
+
+MAGIC = b"AHARENA1"
+LAYOUT_VERSION = 1
+DEFAULT_SLOTS = 4096
+
+# Cabeçalho: magic, versão do layout, número de slots, tamanho do slot
+HEADER = struct.Struct("<8sIII")
+HEADER_SIZE = 64
+
+# Cada slot começa com o contador do seqlock (ímpar enquanto o slot está sendo escrito)
+SEQ = struct.Struct("<I")
+# Corpo do slot: dono (pid, 0 = livre), versão do estado, horário da gravação, game_id,
+# active, paused, player_leaved, game_started, countdown, winner_id (-1 = nenhum),
+# connected_players, play_again_votes, bola (x, y), velocidade da bola, raquetes
+# (x, y de cada uma), nomes e tokens de sessão dos dois jogadores
+BODY = struct.Struct("<IQd16s????bbBB2i2d4i48s48s32s32s")
+SLOT_SIZE = 256
+OWNER = struct.Struct("<I")
+READ_RETRIES = 1000
+FULL_RETRY_INTERVAL = 1  # segundos sem procurar slot depois de encontrar a arena cheia
+EMPTY = BODY.unpack(bytes(BODY.size))
+
+def _process_alive(pid: int):
+    """Só em sistemas POSIX dá para testar um pid sem afetar o processo"""
+    if os.name != "posix":
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # Processo que morreu mas ainda não foi recolhido pelo pai (zumbi, só no Linux)
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rpartition(")")[2].split()[0] != "Z"
+    except (OSError, IndexError):
+        return True
+
+def _text(value: bytes):
+    return value.rstrip(b"\0").decode("utf-8", errors="ignore")
+
+class StateArena:
+    """
+    Arquivo mapeado em memória com um slot de tamanho fixo por jogo.
+
+    O servidor grava o estado de cada jogo no seu slot a cada quadro; ferramentas
+    externas leem o mesmo arquivo sem cópia (StateArena(caminho, writable=False)).
+    Cada slot tem um seqlock: quem lê repete a leitura se o contador for ímpar ou
+    mudar durante a leitura. O pid do dono de cada slot permite que um servidor
+    reiniciado recupere as partidas de um processo que caiu sem mexer nas de um
+    processo ainda vivo (reinício a quente). A alocação de slots entre processos
+    usa flock no arquivo.
+    """
+    def __init__(self, path: str, slots: int = DEFAULT_SLOTS, writable: bool = True):
+        self.path = path
+        self.writable = writable
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.next_slot = 0
+        self.full_until = 0
+
+        flags = os.O_RDWR | os.O_CREAT if writable else os.O_RDONLY
+        self.fd = os.open(path, flags, 0o600)
+        header = os.read(self.fd, HEADER.size)
+        if len(header) == HEADER.size and HEADER.unpack(header)[:2] == (MAGIC, LAYOUT_VERSION) \
+                and HEADER.unpack(header)[3] == SLOT_SIZE:
+            self.slots = HEADER.unpack(header)[2]
+        elif writable:
+            # Arquivo novo ou de outro layout: começa do zero
+            self.slots = slots
+            os.ftruncate(self.fd, 0)
+            os.ftruncate(self.fd, HEADER_SIZE + slots * SLOT_SIZE)
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            os.write(self.fd, HEADER.pack(MAGIC, LAYOUT_VERSION, slots, SLOT_SIZE))
+        else:
+            os.close(self.fd)
+            raise ValueError(f"{path} não é uma arena de estado")
+        size = HEADER_SIZE + self.slots * SLOT_SIZE
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self.mm = mmap.mmap(self.fd, size, access=access)
+
+    def _offset(self, slot: int):
+        return HEADER_SIZE + slot * SLOT_SIZE
+
+    def _owner(self, slot: int):
+        return OWNER.unpack_from(self.mm, self._offset(slot) + SEQ.size)[0]
+
+    def _locked(self):
+        """Trava o arquivo entre processos durante a alocação de slots"""
+        return _FileLock(self.fd) if fcntl else _NoLock()
+
+    def _store(self, slot: int, body: tuple):
+        offset = self._offset(slot)
+        # O contador pode ter ficado ímpar se o processo anterior morreu no meio da escrita
+        seq = SEQ.unpack_from(self.mm, offset)[0] | 1
+        SEQ.pack_into(self.mm, offset, seq)
+        BODY.pack_into(self.mm, offset + SEQ.size, *body)
+        SEQ.pack_into(self.mm, offset, (seq + 1) & 0xFFFFFFFF)
+
+    def allocate(self):
+        """Reserva um slot livre para um jogo deste processo; None se a arena está cheia"""
+        if time.monotonic() < self.full_until:
+            return None
+        with self.lock, self._locked():
+            for step in range(self.slots):
+                slot = (self.next_slot + step) % self.slots
+                if self._owner(slot) == 0:
+                    OWNER.pack_into(self.mm, self._offset(slot) + SEQ.size, self.pid)
+                    self.next_slot = slot + 1
+                    return slot
+            self.full_until = time.monotonic() + FULL_RETRY_INTERVAL
+        print(f"Arena {self.path} cheia: jogos novos ficam fora dela")
+        return None
+
+    def write(self, slot: int, game_id: str, state: dict, version: int, tokens: list):
+        """Grava o estado de um jogo (o dicionário de Game.state) no slot"""
+        ball = state["ball"]
+        paddles = state["paddles"]
+        names = state["player_names"]
+        winner_id = state["winner_id"]
+        self._store(slot, (
+            self.pid, version, time.time(), game_id.encode()[:16],
+            state["active"], state["paused"], state["player_leaved"], state["game_started"],
+            max(-128, min(127, state["countdown"])), -1 if winner_id is None else winner_id,
+            max(0, state["connected_players"]), min(255, state["play_again_votes"]),
+            int(ball.x), int(ball.y), state["ball_speed"][0], state["ball_speed"][1],
+            int(paddles[0].x), int(paddles[0].y), int(paddles[1].x), int(paddles[1].y),
+            names[0].encode()[:48], names[1].encode()[:48],
+            (tokens[0] or "").encode()[:32], (tokens[1] or "").encode()[:32]))
+
+    def release(self, slot: int):
+        """Libera o slot de um jogo encerrado"""
+        with self.lock, self._locked():
+            self._store(slot, EMPTY)
+
+    def read(self, slot: int):
+        """Lê um slot de forma consistente; retorna None se o slot está livre"""
+        offset = self._offset(slot)
+        # Depois de READ_RETRIES tentativas fica com a última leitura: o escritor
+        # provavelmente morreu no meio da gravação e o slot não vai mais mudar
+        for _ in range(READ_RETRIES):
+            seq = SEQ.unpack_from(self.mm, offset)[0]
+            body = BODY.unpack_from(self.mm, offset + SEQ.size)
+            if seq % 2 == 0 and SEQ.unpack_from(self.mm, offset)[0] == seq:
+                break
+        if body[0] == 0 or not body[3].strip(b"\0"):
+            return None
+        (owner, version, updated, game_id, active, paused, player_leaved, game_started,
+         countdown, winner_id, connected, votes, ball_x, ball_y, speed_x, speed_y,
+         p0_x, p0_y, p1_x, p1_y, name0, name1, token0, token1) = body
+        return {
+            "slot": slot, "owner": owner, "version": version, "updated": updated,
+            "game_id": _text(game_id), "active": active, "paused": paused,
+            "player_leaved": player_leaved, "game_started": game_started,
+            "countdown": countdown, "winner_id": None if winner_id < 0 else winner_id,
+            "connected_players": connected, "play_again_votes": votes,
+            "ball": (ball_x, ball_y), "ball_speed": [speed_x, speed_y],
+            "paddles": [(p0_x, p0_y), (p1_x, p1_y)],
+            "player_names": [_text(name0), _text(name1)],
+            "tokens": [_text(token0) or None, _text(token1) or None],
+        }
+
+    def records(self):
+        """Todos os jogos gravados na arena"""
+        return [record for record in map(self.read, range(self.slots)) if record is not None]
+
+    def take_orphans(self):
+        """
+        Slots de processos que não existem mais (o servidor caiu). Os slots passam
+        a pertencer a este processo, que deve recuperar ou liberar cada um.
+        """
+        orphans = []
+        with self.lock, self._locked():
+            for slot in range(self.slots):
+                owner = self._owner(slot)
+                if owner in (0, self.pid) or _process_alive(owner):
+                    continue
+                record = self.read(slot)
+                if record is None:
+                    # Slot alocado mas nunca gravado
+                    self._store(slot, EMPTY)
+                    continue
+                OWNER.pack_into(self.mm, self._offset(slot) + SEQ.size, self.pid)
+                orphans.append(record)
+        return orphans
+
+    def release_all(self):
+        """Libera todos os slots deste processo (encerramento normal, sem nada a recuperar)"""
+        with self.lock, self._locked():
+            for slot in range(self.slots):
+                if self._owner(slot) == self.pid:
+                    self._store(slot, EMPTY)
+
+    def close(self):
+        self.mm.close()
+        os.close(self.fd)
+
+class _FileLock:
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    def __enter__(self):
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+class _NoLock:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Mostra os jogos gravados na arena de estado do servidor")
+    parser.add_argument("arquivo", help="Caminho da arena (ARENA_PATH do servidor)")
+    parser.add_argument("--seguir", type=float, metavar="SEGUNDOS",
+                        help="Repete a leitura a cada SEGUNDOS segundos")
+    args = parser.parse_args()
+
+    arena = StateArena(args.arquivo, writable=False)
+    try:
+        while True:
+            now = time.time()
+            records = arena.records()
+            print(f"{len(records)} jogos em {arena.slots} slots")
+            for record in records:
+                names = record["player_names"]
+                winner = record["winner_id"]
+                status = ("encerrado" if not record["active"] else
+                          f"vitória de {names[winner]}" if winner is not None else
+                          "pausado" if record["paused"] else
+                          f"countdown {record['countdown']}" if record["countdown"] > 0 else "em jogo")
+                print(f"  [{record['slot']:4}] jogo {record['game_id']:<12} pid {record['owner']:<7} "
+                      f"{names[0]} x {names[1]} | {status} | bola {record['ball']} | "
+                      f"versão {record['version']} | há {now - record['updated']:.1f}s")
+            if not args.seguir:
+                break
+            time.sleep(args.seguir)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        arena.close()
+
+if __name__ == "__main__":
+    main()
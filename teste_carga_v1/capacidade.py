@@ -0,0 +1,204 @@
+"""
+Busca automática de capacidade e verificação de regressão.
+
+Sem perguntas interativas: procura (busca exponencial seguida de busca binária)
+o maior número de partidas simultâneas que ainda cumpre o SLO configurado,
+salva o resultado em JSON e, se houver uma baseline, compara a capacidade
+encontrada e termina com código de saída diferente de zero em caso de regressão.
+
+Códigos de saída: 0 = ok, 1 = regressão em relação à baseline, 2 = erro.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from build_info import git_commit
+from config import SERVER_HOST, SERVER_PORT, REPORTS_DIR
+from carga_async import run_load
+from metricas import LoadMetrics
+from monitor_servidor import launch_server, stop_server
+
+# Perfis que permanecem conectados durante toda a tentativa (carga constante)
+DEFAULT_CAPACITY_MIX = "rastreador=50,revanche=50"
+TRIAL_COOLDOWN = 3
+
+class CapacitySearch:
+    """Executa tentativas com N partidas e avalia cada uma contra o SLO."""
+    def __init__(self, host, port, duration, processes, mix, slo):
+        self.host = host
+        self.port = port
+        self.duration = duration
+        self.processes = processes
+        self.mix = mix
+        self.slo = slo
+        self.trials = []
+
+    def evaluate(self, matches: int):
+        """Roda uma tentativa com 2*matches bots e retorna True se o SLO foi cumprido."""
+        num_clients = 2 * matches
+        stats = run_load(self.host, self.port, num_clients, self.duration, self.processes,
+                         mix=self.mix, seed=matches)
+        metrics = LoadMetrics.from_dict(stats['metricas'])
+        frame_budget = 1 / metrics.target_rate
+
+        success = stats['successful_clients'] / num_clients
+        dropped = stats['dropped_sessions'] / num_clients
+        p99_ms = metrics.latency.percentile(0.99) * 1000
+        # Quadros atrasados: intervalo entre snapshots maior que dois quadros
+        overrun = metrics.interval.fraction_above(self.slo['fator_atraso'] * frame_budget)
+
+        passed = (success >= self.slo['sucesso_min']
+                  and dropped <= 1 - self.slo['sucesso_min']
+                  and metrics.latency.total > 0
+                  and p99_ms <= self.slo['latencia_p99_ms']
+                  and overrun <= self.slo['atraso_max'])
+        trial = {
+            'partidas': matches,
+            'clientes': num_clients,
+            'passou': passed,
+            'sucesso': success,
+            'sessoes_interrompidas': dropped,
+            'latencia_p99_ms': p99_ms,
+            'quadros_atrasados': overrun,
+            'taxa_snapshots': metrics.summary()['taxa_snapshots'],
+        }
+        self.trials.append(trial)
+        print(f"  {matches:>6} partidas | {'OK   ' if passed else 'FALHA'} | p99 {p99_ms:7.1f} ms | "
+              f"atrasados {overrun * 100:5.2f}% | sucesso {success * 100:5.1f}%")
+        time.sleep(TRIAL_COOLDOWN)
+        return passed
+
+    def run(self, min_matches: int, max_matches: int):
+        """Retorna o maior número de partidas que cumpre o SLO (0 se nem o mínimo cumpre)."""
+        if not self.evaluate(min_matches):
+            return 0
+
+        # Busca exponencial até encontrar uma falha (ou o máximo)
+        good, bad = min_matches, None
+        while bad is None and good < max_matches:
+            candidate = min(good * 2, max_matches)
+            if self.evaluate(candidate):
+                good = candidate
+            else:
+                bad = candidate
+        if bad is None:
+            return good
+
+        # Busca binária entre o último sucesso e a primeira falha
+        while bad - good > 1:
+            middle = (good + bad) // 2
+            if self.evaluate(middle):
+                good = middle
+            else:
+                bad = middle
+        return good
+
+def load_baseline(baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    baseline['capacidade_partidas']  # falha cedo se o arquivo não for um resultado de capacidade
+    return baseline
+
+def compare_with_baseline(result: dict, baseline: dict, baseline_path: str, tolerance: float):
+    """Retorna True se a capacidade não caiu mais que a tolerância em relação à baseline."""
+    reference = baseline['capacidade_partidas']
+    minimum = reference * (1 - tolerance)
+    passed = result['capacidade_partidas'] >= minimum
+    result['baseline'] = {
+        'arquivo': baseline_path,
+        'commit': baseline.get('commit'),
+        'capacidade_partidas': reference,
+        'minimo_aceito': minimum,
+        'passou': passed,
+    }
+    print(f"\nBaseline ({baseline.get('commit')}): {reference} partidas | "
+          f"mínimo aceito: {minimum:.0f} | atual: {result['capacidade_partidas']} -> "
+          f"{'OK' if passed else 'REGRESSÃO'}")
+    return passed
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca de capacidade do servidor Air Hockey com verificação de SLO")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--porta", type=int, default=SERVER_PORT)
+    parser.add_argument("--iniciar-servidor", action="store_true", help="Inicia o server.py localmente")
+    parser.add_argument("--min-partidas", type=int, default=1)
+    parser.add_argument("--max-partidas", type=int, default=5000)
+    parser.add_argument("--duracao", type=float, default=20, help="Duração de cada tentativa (s)")
+    parser.add_argument("--processos", type=int, default=1, help="Processos do gerador de carga")
+    parser.add_argument("--perfis", default=DEFAULT_CAPACITY_MIX)
+    parser.add_argument("--slo-latencia-p99-ms", type=float, default=50.0)
+    parser.add_argument("--slo-atraso-max", type=float, default=0.01,
+                        help="Fração máxima de quadros atrasados (intervalo > fator x 1/60 s)")
+    parser.add_argument("--slo-fator-atraso", type=float, default=2.0)
+    parser.add_argument("--slo-sucesso-min", type=float, default=0.99)
+    parser.add_argument("--saida", help="Arquivo JSON do resultado (padrão: reports/)")
+    parser.add_argument("--baseline", help="JSON de um resultado anterior para comparação")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="Queda máxima aceita (fração)")
+    args = parser.parse_args()
+
+    slo = {
+        'latencia_p99_ms': args.slo_latencia_p99_ms,
+        'atraso_max': args.slo_atraso_max,
+        'fator_atraso': args.slo_fator_atraso,
+        'sucesso_min': args.slo_sucesso_min,
+    }
+
+    baseline = None
+    if args.baseline:
+        try:
+            baseline = load_baseline(args.baseline)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Erro ao ler a baseline {args.baseline}: {e}")
+            return 2
+
+    server_process = None
+    try:
+        if args.iniciar_servidor:
+            server_process = launch_server(args.host, args.porta)
+
+        print(f"Buscando capacidade em {args.host}:{args.porta} com SLO {slo}")
+        search = CapacitySearch(args.host, args.porta, args.duracao, args.processos, args.perfis, slo)
+        capacity = search.run(args.min_partidas, args.max_partidas)
+    except (RuntimeError, OSError, ValueError) as e:
+        print(f"Erro: {e}")
+        return 2
+    finally:
+        if server_process:
+            stop_server(server_process)
+
+    result = {
+        'teste': 'capacidade',
+        'commit': git_commit(),
+        'data': datetime.now().isoformat(timespec="seconds"),
+        'servidor': f"{args.host}:{args.porta}",
+        'slo': slo,
+        'duracao_tentativa': args.duracao,
+        'perfis': args.perfis,
+        'capacidade_partidas': capacity,
+        'tentativas': search.trials,
+    }
+    print(f"\nCapacidade: {capacity} partidas simultâneas ({2 * capacity} clientes)")
+
+    passed = True
+    if baseline:
+        passed = compare_with_baseline(result, baseline, args.baseline, args.tolerancia)
+
+    output = args.saida
+    if not output:
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(REPORTS_DIR, f"capacidade_{result['commit']}_{timestamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Resultado salvo em: {output}")
+
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,503 @@
+"""
+Gerador de carga baseado em asyncio.
+
+Cada bot é uma corrotina (não uma thread) que segue o protocolo real do jogo,
+com o comportamento definido por um perfil (perfis_bot.py).
+Todos os bots de um processo compartilham um único relógio de 60 Hz, e a carga
+pode ser dividida entre vários processos (shards) para ultrapassar o limite de
+um núcleo. Com isso um único computador sustenta 10k+ bots simultâneos.
+"""
+
+import argparse
+import asyncio
+import io
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from config import SERVER_HOST, SERVER_PORT
+except ImportError:
+    SERVER_HOST = "127.0.0.1"
+    SERVER_PORT = 65432
+
+from metricas import BotProbe, LoadMetrics
+from perfis_bot import DEFAULT_MIX, PLAY_AGAIN, QUIT, RECONNECT, assign_profiles, paddle_y, parse_mix
+
+# pygame é usado apenas para serializar a raquete como pygame.Rect (sem pygame.init)
+try:
+    import pygame
+    PYGAME_AVAILABLE = True
+except ImportError:
+    PYGAME_AVAILABLE = False
+
+# Compressão dos estados negociada no handshake (snapshot_codec.py, na raiz do repositório)
+try:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from snapshot_codec import Decompressor, supported_codecs
+    CODEC_AVAILABLE = True
+except ImportError:
+    CODEC_AVAILABLE = False
+
+TICK_RATE = 60
+CONNECT_TIMEOUT = 10.0
+RECV_TIMEOUT = 10.0
+DEFAULT_CONNECT_RATE = 500  # conexões por segundo, por processo
+
+class TickClock:
+    """
+    Relógio compartilhado por todos os bots de um processo.
+    Em vez de cada bot dormir por conta própria, todos aguardam o mesmo futuro,
+    que é resolvido uma vez por quadro.
+    """
+    def __init__(self, rate: int = TICK_RATE):
+        self.interval = 1 / rate
+        self._future = None
+        self._task = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._future = loop.create_future()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.interval
+            await asyncio.sleep(max(0, next_tick - loop.time()))
+            future, self._future = self._future, loop.create_future()
+            future.set_result(None)
+
+    def wait(self):
+        """Retorna um awaitable que termina no próximo quadro."""
+        return asyncio.shield(self._future)
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+def split_first_message(data: bytes):
+    """
+    Separa a primeira mensagem pickle do restante dos bytes.
+    O servidor manda a resposta do handshake e logo em seguida o primeiro estado,
+    e os dois podem chegar na mesma leitura.
+    """
+    buffer = io.BytesIO(data)
+    message = pickle.Unpickler(buffer).load()
+    return message, data[buffer.tell():]
+
+async def open_session(host: str, port: int, hello: dict):
+    """
+    Conecta e faz o handshake. Retorna (reader, writer, resposta, bytes restantes,
+    descompressor). O descompressor é None se a conexão não usa compressão; os
+    bytes restantes já vêm comprimidos como o resto do fluxo.
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), CONNECT_TIMEOUT)
+    try:
+        writer.write(pickle.dumps(hello))
+        await writer.drain()
+        # A resposta pode chegar em pedaços: lê até ter a primeira mensagem inteira
+        data = b""
+        while True:
+            chunk = await asyncio.wait_for(reader.read(4096), RECV_TIMEOUT)
+            if not chunk:
+                raise EOFError("conexão encerrada durante o handshake")
+            data += chunk
+            try:
+                welcome, pending = split_first_message(data)
+                break
+            except (EOFError, pickle.UnpicklingError):
+                continue
+    except BaseException:
+        writer.close()
+        raise
+    codec = welcome.get("compress")
+    return reader, writer, welcome, pending, Decompressor(codec) if codec else None
+
+def paddle_message(player_id: int, paddle_x: int):
+    """Serializa a posição da raquete, como o simulador com threads."""
+    if PYGAME_AVAILABLE:
+        return pickle.dumps(pygame.Rect(paddle_x, paddle_y(player_id), 120, 10))
+    return pickle.dumps({'x': paddle_x, 'y': paddle_y(player_id)})
+
+def _action_message(action, value, player_id: int, metrics: LoadMetrics):
+    """Converte a ação do perfil na mensagem do protocolo. Retorna (mensagem, x da raquete)."""
+    if action == PLAY_AGAIN:
+        metrics.count("votos_revanche")
+        return pickle.dumps("play_again"), None
+    return paddle_message(player_id, value), value
+
+def _resume_hello(token: str, hello: dict):
+    """Handshake de retomada, com a mesma oferta de compressão do handshake original"""
+    resume = {"resume": token}
+    if "compress" in hello:
+        resume["compress"] = hello["compress"]
+    return resume
+
+async def run_bot(bot_id: str, host: str, port: int, duration: float, clock: TickClock,
+                  stats: dict, metrics: LoadMetrics, profile, tournament: bool = False,
+                  compress: bool = False):
+    """
+    Executa a sessão de um bot seguindo o protocolo do jogo e o seu perfil.
+    Com tournament=True o bot entra nos torneios do servidor em vez do pareamento comum.
+    Com compress=True o bot oferece os codecs de compressão no handshake; os bytes
+    recebidos nas métricas são os bytes comprimidos.
+    """
+    started = time.monotonic()
+    deadline = started + duration
+    delay = profile.join_delay(duration)
+    if delay:
+        await asyncio.sleep(delay)
+
+    hello = {"name": f"AsyncBot_{bot_id}", "tournament": tournament}
+    if compress:
+        hello["compress"] = supported_codecs()
+    try:
+        reader, writer, welcome, pending, decompressor = await open_session(host, port, hello)
+    except (asyncio.TimeoutError, OSError, EOFError, pickle.UnpicklingError):
+        stats['failed_clients'] += 1
+        return
+
+    if "player_id" not in welcome:
+        # Partida recusada pelo servidor (sobrecarga ou drenagem): falha, como no modo com threads
+        metrics.count(f"erro_{welcome.get('error')}")
+        stats['failed_clients'] += 1
+        writer.close()
+        return
+
+    probe = BotProbe(metrics)
+    player_id, token = welcome["player_id"], welcome["token"]
+    stream = MessageStream(reader, pending, decompressor)
+    try:
+        # Loop principal: recebe o estado e responde no próximo quadro do relógio compartilhado
+        while time.monotonic() < deadline:
+            state, received = await stream.next()
+            if state is None:
+                break
+            stats['messages_received'] += 1
+            if "redirect" in state:
+                # Lobby: segue para o nó da partida com o token da vaga (ou o mesmo handshake)
+                writer.close()
+                host, port = state["redirect"]
+                resume = _resume_hello(state["token"], hello) if state["token"] else hello
+                reader, writer, welcome, pending, decompressor = await open_session(host, port, resume)
+                if "player_id" not in welcome:
+                    metrics.count("redirecionamentos_recusados")
+                    break
+                stream = MessageStream(reader, pending, decompressor)
+                metrics.count("redirecionamentos")
+                player_id, token = welcome["player_id"], welcome["token"]
+                continue
+            if "error" in state:
+                metrics.count(f"erro_{state['error']}")
+                break
+            if "ball" not in state:
+                # Torneio: vaga na próxima partida; responde com a raquete no centro
+                player_id = state["player_id"]
+                metrics.count("partidas_torneio")
+                await clock.wait()
+                writer.write(paddle_message(player_id, 420))
+                await writer.drain()
+                continue
+            probe.snapshot_received(state, player_id, received)
+            action, value = profile.on_state(state, player_id, time.monotonic() - started)
+            if action == QUIT:
+                metrics.count("saidas_apos_oponente" if probe.opponent_left else "abandonos")
+                # Saída voluntária, como o client.py ao fechar a janela
+                writer.write(pickle.dumps("quit"))
+                await writer.drain()
+                break
+            if action == RECONNECT:
+                # Derruba a conexão sem aviso e retoma a sessão em um socket novo
+                metrics.count("quedas")
+                writer.transport.abort()
+                if token is None:
+                    break
+                reader, writer, welcome, pending, decompressor = await open_session(
+                    host, port, _resume_hello(token, hello))
+                if "player_id" not in welcome:
+                    metrics.count("retomadas_recusadas")
+                    break
+                stream = MessageStream(reader, pending, decompressor)
+                metrics.count("retomadas")
+                continue
+            await clock.wait()
+            message, paddle_x = _action_message(action, value, player_id, metrics)
+            writer.write(message)
+            await writer.drain()
+            probe.input_sent(paddle_x, len(message))
+            stats['messages_sent'] += 1
+        else:
+            # Fim do teste: sai como um jogador que fecha a janela, respondendo ao
+            # próximo estado para não juntar o "quit" com a última raquete
+            await stream.next()
+            writer.write(pickle.dumps("quit"))
+            await writer.drain()
+        stats['successful_clients'] += 1
+    except (asyncio.TimeoutError, pickle.UnpicklingError, EOFError, ConnectionError, OSError):
+        # Sessão interrompida no meio do teste: também conta como falha, como no modo com threads
+        stats['dropped_sessions'] += 1
+        stats['failed_clients'] += 1
+    finally:
+        probe.finish()
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+def drain_messages(buffer: bytearray):
+    """
+    Retira do buffer todas as mensagens pickle completas, na ordem em que chegaram.
+    Uma mensagem incompleta fica no buffer esperando o resto dos bytes.
+    """
+    messages = []
+    while buffer:
+        stream = io.BytesIO(buffer)
+        try:
+            message = pickle.Unpickler(stream).load()
+        except (EOFError, pickle.UnpicklingError):
+            break
+        messages.append((message, stream.tell()))
+        del buffer[:stream.tell()]
+    return messages
+
+class MessageStream:
+    """
+    Mensagens do servidor em uma conexão de jogador. As leituras vão para um buffer
+    (descomprimidas, se a conexão usa compressão): uma mensagem pode chegar em
+    pedaços ou junto com a seguinte, por exemplo atrás do proxy_rede.py.
+    """
+    def __init__(self, reader, pending: bytes, decompressor):
+        self.reader = reader
+        self.decompressor = decompressor
+        self.buffer = bytearray()
+        self.messages = []
+        self.wire_bytes = 0
+        self.feed(pending)
+
+    def feed(self, data: bytes):
+        self.wire_bytes += len(data)
+        self.buffer += self.decompressor.decompress(data) if self.decompressor else data
+        self.messages.extend(drain_messages(self.buffer))
+
+    async def next(self):
+        """
+        Próxima mensagem e os bytes recebidos por ela (os comprimidos, se houver
+        compressão), ou (None, 0) se o servidor fechou a conexão.
+        """
+        while not self.messages:
+            data = await asyncio.wait_for(self.reader.read(4096), RECV_TIMEOUT)
+            if not data:
+                return None, 0
+            self.feed(data)
+        message, nbytes = self.messages.pop(0)
+        if self.decompressor:
+            # Os bytes da rede desde a última mensagem ficam com esta
+            nbytes, self.wire_bytes = self.wire_bytes, 0
+        return message, nbytes
+
+async def run_spectator(host: str, port: int, duration: float, delay: float,
+                        stats: dict, metrics: LoadMetrics):
+    """Assiste à partida em destaque: só recebe o fluxo de snapshots, sem responder."""
+    await asyncio.sleep(delay)
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), CONNECT_TIMEOUT)
+    except (asyncio.TimeoutError, OSError):
+        stats['spectators_failed'] += 1
+        return
+
+    probe = BotProbe(metrics)
+    deadline = time.monotonic() + duration - delay
+    buffer = bytearray()
+    try:
+        writer.write(pickle.dumps({"spectate": None}))
+        await writer.drain()
+        welcome = None
+        while time.monotonic() < deadline:
+            data = await asyncio.wait_for(reader.read(65536), RECV_TIMEOUT)
+            if not data:
+                break
+            buffer += data
+            for message, nbytes in drain_messages(buffer):
+                if welcome is None and "redirect" in message:
+                    # Lobby: assiste no nó indicado
+                    writer.close()
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(*message["redirect"]), CONNECT_TIMEOUT)
+                    writer.write(pickle.dumps({"spectate": None}))
+                    await writer.drain()
+                    buffer.clear()
+                    break
+                if welcome is None:
+                    welcome = message
+                    if "spectating" not in welcome:
+                        stats['spectators_failed'] += 1
+                        return
+                    stats['spectators_connected'] += 1
+                else:
+                    probe.snapshot_received(message, None, nbytes)
+    except (asyncio.TimeoutError, ConnectionError, OSError):
+        stats['spectators_dropped'] += 1
+    finally:
+        probe.finish()
+        writer.close()
+
+async def run_shard(host: str, port: int, num_clients: int, duration: float,
+                    connect_rate: float = DEFAULT_CONNECT_RATE, shard_id: int = 0,
+                    mix: str = DEFAULT_MIX, seed: int = None, spectators: int = 0,
+                    tournament: bool = False, compress: bool = False):
+    """
+    Executa num_clients bots (e spectators espectadores) neste processo e retorna
+    as estatísticas agregadas. As métricas de latência vêm em stats['metricas'] e as
+    dos espectadores em stats['metricas_espectadores'] (LoadMetrics serializado).
+    """
+    stats = {
+        'successful_clients': 0,
+        'failed_clients': 0,
+        'dropped_sessions': 0,
+        'messages_sent': 0,
+        'messages_received': 0,
+        'spectators_connected': 0,
+        'spectators_failed': 0,
+        'spectators_dropped': 0,
+    }
+    metrics = LoadMetrics()
+    spectator_metrics = LoadMetrics()
+    profiles = assign_profiles(num_clients, parse_mix(mix), None if seed is None else seed + shard_id)
+    clock = TickClock()
+    clock.start()
+
+    # Abre as conexões gradualmente para não estourar o backlog do listen() do servidor
+    tasks = []
+    for i, profile in enumerate(profiles):
+        bot_id = f"{shard_id}_{i}"
+        tasks.append(asyncio.create_task(run_bot(bot_id, host, port, duration, clock, stats, metrics, profile,
+                                                   tournament, compress)))
+        if connect_rate:
+            await asyncio.sleep(1 / connect_rate)
+
+    # Espectadores entram depois que as partidas começaram
+    spectator_delay = min(duration / 2, 5.0)
+    for _ in range(spectators):
+        tasks.append(asyncio.create_task(
+            run_spectator(host, port, duration, spectator_delay, stats, spectator_metrics)))
+    await asyncio.gather(*tasks)
+
+    clock.stop()
+    stats['metricas'] = metrics.to_dict()
+    stats['metricas_espectadores'] = spectator_metrics.to_dict()
+    return stats
+
+def raise_fd_limit():
+    """Aumenta o limite de descritores de arquivo até o máximo permitido (Unix)."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+def _shard_worker(args):
+    raise_fd_limit()
+    return asyncio.run(run_shard(*args))
+
+def run_load(host: str, port: int, num_clients: int, duration: float,
+             processes: int = 1, connect_rate: float = DEFAULT_CONNECT_RATE,
+             mix: str = DEFAULT_MIX, seed: int = None, spectators: int = 0,
+             tournament: bool = False, compress: bool = False):
+    """
+    Distribui num_clients bots e os espectadores entre processos e retorna as
+    estatísticas somadas. Com processes=1 tudo roda no processo atual.
+    """
+    if processes <= 1:
+        raise_fd_limit()
+        return asyncio.run(run_shard(host, port, num_clients, duration, connect_rate, 0, mix, seed, spectators,
+                                     tournament, compress))
+
+    # Distribui os clientes em pares para manter as partidas dentro do mesmo shard
+    pairs = num_clients // 2
+    shard_sizes = [2 * (pairs // processes + (1 if i < pairs % processes else 0)) for i in range(processes)]
+    shard_sizes[0] += num_clients % 2
+    jobs = [(host, port, size, duration, connect_rate, i, mix, seed,
+             spectators // processes + (1 if i < spectators % processes else 0), tournament, compress)
+            for i, size in enumerate(shard_sizes) if size]
+
+    with multiprocessing.Pool(len(jobs)) as pool:
+        shard_stats = pool.map(_shard_worker, jobs)
+
+    total = {}
+    metrics = LoadMetrics()
+    spectator_metrics = LoadMetrics()
+    for stats in shard_stats:
+        metrics.merge(LoadMetrics.from_dict(stats.pop('metricas')))
+        spectator_metrics.merge(LoadMetrics.from_dict(stats.pop('metricas_espectadores')))
+        for key, value in stats.items():
+            total[key] = total.get(key, 0) + value
+    total['metricas'] = metrics.to_dict()
+    total['metricas_espectadores'] = spectator_metrics.to_dict()
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de carga asyncio para o servidor Air Hockey")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--porta", type=int, default=SERVER_PORT)
+    parser.add_argument("--clientes", type=int, default=1000, help="Número de bots simultâneos")
+    parser.add_argument("--duracao", type=float, default=30, help="Duração de cada sessão (s)")
+    parser.add_argument("--processos", type=int, default=1, help="Número de processos (shards)")
+    parser.add_argument("--taxa-conexao", type=float, default=DEFAULT_CONNECT_RATE,
+                        help="Novas conexões por segundo em cada processo (0 = sem limite)")
+    parser.add_argument("--perfis", default=DEFAULT_MIX,
+                        help="Mistura de perfis de bot, ex.: rastreador=40,ocioso=10,desistente=10")
+    parser.add_argument("--semente", type=int, help="Semente para a distribuição dos perfis")
+    parser.add_argument("--espectadores", type=int, default=0,
+                        help="Espectadores assistindo à partida em destaque")
+    parser.add_argument("--torneio", action="store_true",
+                        help="Os bots entram nos torneios do servidor (TOURNAMENT_SIZE jogadores cada)")
+    parser.add_argument("--comprimir", action="store_true",
+                        help="Os bots oferecem compressão dos estados no handshake (snapshot_codec.py)")
+    args = parser.parse_args()
+    parse_mix(args.perfis)
+    if args.comprimir and not CODEC_AVAILABLE:
+        parser.error("--comprimir precisa do pygame e do snapshot_codec.py")
+
+    print(f"Iniciando {args.clientes} bots asyncio contra {args.host}:{args.porta} "
+          f"em {args.processos} processo(s)...")
+    start = time.time()
+    stats = run_load(args.host, args.porta, args.clientes, args.duracao, args.processos,
+                     args.taxa_conexao, args.perfis, args.semente, args.espectadores, args.torneio,
+                     args.comprimir)
+    elapsed = time.time() - start
+
+    print(f"Conexões bem-sucedidas: {stats['successful_clients']}/{args.clientes}")
+    print(f"Conexões com falha: {stats['failed_clients']}")
+    print(f"Sessões interrompidas: {stats['dropped_sessions']}")
+    print(f"Mensagens enviadas: {stats['messages_sent']} | recebidas: {stats['messages_received']}")
+    print(f"Duração total: {elapsed:.1f}s")
+
+    summary = LoadMetrics.from_dict(stats['metricas']).summary()
+    latency = summary['latencia_ms']
+    jitter = summary['jitter_ms']
+    print(f"Latência entrada->eco: p50 {latency['p50']:.1f} ms | p95 {latency['p95']:.1f} ms | "
+          f"p99 {latency['p99']:.1f} ms | max {latency['max']:.1f} ms")
+    print(f"Jitter entre snapshots: p50 {jitter['p50']:.1f} ms | p99 {jitter['p99']:.1f} ms")
+    print(f"Snapshots/s por bot: {summary['taxa_snapshots']:.1f} (alvo {summary['taxa_alvo']})")
+    print(f"Recebido por bot: {summary['bytes_por_segundo_rx'] / 1024:.1f} KB/s")
+    events = ", ".join(f"{name}: {count}" for name, count in sorted(summary['eventos'].items()))
+    print(f"Eventos: {events or 'nenhum'}")
+
+    if args.espectadores:
+        spectators = LoadMetrics.from_dict(stats['metricas_espectadores']).summary()
+        print(f"Espectadores: {stats['spectators_connected']}/{args.espectadores} conectados | "
+              f"falhas: {stats['spectators_failed']} | interrompidos: {stats['spectators_dropped']}")
+        print(f"Snapshots/s por espectador: {spectators['taxa_snapshots']:.1f} | "
+              f"intervalo p99 {spectators['intervalo_ms']['p99']:.1f} ms | "
+              f"{spectators['bytes_por_segundo_rx'] / 1024:.1f} KB/s por espectador")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Métricas de latência e jitter medidas pelos bots dos testes de carga.
+
+Os valores são acumulados em histogramas logarítmicos, que ocupam memória fixa
+(independente do número de amostras) e podem ser somados entre bots e entre
+processos antes de calcular os percentis.
+"""
+
+import os
+import sys
+import time
+
+TARGET_SNAPSHOT_RATE = 60
+
+# Histograma logarítmico compartilhado com os temporizadores de fase do servidor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phase_profiler import Histogram
+
+class LoadMetrics:
+    """
+    Agregador das métricas de vários bots: latência entrada->eco, intervalo entre
+    snapshots, jitter, taxa de snapshots, bytes transferidos e contadores de eventos
+    do ciclo de vida das partidas (vitórias, revanches, abandonos...).
+    """
+    def __init__(self, target_rate: int = TARGET_SNAPSHOT_RATE):
+        self.target_rate = target_rate
+        self.latency = Histogram()
+        self.interval = Histogram()
+        self.jitter = Histogram()
+        self.snapshots = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.session_seconds = 0.0
+        self.events = {}
+
+    def count(self, event: str):
+        self.events[event] = self.events.get(event, 0) + 1
+
+    def merge(self, other: "LoadMetrics"):
+        self.latency.merge(other.latency)
+        self.interval.merge(other.interval)
+        self.jitter.merge(other.jitter)
+        self.snapshots += other.snapshots
+        self.bytes_received += other.bytes_received
+        self.bytes_sent += other.bytes_sent
+        self.session_seconds += other.session_seconds
+        for event, count in other.events.items():
+            self.events[event] = self.events.get(event, 0) + count
+
+    def summary(self):
+        """Resumo usado nos relatórios e gráficos de cada etapa."""
+        seconds = self.session_seconds or 1
+        return {
+            'latencia_ms': self.latency.summary_ms(),
+            'intervalo_ms': self.interval.summary_ms(),
+            'jitter_ms': self.jitter.summary_ms(),
+            'taxa_snapshots': self.snapshots / seconds,
+            'taxa_alvo': self.target_rate,
+            'bytes_por_segundo_rx': self.bytes_received / seconds,
+            'bytes_por_segundo_tx': self.bytes_sent / seconds,
+            'eventos': dict(self.events),
+        }
+
+    def to_dict(self):
+        return {
+            'target_rate': self.target_rate,
+            'latency': self.latency.to_dict(),
+            'interval': self.interval.to_dict(),
+            'jitter': self.jitter.to_dict(),
+            'snapshots': self.snapshots,
+            'bytes_received': self.bytes_received,
+            'bytes_sent': self.bytes_sent,
+            'session_seconds': self.session_seconds,
+            'events': self.events,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        metrics = cls(data['target_rate'])
+        metrics.latency = Histogram.from_dict(data['latency'])
+        metrics.interval = Histogram.from_dict(data['interval'])
+        metrics.jitter = Histogram.from_dict(data['jitter'])
+        metrics.snapshots = data['snapshots']
+        metrics.bytes_received = data['bytes_received']
+        metrics.bytes_sent = data['bytes_sent']
+        metrics.session_seconds = data['session_seconds']
+        metrics.events = dict(data.get('events', {}))
+        return metrics
+
+class BotProbe:
+    """
+    Estado de medição de um único bot.
+    Quando uma posição x enviada aparece na raquete do bot em um snapshot, a
+    latência entrada->eco é registrada. Posições repetidas (raquete parada) não
+    geram amostras. Também conta as transições de estado das partidas.
+    """
+    def __init__(self, metrics: LoadMetrics):
+        self.metrics = metrics
+        self.pending = {}
+        self.last_arrival = None
+        self.last_interval = None
+        self.last_sent_x = None
+        self.last_winner = None
+        self.opponent_left = False
+        self.started = time.monotonic()
+
+    def input_sent(self, paddle_x, nbytes: int):
+        """Registra uma entrada enviada (paddle_x=None para mensagens sem raquete)."""
+        if paddle_x is not None and paddle_x != self.last_sent_x:
+            self.pending[paddle_x] = time.monotonic()
+            self.last_sent_x = paddle_x
+        self.metrics.bytes_sent += nbytes
+
+    def snapshot_received(self, state, player_id, nbytes: int):
+        now = time.monotonic()
+        self.metrics.snapshots += 1
+        self.metrics.bytes_received += nbytes
+
+        if self.last_arrival is not None:
+            interval = now - self.last_arrival
+            self.metrics.interval.add(interval)
+            if self.last_interval is not None:
+                self.metrics.jitter.add(abs(interval - self.last_interval))
+            self.last_interval = interval
+        self.last_arrival = now
+
+        if not isinstance(state, dict) or player_id is None:
+            return
+
+        winner = state.get("winner_id")
+        if winner is not None and self.last_winner is None:
+            self.metrics.count("partidas_concluidas")
+        elif winner is None and self.last_winner is not None:
+            self.metrics.count("partidas_reiniciadas")
+        self.last_winner = winner
+        if state.get("player_leaved") and not self.opponent_left:
+            self.opponent_left = True
+            self.metrics.count("oponente_desconectou")
+
+        try:
+            echoed_x = state["paddles"][player_id].x
+        except (KeyError, IndexError, AttributeError, TypeError):
+            return
+        sent_at = self.pending.pop(echoed_x, None)
+        if sent_at is not None:
+            self.metrics.latency.add(now - sent_at)
+            # Entradas anteriores à ecoada foram sobrescritas e não terão eco
+            self.pending = {x: t for x, t in self.pending.items() if t > sent_at}
+
+    def finish(self):
+        self.metrics.session_seconds += time.monotonic() - self.started
@@ -0,0 +1,181 @@
+"""
+Monitoramento de recursos do processo do servidor durante os testes de carga.
+
+Em vez de medir a máquina inteira (que inclui o próprio gerador de carga),
+as amostras são tiradas apenas do PID do servidor: CPU, RSS, threads,
+descritores abertos, trocas de contexto e CPU por thread.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import psutil
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server.py")
+SAMPLE_INTERVAL = 1.0
+TOP_THREADS = 3
+
+def find_server_pid(port: int):
+    """Procura o PID do processo que está escutando na porta informada."""
+    try:
+        for conn in psutil.net_connections(kind="tcp"):
+            if conn.status == psutil.CONN_LISTEN and conn.laddr and conn.laddr.port == port and conn.pid:
+                return conn.pid
+    except (psutil.AccessDenied, PermissionError):
+        pass
+    return None
+
+def launch_server(host: str, port: int, startup_timeout: float = 15.0, env: dict = None, output=None):
+    """
+    Inicia o server.py em um subprocesso e espera a porta começar a escutar.
+    env acrescenta variáveis ao ambiente do servidor; output recebe o log (padrão: descartado).
+    """
+    env = dict(os.environ, **(env or {}), SERVER_IP=host, SERVER_PORT=str(port))
+    output = output or subprocess.DEVNULL
+    process = subprocess.Popen([sys.executable, "-u", SERVER_SCRIPT], env=env,
+                               cwd=os.path.dirname(SERVER_SCRIPT),
+                               stdout=output, stderr=output)
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Servidor encerrou durante a inicialização (código {process.returncode})")
+        if find_server_pid(port) == process.pid:
+            return process
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Servidor não começou a escutar a tempo")
+
+def stop_server(process: subprocess.Popen, grace: float = 5.0):
+    """Encerra um servidor iniciado por launch_server, forçando se ele ignorar o SIGTERM."""
+    process.terminate()
+    try:
+        process.wait(grace)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def _ctx_switches(process):
+    """
+    Trocas de contexto (voluntárias, involuntárias) somadas em todas as threads.
+    No Linux o psutil lê apenas /proc/<pid>/status, que conta só a thread principal.
+    """
+    if not sys.platform.startswith("linux"):
+        ctx = process.num_ctx_switches()
+        return ctx.voluntary, ctx.involuntary
+    voluntary = involuntary = 0
+    task_dir = f"/proc/{process.pid}/task"
+    for tid in os.listdir(task_dir):
+        try:
+            with open(f"{task_dir}/{tid}/status") as f:
+                for line in f:
+                    if line.startswith("voluntary_ctxt_switches"):
+                        voluntary += int(line.split()[1])
+                    elif line.startswith("nonvoluntary_ctxt_switches"):
+                        involuntary += int(line.split()[1])
+        except (FileNotFoundError, ProcessLookupError):
+            continue  # thread encerrou durante a leitura
+    return voluntary, involuntary
+
+class ServerProcessMonitor:
+    """
+    Amostra periodicamente um processo em uma thread própria.
+    Sem PID, faz a leitura da máquina inteira (comportamento antigo) e marca o
+    resumo com escopo 'maquina'.
+    """
+    def __init__(self, pid: int = None, interval: float = SAMPLE_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.process = psutil.Process(pid) if pid else None
+        self.samples = []
+        self._active = False
+        self._thread = None
+
+    def start(self):
+        self.samples = []
+        self._active = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Para a amostragem e retorna o resumo da etapa."""
+        self._active = False
+        if self._thread:
+            self._thread.join()
+        return self.summary()
+
+    def _run(self):
+        if self.process is None:
+            while self._active:
+                self.samples.append({
+                    'cpu': psutil.cpu_percent(interval=None),
+                    'mem': psutil.virtual_memory().percent,
+                })
+                time.sleep(self.interval)
+            return
+
+        try:
+            self.process.cpu_percent(interval=None)
+            last_time = time.monotonic()
+            last_ctx = _ctx_switches(self.process)
+            last_threads = {t.id: t.user_time + t.system_time for t in self.process.threads()}
+            while self._active:
+                time.sleep(self.interval)
+                with self.process.oneshot():
+                    now = time.monotonic()
+                    elapsed = now - last_time
+                    ctx = _ctx_switches(self.process)
+                    threads = {t.id: t.user_time + t.system_time for t in self.process.threads()}
+                    thread_cpu = {tid: (cpu - last_threads.get(tid, 0)) / elapsed * 100
+                                  for tid, cpu in threads.items()}
+                    self.samples.append({
+                        'cpu': self.process.cpu_percent(interval=None),
+                        'rss_mb': self.process.memory_info().rss / (1024 * 1024),
+                        'threads': len(threads),
+                        'fds': self.process.num_fds() if hasattr(self.process, "num_fds") else self.process.num_handles(),
+                        'ctx_voluntarias': (ctx[0] - last_ctx[0]) / elapsed,
+                        'ctx_involuntarias': (ctx[1] - last_ctx[1]) / elapsed,
+                        'cpu_threads': thread_cpu,
+                    })
+                last_time, last_ctx, last_threads = now, ctx, threads
+        except (psutil.NoSuchProcess, psutil.AccessDenied, FileNotFoundError):
+            self._active = False
+
+    def summary(self):
+        """Resumo (médias e picos) das amostras coletadas desde start()."""
+        def avg(key):
+            values = [s[key] for s in self.samples]
+            return sum(values) / len(values) if values else 0
+
+        def peak(key):
+            return max((s[key] for s in self.samples), default=0)
+
+        if self.process is None:
+            return {'escopo': 'maquina', 'cpu_media': avg('cpu'), 'cpu_pico': peak('cpu'),
+                    'mem_media': avg('mem')}
+
+        # CPU por thread: média de cada thread na etapa e as mais ocupadas
+        per_thread = {}
+        for sample in self.samples:
+            for tid, cpu in sample['cpu_threads'].items():
+                per_thread.setdefault(tid, []).append(cpu)
+        thread_avgs = {tid: sum(v) / len(v) for tid, v in per_thread.items()}
+        top = sorted(thread_avgs.items(), key=lambda item: item[1], reverse=True)[:TOP_THREADS]
+
+        return {
+            'escopo': 'processo',
+            'pid': self.pid,
+            'cpu_media': avg('cpu'),
+            'cpu_pico': peak('cpu'),
+            'rss_medio_mb': avg('rss_mb'),
+            'rss_pico_mb': peak('rss_mb'),
+            'threads_media': avg('threads'),
+            'threads_pico': peak('threads'),
+            'fds_pico': peak('fds'),
+            'ctx_voluntarias_por_s': avg('ctx_voluntarias'),
+            'ctx_involuntarias_por_s': avg('ctx_involuntarias'),
+            'cpu_thread_media': sum(thread_avgs.values()) / len(thread_avgs) if thread_avgs else 0,
+            'cpu_thread_top': top,
+        }
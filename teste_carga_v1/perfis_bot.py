@@ -0,0 +1,180 @@
+"""
+Perfis de comportamento dos bots de teste de carga.
+
+Cada perfil decide, a cada snapshot recebido, o que o bot envia ao servidor:
+uma posição de raquete, um voto de revanche ("play_again") ou o abandono da
+partida. As proporções entre os perfis são configuráveis, para que o teste passe
+por contagens regressivas, vitórias, revanches e desconexões como em produção.
+"""
+
+import random
+
+WIDTH = 960
+PADDLE_WIDTH = 120
+PADDLE_SPEED = 12
+
+# Ações retornadas por BotProfile.on_state
+PADDLE = "paddle"
+PLAY_AGAIN = "play_again"
+QUIT = "quit"
+RECONNECT = "reconnect"
+
+DEFAULT_MIX = "rastreador=40,revanche=20,tremulo=10,ocioso=10,atrasado=10,desistente=10"
+
+def paddle_y(player_id: int):
+    """Altura da raquete de cada jogador, igual à usada pelo client.py."""
+    return 570 if player_id == 0 else 20
+
+def _clamp(x: float):
+    return int(max(0, min(WIDTH - PADDLE_WIDTH, x)))
+
+class BotProfile:
+    """Perfil base: raquete parada no centro, nunca pede revanche."""
+    name = "base"
+    rematch_probability = 0.0
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.paddle_x = _clamp(WIDTH / 2 - PADDLE_WIDTH / 2)
+        self.decided_rematch = False
+
+    def join_delay(self, duration: float):
+        """Segundos que o bot espera antes de conectar."""
+        return 0.0
+
+    def on_state(self, state: dict, player_id: int, elapsed: float):
+        """Recebe o snapshot e retorna (ação, valor)."""
+        if state.get("player_leaved"):
+            # Oponente saiu: o cliente real só mostra uma mensagem, então o bot encerra
+            return QUIT, None
+        if state.get("winner_id") is None:
+            self.decided_rematch = False
+        elif not self.decided_rematch:
+            # Decide uma única vez por partida se vota pela revanche
+            self.decided_rematch = True
+            if self.rng.random() < self.rematch_probability:
+                return PLAY_AGAIN, None
+        self.paddle_x = self.move(state, player_id)
+        return PADDLE, self.paddle_x
+
+    def move(self, state: dict, player_id: int):
+        return self.paddle_x
+
+class IdleProfile(BotProfile):
+    """Conecta e não faz nada: a raquete fica parada."""
+    name = "ocioso"
+
+class TrackingProfile(BotProfile):
+    """IA que segue a bola com velocidade limitada e um erro de mira por jogada."""
+    name = "rastreador"
+    rematch_probability = 0.5
+
+    def __init__(self, rng: random.Random):
+        super().__init__(rng)
+        self.aim_error = 0
+        self.last_speed_y = None
+
+    def move(self, state: dict, player_id: int):
+        ball = state["ball"]
+        speed_y = state["ball_speed"][1]
+        # Sorteia um novo erro de mira sempre que a bola muda de direção
+        if self.last_speed_y is None or (speed_y > 0) != (self.last_speed_y > 0):
+            self.aim_error = self.rng.gauss(0, PADDLE_WIDTH / 3)
+        self.last_speed_y = speed_y
+
+        target = ball.centerx - PADDLE_WIDTH / 2 + self.aim_error
+        step = max(-PADDLE_SPEED, min(PADDLE_SPEED, target - self.paddle_x))
+        return _clamp(self.paddle_x + step)
+
+class RematchProfile(TrackingProfile):
+    """Como o rastreador, mas sempre vota pela revanche."""
+    name = "revanche"
+    rematch_probability = 1.0
+
+class JitteryProfile(BotProfile):
+    """Entrada ruidosa: a raquete salta para posições aleatórias a cada quadro."""
+    name = "tremulo"
+    rematch_probability = 0.5
+
+    def move(self, state: dict, player_id: int):
+        return _clamp(self.paddle_x + self.rng.randint(-200, 200))
+
+class LateJoinProfile(TrackingProfile):
+    """Entra no meio do teste, depois que as primeiras partidas já começaram."""
+    name = "atrasado"
+
+    def join_delay(self, duration: float):
+        return self.rng.uniform(0.2, 0.5) * duration
+
+class RageQuitProfile(TrackingProfile):
+    """Abandona a conexão no meio de uma partida em andamento."""
+    name = "desistente"
+
+    def __init__(self, rng: random.Random):
+        super().__init__(rng)
+        self.play_time = rng.uniform(2, 10)
+        self.played = 0.0
+        self.last_elapsed = None
+
+    def on_state(self, state: dict, player_id: int, elapsed: float):
+        playing = state.get("countdown", 1) <= 0 and state.get("winner_id") is None
+        if playing and self.last_elapsed is not None:
+            self.played += elapsed - self.last_elapsed
+        self.last_elapsed = elapsed
+        if self.played >= self.play_time:
+            return QUIT, None
+        return super().on_state(state, player_id, elapsed)
+
+class FlakyProfile(TrackingProfile):
+    """Rede instável: a conexão cai de tempos em tempos e o bot retoma a sessão com o token."""
+    name = "instavel"
+
+    def __init__(self, rng: random.Random):
+        super().__init__(rng)
+        self.next_drop = rng.uniform(3, 10)
+        self.last_elapsed = None
+
+    def on_state(self, state: dict, player_id: int, elapsed: float):
+        if self.last_elapsed is None:
+            self.last_elapsed = elapsed
+        if elapsed - self.last_elapsed >= self.next_drop:
+            self.last_elapsed = elapsed
+            self.next_drop = self.rng.uniform(3, 10)
+            return RECONNECT, None
+        return super().on_state(state, player_id, elapsed)
+
+PROFILES = {profile.name: profile for profile in (
+    TrackingProfile, RematchProfile, JitteryProfile, IdleProfile, LateJoinProfile, RageQuitProfile,
+    FlakyProfile)}
+
+def parse_mix(text: str):
+    """Converte "rastreador=40,ocioso=10" em {'rastreador': 40.0, 'ocioso': 10.0}."""
+    mix = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in PROFILES:
+            raise ValueError(f"Perfil desconhecido: {name} (disponíveis: {', '.join(PROFILES)})")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("A mistura de perfis precisa de ao menos um peso positivo")
+    return mix
+
+def assign_profiles(num_clients: int, mix: dict, seed: int = None):
+    """
+    Distribui os perfis entre os bots respeitando as proporções (maiores restos),
+    em ordem embaralhada para que os pares do matchmaking fiquem misturados.
+    """
+    total = sum(mix.values())
+    quotas = {name: num_clients * weight / total for name, weight in mix.items()}
+    counts = {name: int(quota) for name, quota in quotas.items()}
+    remaining = num_clients - sum(counts.values())
+    for name in sorted(quotas, key=lambda n: quotas[n] - counts[n], reverse=True)[:remaining]:
+        counts[name] += 1
+
+    names = [name for name, count in counts.items() for _ in range(count)]
+    rng = random.Random(seed)
+    rng.shuffle(names)
+    return [PROFILES[name](random.Random(rng.random())) for name in names]
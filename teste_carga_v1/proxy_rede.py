@@ -0,0 +1,318 @@
+"""
+Proxy de degradação de rede para testes locais.
+
+Fica entre os bots (ou clientes reais) e o servidor e aplica, por conexão,
+atraso, jitter, perda, reordenação e limite de banda configuráveis.
+
+TCP: os bytes continuam chegando em ordem (como no TCP real). A perda é
+modelada como a retransmissão do trecho após um RTO, o que causa bloqueio de
+cabeça de fila, e a reordenação não se aplica.
+UDP: pacotes podem ser descartados e entregues fora de ordem.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+CHUNK_SIZE = 65536
+MIN_RTO = 0.2  # RTO mínimo do Linux (200 ms)
+MAX_QUEUED_BYTES = 4 * 1024 * 1024  # teto dos bytes em trânsito por direção de uma conexão TCP
+UDP_CLIENT_TIMEOUT = 60  # segundos sem datagramas até o socket de um cliente UDP ser fechado
+UDP_PRUNE_INTERVAL = 10
+UDP_PENDING_MAX = 64  # datagramas guardados enquanto o socket para o servidor é criado
+
+# Condições de rede pré-definidas (atraso e jitter em ms, banda em kbit/s, 0 = sem limite)
+PRESETS = {
+    "lan":   {"atraso": 0.5, "jitter": 0.1, "perda": 0.0,   "reordenacao": 0.0,  "banda": 0},
+    "wifi":  {"atraso": 5,   "jitter": 3,   "perda": 0.002, "reordenacao": 0.0,  "banda": 20000},
+    "4g":    {"atraso": 40,  "jitter": 15,  "perda": 0.01,  "reordenacao": 0.01, "banda": 5000},
+    "3g":    {"atraso": 120, "jitter": 40,  "perda": 0.02,  "reordenacao": 0.02, "banda": 750},
+    "ruim":  {"atraso": 200, "jitter": 80,  "perda": 0.05,  "reordenacao": 0.05, "banda": 256},
+}
+
+class NetworkConditions:
+    """Parâmetros de degradação de uma conexão."""
+    def __init__(self, atraso=0.0, jitter=0.0, perda=0.0, reordenacao=0.0, banda=0, nome="custom"):
+        self.name = nome
+        self.delay = atraso / 1000
+        self.jitter = jitter / 1000
+        self.loss = perda
+        self.reorder = reordenacao
+        self.bandwidth = banda * 1000 / 8  # bytes por segundo
+
+    def sample_delay(self, rng: random.Random):
+        return max(0.0, self.delay + rng.gauss(0, self.jitter)) if self.jitter else self.delay
+
+    def queue_budget(self):
+        """
+        Bytes em trânsito numa direção antes de o proxy parar de ler: o produto
+        banda x atraso (com folga para o jitter e uma retransmissão), limitado a
+        MAX_QUEUED_BYTES. Acima disso quem envia sente o controle de fluxo do TCP.
+        """
+        if not self.bandwidth:
+            return MAX_QUEUED_BYTES
+        in_flight = self.bandwidth * (self.delay + 4 * self.jitter + MIN_RTO)
+        return int(min(MAX_QUEUED_BYTES, max(CHUNK_SIZE, in_flight)))
+
+    def __repr__(self):
+        return (f"{self.name}(atraso={self.delay * 1000:g}ms, jitter={self.jitter * 1000:g}ms, "
+                f"perda={self.loss:g}, reordenacao={self.reorder:g}, banda={self.bandwidth * 8 / 1000:g}kbit/s)")
+
+def parse_mix(text: str):
+    """Converte "lan=50,4g=30,ruim=20" em {'lan': 50.0, ...}."""
+    mix = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in PRESETS:
+            raise ValueError(f"Perfil de rede desconhecido: {name} (disponíveis: {', '.join(PRESETS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+class ConditionPicker:
+    """Escolhe as condições de cada nova conexão: fixas ou sorteadas de uma mistura de perfis."""
+    def __init__(self, fixed: NetworkConditions = None, mix: dict = None, seed: int = None):
+        self.fixed = fixed
+        self.mix = mix
+        self.rng = random.Random(seed)
+
+    def next(self):
+        if not self.mix:
+            return self.fixed
+        name = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        return NetworkConditions(nome=name, **PRESETS[name])
+
+class _Shaper:
+    """
+    Calcula o instante de entrega de cada trecho em uma direção de uma conexão,
+    combinando atraso/jitter, fila de banda e (no TCP) retransmissões.
+    """
+    def __init__(self, conditions: NetworkConditions, rng: random.Random, ordered: bool):
+        self.conditions = conditions
+        self.rng = rng
+        self.ordered = ordered
+        self.link_free_at = 0.0
+        self.last_delivery = 0.0
+
+    def delivery_time(self, nbytes: int):
+        """Retorna o instante de entrega ou None se o pacote deve ser descartado (UDP)."""
+        now = time.monotonic()
+        conditions = self.conditions
+        # Serialização no enlace limitado pela banda
+        if conditions.bandwidth:
+            self.link_free_at = max(now, self.link_free_at) + nbytes / conditions.bandwidth
+            sent = self.link_free_at
+        else:
+            sent = now
+        delivery = sent + conditions.sample_delay(self.rng)
+
+        if conditions.loss and self.rng.random() < conditions.loss:
+            if not self.ordered:
+                return None
+            # TCP: o trecho só chega depois do RTO e da retransmissão
+            delivery += max(MIN_RTO, 2 * conditions.delay) + conditions.sample_delay(self.rng)
+
+        if self.ordered:
+            delivery = max(delivery, self.last_delivery)
+        elif conditions.reorder and self.rng.random() < conditions.reorder:
+            # UDP: atrasa este pacote para que o próximo o ultrapasse
+            delivery += conditions.delay + 2 * conditions.jitter + 0.001
+        self.last_delivery = max(self.last_delivery, delivery)
+        return delivery
+
+class TcpImpairmentProxy:
+    """Proxy TCP: uma conexão com o servidor para cada conexão aceita."""
+    def __init__(self, listen_host, listen_port, target_host, target_port, picker: ConditionPicker):
+        self.listen = (listen_host, listen_port)
+        self.target = (target_host, target_port)
+        self.picker = picker
+        self.connections = 0
+
+    async def _pipe(self, reader, writer, shaper: _Shaper):
+        queue = asyncio.Queue()
+        budget = shaper.conditions.queue_budget()
+        queued = 0
+        has_room = asyncio.Event()
+        has_room.set()
+
+        async def deliver():
+            nonlocal queued
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                delivery, data = item
+                await asyncio.sleep(max(0.0, delivery - time.monotonic()))
+                writer.write(data)
+                await writer.drain()
+                queued -= len(data)
+                if queued < budget:
+                    has_room.set()
+
+        sender = asyncio.create_task(deliver())
+        try:
+            while True:
+                # Fila cheia: para de ler até os trechos em trânsito serem entregues
+                await has_room.wait()
+                data = await reader.read(CHUNK_SIZE)
+                if not data:
+                    break
+                queued += len(data)
+                if queued >= budget:
+                    has_room.clear()
+                queue.put_nowait((shaper.delivery_time(len(data)), data))
+            queue.put_nowait(None)
+            await sender
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            sender.cancel()
+            writer.close()
+
+    async def _handle(self, client_reader, client_writer):
+        conditions = self.picker.next()
+        self.connections += 1
+        try:
+            server_reader, server_writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            client_writer.close()
+            return
+        rng = random.Random(self.connections)
+        await asyncio.gather(
+            self._pipe(client_reader, server_writer, _Shaper(conditions, rng, ordered=True)),
+            self._pipe(server_reader, client_writer, _Shaper(conditions, rng, ordered=True)),
+        )
+
+    async def serve(self):
+        server = await asyncio.start_server(self._handle, *self.listen)
+        async with server:
+            await server.serve_forever()
+
+class _UdpUpstream(asyncio.DatagramProtocol):
+    """Socket do proxy para o servidor, um por cliente UDP."""
+    def __init__(self, proxy, client_addr, shaper_up, shaper_down):
+        self.proxy = proxy
+        self.client_addr = client_addr
+        self.shaper_up = shaper_up
+        self.shaper_down = shaper_down
+        self.transport = None
+        self.pending = []  # datagramas do cliente que chegaram antes do socket existir
+        self.last_seen = time.monotonic()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.last_seen = time.monotonic()
+        self.proxy.schedule(self.shaper_down, data, self.proxy.transport, self.client_addr)
+
+class UdpImpairmentProxy(asyncio.DatagramProtocol):
+    """Proxy UDP: cada endereço de cliente ganha seu próprio socket para o servidor."""
+    def __init__(self, target_host, target_port, picker: ConditionPicker):
+        self.target = (target_host, target_port)
+        self.picker = picker
+        self.transport = None
+        self.clients = {}
+        self.connections = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        asyncio.get_running_loop().call_later(UDP_PRUNE_INTERVAL, self._prune)
+
+    def _prune(self):
+        """Fecha os sockets de clientes sem datagramas há UDP_CLIENT_TIMEOUT segundos"""
+        now = time.monotonic()
+        for addr, upstream in list(self.clients.items()):
+            if now - upstream.last_seen > UDP_CLIENT_TIMEOUT:
+                del self.clients[addr]
+                if upstream.transport:
+                    upstream.transport.close()
+        asyncio.get_running_loop().call_later(UDP_PRUNE_INTERVAL, self._prune)
+
+    def schedule(self, shaper, data, transport, addr):
+        delivery = shaper.delivery_time(len(data))
+        if delivery is None:
+            return
+        loop = asyncio.get_running_loop()
+        loop.call_later(max(0.0, delivery - time.monotonic()), transport.sendto, data, addr)
+
+    def datagram_received(self, data, addr):
+        upstream = self.clients.get(addr)
+        if upstream is None:
+            upstream = self._new_client(addr)
+        upstream.last_seen = time.monotonic()
+        if upstream.transport:
+            self.schedule(upstream.shaper_up, data, upstream.transport, None)
+        elif len(upstream.pending) < UDP_PENDING_MAX:
+            upstream.pending.append(data)
+
+    def _new_client(self, addr):
+        """Registra o cliente já com a fila de espera; o socket para o servidor é criado em seguida"""
+        conditions = self.picker.next()
+        self.connections += 1
+        rng = random.Random(self.connections)
+        upstream = _UdpUpstream(self, addr, _Shaper(conditions, rng, ordered=False),
+                                _Shaper(conditions, rng, ordered=False))
+        self.clients[addr] = upstream
+        asyncio.ensure_future(self._open_upstream(upstream))
+        return upstream
+
+    async def _open_upstream(self, upstream: _UdpUpstream):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.create_datagram_endpoint(lambda: upstream, remote_addr=self.target)
+        except OSError:
+            self.clients.pop(upstream.client_addr, None)
+            return
+        for data in upstream.pending:
+            self.schedule(upstream.shaper_up, data, upstream.transport, None)
+        upstream.pending = []
+
+def _parse_address(text: str):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+async def _main(args):
+    fixed = NetworkConditions(args.atraso, args.jitter, args.perda, args.reordenacao, args.banda)
+    if args.preset:
+        fixed = NetworkConditions(nome=args.preset, **PRESETS[args.preset])
+    picker = ConditionPicker(fixed, parse_mix(args.mistura) if args.mistura else None, args.semente)
+    listen_host, listen_port = _parse_address(args.escutar)
+    target_host, target_port = _parse_address(args.destino)
+
+    description = args.mistura or repr(fixed)
+    if args.udp:
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: UdpImpairmentProxy(target_host, target_port, picker),
+                                            local_addr=(listen_host, listen_port))
+        print(f"Proxy UDP {listen_host}:{listen_port} -> {target_host}:{target_port} | {description}")
+        await asyncio.Event().wait()
+    else:
+        proxy = TcpImpairmentProxy(listen_host, listen_port, target_host, target_port, picker)
+        print(f"Proxy TCP {listen_host}:{listen_port} -> {target_host}:{target_port} | {description}")
+        await proxy.serve()
+
+def main():
+    parser = argparse.ArgumentParser(description="Proxy de degradação de rede (atraso, jitter, perda, banda)")
+    parser.add_argument("--escutar", default="127.0.0.1:6555", help="Endereço local do proxy (host:porta)")
+    parser.add_argument("--destino", default="127.0.0.1:5555", help="Endereço do servidor (host:porta)")
+    parser.add_argument("--udp", action="store_true", help="Encaminha datagramas UDP em vez de TCP")
+    parser.add_argument("--atraso", type=float, default=0.0, help="Atraso em cada direção (ms)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Desvio padrão do atraso (ms)")
+    parser.add_argument("--perda", type=float, default=0.0, help="Probabilidade de perda por trecho/pacote")
+    parser.add_argument("--reordenacao", type=float, default=0.0, help="Probabilidade de reordenação (UDP)")
+    parser.add_argument("--banda", type=float, default=0, help="Limite de banda por direção (kbit/s, 0 = sem limite)")
+    parser.add_argument("--preset", choices=list(PRESETS), help="Usa uma condição pré-definida para todas as conexões")
+    parser.add_argument("--mistura", help="Sorteia a condição de cada conexão, ex.: lan=50,4g=30,ruim=20")
+    parser.add_argument("--semente", type=int)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        print("\nProxy encerrado.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Teste de resistência (soak) da memória do servidor.
+
+Passa milhares de partidas pelo ciclo completo de vida de um jogo e confere se o
+processo do servidor volta ao tamanho de antes: RSS, threads e descritores.
+Cada rodada tem três fases, que exercitam caminhos diferentes de liberação:
+  - completas: pares que jogam até um vencedor, votam a revanche, jogam de novo e saem
+  - quedas: pares que caem no meio do jogo; as vagas ficam guardadas por RESUME_GRACE
+    segundos e depois expiram
+  - fila: jogadores sozinhos que desistem antes de aparecer um adversário
+
+A referência é medida depois de um aquecimento (rodadas iguais às do teste, para os
+pools do alocador e os caches já estarem no tamanho de regime) e de uma espera maior
+que o RESUME_GRACE do servidor. A medida final é feita depois da mesma espera.
+
+Códigos de saída: 0 = ok, 1 = o servidor não voltou à referência, 2 = erro.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import pickle
+import sys
+import time
+from datetime import datetime
+
+import psutil
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from build_info import git_commit
+from config import SERVER_HOST, SERVER_PORT, REPORTS_DIR
+from carga_async import (CODEC_AVAILABLE, PYGAME_AVAILABLE, RECV_TIMEOUT, open_session,
+                         paddle_message, raise_fd_limit, drain_messages)
+from monitor_servidor import find_server_pid, launch_server, stop_server
+
+if CODEC_AVAILABLE:
+    from carga_async import supported_codecs
+
+MODE_COMPLETE = "completa"
+MODE_DROP = "queda"
+MODE_QUEUE = "fila"
+
+REMATCHES = 1  # revanches jogadas por cada par completo antes de sair
+DROP_AFTER_STATES = 30  # estados recebidos antes de derrubar a conexão (meio segundo de jogo)
+QUEUE_STATES = 5  # estados recebidos por um jogador sozinho antes de desistir
+MATCH_TIMEOUT = 60.0  # segundos máximos de um par completo (countdown + partida + revanche)
+SAMPLE_INTERVAL = 0.5
+DEFAULT_SETTLE = 20.0  # precisa ser maior que o RESUME_GRACE do servidor (15 s)
+DEFAULT_RSS_TOLERANCE = 0.05
+DEFAULT_RSS_SLACK_MB = 4.0
+
+class ServerMemory:
+    """Amostras de RSS, threads e descritores do processo do servidor"""
+    def __init__(self, pid: int):
+        self.process = psutil.Process(pid)
+        self.peak_rss = 0
+
+    def read(self):
+        with self.process.oneshot():
+            rss = self.process.memory_info().rss
+            reading = {
+                "rss_mb": rss / 2**20,
+                "threads": self.process.num_threads(),
+                "fds": self.process.num_fds() if hasattr(self.process, "num_fds") else self.process.num_handles(),
+            }
+        self.peak_rss = max(self.peak_rss, rss)
+        return reading
+
+    async def sample(self):
+        """Acompanha o pico de RSS enquanto as rodadas rodam"""
+        while True:
+            self.read()
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+async def run_player(host: str, port: int, mode: str, name: str, compress: bool):
+    """
+    Um jogador do ciclo: responde cada estado com a raquete parada num canto (a bola
+    acaba passando) e, conforme o modo, vota a revanche, cai ou desiste.
+    Retorna o número de partidas que o jogador viu terminar.
+    """
+    hello = {"name": name}
+    if compress:
+        hello["compress"] = supported_codecs()
+    reader, writer, welcome, pending, decompressor = await open_session(host, port, hello)
+    try:
+        if "error" in welcome:
+            raise ConnectionError(f"handshake recusado: {welcome['error']}")
+        player_id = welcome["player_id"]
+        paddle = paddle_message(player_id, 0)
+        buffer = bytearray(decompressor.decompress(pending) if decompressor else pending)
+        received = finished = 0
+        voted = False
+        while True:
+            messages = drain_messages(buffer)
+            if not messages:
+                data = await asyncio.wait_for(reader.read(65536), RECV_TIMEOUT)
+                if not data:
+                    raise ConnectionError("servidor fechou a conexão")
+                buffer += decompressor.decompress(data) if decompressor else data
+                continue
+            for state, _ in messages:
+                received += 1
+                if mode == MODE_DROP and received >= DROP_AFTER_STATES:
+                    writer.transport.abort()  # queda sem aviso, como um cabo desconectado
+                    return finished
+                if mode == MODE_QUEUE and received >= QUEUE_STATES:
+                    writer.write(pickle.dumps("quit"))
+                    return finished
+                reply = paddle
+                if state["winner_id"] is None:
+                    voted = False
+                elif not voted:
+                    voted = True
+                    finished += 1
+                    if finished > REMATCHES:
+                        writer.write(pickle.dumps("quit"))
+                        return finished
+                    reply = pickle.dumps("play_again")
+                writer.write(reply)
+            await writer.drain()
+    finally:
+        writer.close()
+
+async def run_round(host: str, port: int, pairs: int, drops: int, queued: int, compress: bool, totals: dict):
+    """Uma rodada: pares completos em paralelo, depois pares que caem e por fim a fila (um por vez)"""
+    async def guarded(mode: str, name: str, timeout: float):
+        try:
+            finished = await asyncio.wait_for(run_player(host, port, mode, name, compress), timeout)
+            totals["partidas"] += finished
+            totals[mode] += 1
+        except (asyncio.TimeoutError, ConnectionError, OSError, EOFError, pickle.UnpicklingError) as e:
+            totals["falhas"] += 1
+            totals["erros"][type(e).__name__] = totals["erros"].get(type(e).__name__, 0) + 1
+
+    await asyncio.gather(*(guarded(MODE_COMPLETE, f"Resiste{i}", MATCH_TIMEOUT) for i in range(2 * pairs)))
+    await asyncio.gather(*(guarded(MODE_DROP, f"Cai{i}", MATCH_TIMEOUT) for i in range(2 * drops)))
+    # Sozinhos e em sequência: dois jogadores da fila ao mesmo tempo formariam um par
+    for i in range(queued):
+        await guarded(MODE_QUEUE, f"Desiste{i}", MATCH_TIMEOUT)
+
+async def run_soak(host: str, port: int, memory: ServerMemory, matches: int, parallel: int,
+                   warmup: int, settle: float, compress: bool):
+    """Aquecimento, referência, rodadas e medida final. Retorna (referência, final, totais, segundos)."""
+    drops = max(1, parallel // 10)
+    queued = max(1, parallel // 25)
+
+    warmup_totals = _new_totals()
+    for _ in range(warmup):
+        await run_round(host, port, parallel, drops, queued, compress, warmup_totals)
+    print(f"Aquecimento: {warmup} rodada(s), {warmup_totals['partidas']} partidas vistas. "
+          f"Esperando {settle:.0f}s antes da referência...")
+    await asyncio.sleep(settle)
+    baseline = memory.read()
+    memory.peak_rss = 0
+    print(f"Referência: RSS {baseline['rss_mb']:.1f} MB | threads {baseline['threads']} | fds {baseline['fds']}")
+
+    totals = _new_totals()
+    sampler = asyncio.get_running_loop().create_task(memory.sample())
+    start = time.time()
+    rounds = 0
+    try:
+        while totals[MODE_COMPLETE] < 2 * matches:
+            pairs = min(parallel, matches - totals[MODE_COMPLETE] // 2)
+            await run_round(host, port, pairs, drops, queued, compress, totals)
+            rounds += 1
+            current = memory.read()
+            print(f"Rodada {rounds}: {totals[MODE_COMPLETE] // 2}/{matches} pares completos | "
+                  f"{totals[MODE_DROP] // 2} pares caídos | {totals[MODE_QUEUE]} desistências | "
+                  f"falhas {totals['falhas']} | RSS {current['rss_mb']:.1f} MB | threads {current['threads']}")
+            if totals["falhas"] > matches:
+                raise RuntimeError(f"falhas demais ({totals['falhas']}): {totals['erros']}")
+    finally:
+        sampler.cancel()
+    elapsed = time.time() - start
+
+    print(f"Esperando {settle:.0f}s para as vagas guardadas expirarem...")
+    await asyncio.sleep(settle)
+    return baseline, memory.read(), totals, elapsed
+
+def _new_totals():
+    return {"partidas": 0, MODE_COMPLETE: 0, MODE_DROP: 0, MODE_QUEUE: 0, "falhas": 0, "erros": {}}
+
+def check(baseline: dict, final: dict, rss_tolerance: float, rss_slack_mb: float):
+    """Lista de problemas (vazia se o servidor voltou à referência)"""
+    problems = []
+    rss_limit = baseline["rss_mb"] * (1 + rss_tolerance) + rss_slack_mb
+    if final["rss_mb"] > rss_limit:
+        problems.append(f"RSS {final['rss_mb']:.1f} MB acima do limite de {rss_limit:.1f} MB")
+    for key, label in (("threads", "threads"), ("fds", "descritores")):
+        if final[key] > baseline[key]:
+            problems.append(f"{final[key] - baseline[key]} {label} a mais que na referência")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de resistência da memória do servidor Air Hockey")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--porta", type=int, default=SERVER_PORT)
+    parser.add_argument("--iniciar-servidor", action="store_true",
+                        help="Inicia o server.py em um subprocesso (senão usa o que escuta na porta)")
+    parser.add_argument("--pid", type=int, help="PID do servidor (padrão: o processo escutando na porta)")
+    parser.add_argument("--log-servidor", help="Arquivo para o log do servidor iniciado, com os relatórios de memória")
+    parser.add_argument("--partidas", type=int, default=1000, help="Pares completos (cada um joga 1 + revanches partidas)")
+    parser.add_argument("--paralelas", type=int, default=50, help="Pares completos simultâneos em cada rodada")
+    parser.add_argument("--aquecimento", type=int, default=2, help="Rodadas antes da referência")
+    parser.add_argument("--espera", type=float, default=DEFAULT_SETTLE,
+                        help="Segundos de espera antes de cada medida (maior que o RESUME_GRACE)")
+    parser.add_argument("--tolerancia", type=float, default=DEFAULT_RSS_TOLERANCE,
+                        help="Crescimento máximo do RSS em relação à referência (fração)")
+    parser.add_argument("--folga-mb", type=float, default=DEFAULT_RSS_SLACK_MB,
+                        help="Crescimento máximo do RSS somado à tolerância (MB)")
+    parser.add_argument("--comprimir", action="store_true",
+                        help="Os jogadores oferecem compressão dos estados no handshake (snapshot_codec.py)")
+    parser.add_argument("--saida", help="Arquivo JSON do resultado (padrão: reports/)")
+    args = parser.parse_args()
+    if not PYGAME_AVAILABLE:
+        parser.error("o teste precisa do pygame para mandar a raquete como o cliente")
+    if args.comprimir and not CODEC_AVAILABLE:
+        parser.error("--comprimir precisa do pygame e do snapshot_codec.py")
+
+    raise_fd_limit()
+    server_process = log = None
+    try:
+        if args.iniciar_servidor:
+            env = {}
+            if args.log_servidor:
+                log = open(args.log_servidor, "w", encoding="utf-8")
+                env["MEMORY_REPORT_INTERVAL"] = str(args.espera)
+            server_process = launch_server(args.host, args.porta, env=env, output=log)
+        pid = server_process.pid if server_process else args.pid or find_server_pid(args.porta)
+        if pid is None:
+            print(f"Erro: nenhum servidor escutando na porta {args.porta} (use --pid ou --iniciar-servidor)")
+            return 2
+
+        print(f"Teste de resistência contra {args.host}:{args.porta} (PID {pid}): {args.partidas} pares, "
+              f"{args.paralelas} por rodada")
+        memory = ServerMemory(pid)
+        baseline, final, totals, elapsed = asyncio.run(run_soak(
+            args.host, args.porta, memory, args.partidas, args.paralelas, args.aquecimento,
+            args.espera, args.comprimir))
+        peak_mb = memory.peak_rss / 2**20
+    except (RuntimeError, OSError, psutil.Error) as e:
+        print(f"Erro: {e}")
+        return 2
+    finally:
+        if server_process:
+            stop_server(server_process)
+        if log:
+            log.close()
+
+    problems = check(baseline, final, args.tolerancia, args.folga_mb)
+    result = {
+        "teste": "resistencia",
+        "commit": git_commit(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "servidor": f"{args.host}:{args.porta}",
+        "pares": args.partidas,
+        "paralelas": args.paralelas,
+        "segundos": elapsed,
+        "totais": totals,
+        "referencia": baseline,
+        "final": final,
+        "rss_pico_mb": peak_mb,
+        # Custo aproximado de uma partida em andamento: o pico dividido pelos pares simultâneos
+        "kb_por_partida_simultanea": (peak_mb - baseline["rss_mb"]) * 1024 / args.paralelas,
+        "problemas": problems,
+    }
+
+    print(f"\n{totals['partidas']} partidas vistas em {elapsed:.0f}s | {totals[MODE_DROP] // 2} pares caídos | "
+          f"{totals[MODE_QUEUE]} desistências | falhas: {totals['falhas']} {totals['erros'] or ''}")
+    print(f"RSS: referência {baseline['rss_mb']:.1f} MB | pico {peak_mb:.1f} MB | final {final['rss_mb']:.1f} MB "
+          f"(~{result['kb_por_partida_simultanea']:.0f} KB por partida simultânea)")
+    print(f"Threads: {baseline['threads']} -> {final['threads']} | descritores: {baseline['fds']} -> {final['fds']}")
+    for problem in problems:
+        print(f"PROBLEMA: {problem}")
+    print("Servidor voltou à referência" if not problems else "Servidor NÃO voltou à referência")
+
+    output = args.saida
+    if not output:
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(REPORTS_DIR, f"resistencia_{result['commit']}_{timestamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Resultado salvo em: {output}")
+
+    return 0 if not problems else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
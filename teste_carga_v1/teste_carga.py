@@ -8,7 +8,6 @@ import sys
 from datetime import datetime
 
 # Importações para Análise e Gráficos 
-import psutil
 import matplotlib.pyplot as plt
 
 # Configuração Inicial
@@ -34,82 +33,124 @@ except ImportError:
     print("Pygame não encontrado. Usando simulação de dados simplificada.")
     PYGAME_AVAILABLE = False
 
+from carga_async import run_load as run_async_load, split_first_message
+from metricas import BotProbe, LoadMetrics
+from perfis_bot import DEFAULT_MIX, PLAY_AGAIN, QUIT, RECONNECT, TrackingProfile, assign_profiles, paddle_y, parse_mix
+from monitor_servidor import ServerProcessMonitor, find_server_pid, launch_server, stop_server
+
 # Classe de simulação de cliente
 class GameClientSimulator:
-    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, client_id=None):
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, client_id=None, profile=None):
         self.host = host
         self.port = port
         self.client_id = client_id or f"bot_{random.randint(1000, 9999)}"
+        self.profile = profile or TrackingProfile(random.Random())
         self.connected = False
         self.socket = None
         self.player_name = f"TestBot_{self.client_id}"
+        self.metrics = LoadMetrics()
 
-    def connect(self):
-        """Tenta conectar o cliente ao servidor."""
+    def connect(self, hello):
+        """Conecta ao servidor e faz o handshake. Retorna (resposta, bytes restantes) ou None."""
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.settimeout(10.0)
             self.socket.connect((self.host, self.port))
+            self.socket.send(pickle.dumps(hello))
+            welcome, pending = split_first_message(self.socket.recv(4096))
             self.connected = True
-            return True
-        except (socket.timeout, ConnectionRefusedError, OSError) as e:
-            return False
+            return welcome, pending
+        except (socket.timeout, ConnectionRefusedError, OSError, EOFError, pickle.UnpicklingError) as e:
+            if self.socket:
+                self.socket.close()
+            return None
 
     def simulate_game_session(self, duration=60):
-        """Simula uma sessão completa de jogo, seguindo o protocolo."""
-        if not self.connect():
+        """Simula uma sessão completa de jogo, seguindo o protocolo e o perfil do bot."""
+        start_time = time.time()
+        time.sleep(self.profile.join_delay(duration))
+        handshake = self.connect({"name": self.player_name})
+        if handshake is None:
             return False, 0, 0
 
-        start_time = time.time()
         messages_sent = 0
         messages_received = 0
-        player_id = None
+        welcome, pending = handshake
+        if "player_id" not in welcome:
+            # Partida recusada pelo servidor (sobrecarga ou drenagem)
+            self.metrics.count(f"erro_{welcome.get('error')}")
+            self.socket.close()
+            self.connected = False
+            return False, 0, 0
+        player_id, token = welcome["player_id"], welcome["token"]
+        probe = BotProbe(self.metrics)
+        failed = False
 
         try:
-            #  Receber ID do jogador
-            player_id_data = self.socket.recv(2048)
-            if player_id_data:
-                player_id = pickle.loads(player_id_data)
-
-            # Enviar nome do jogador
-            self.socket.send(pickle.dumps(self.player_name))
-
             # Loop principal de jogo
             while self.connected and time.time() - start_time < duration:
                 # Receber estado do jogo
-                data = self.socket.recv(4096)
+                data = pending or self.socket.recv(4096)
+                pending = b""
                 if not data: break
                 game_state = pickle.loads(data)
                 messages_received += 1
-
-                # Enviar posição do paddle (simulada)
-                paddle_x = random.randint(100, 860)
-                if PYGAME_AVAILABLE and player_id is not None:
-                    paddle_y = 580 if player_id == 0 else 20
-                    my_paddle = pygame.Rect(paddle_x, paddle_y, 120, 10)
-                    self.socket.send(pickle.dumps(my_paddle))
+                probe.snapshot_received(game_state, player_id, len(data))
+
+                # Decide a próxima entrada de acordo com o perfil
+                action, paddle_x = self.profile.on_state(game_state, player_id, time.time() - start_time)
+                if action == QUIT:
+                    self.metrics.count("saidas_apos_oponente" if probe.opponent_left else "abandonos")
+                    self.socket.send(pickle.dumps("quit"))
+                    break
+                if action == RECONNECT:
+                    # Derruba a conexão e retoma a sessão com o token
+                    self.metrics.count("quedas")
+                    self.socket.close()
+                    handshake = self.connect({"resume": token})
+                    if handshake is None or "player_id" not in handshake[0]:
+                        self.metrics.count("retomadas_recusadas")
+                        break
+                    self.metrics.count("retomadas")
+                    pending = handshake[1]
+                    continue
+                if action == PLAY_AGAIN:
+                    self.metrics.count("votos_revanche")
+                    message = pickle.dumps("play_again")
+                elif PYGAME_AVAILABLE and player_id is not None:
+                    message = pickle.dumps(pygame.Rect(paddle_x, paddle_y(player_id), 120, 10))
                 else:
-                    paddle_data = {'x': paddle_x, 'y': 580 if player_id == 0 else 20}
-                    self.socket.send(pickle.dumps(paddle_data))
+                    message = pickle.dumps({'x': paddle_x, 'y': paddle_y(player_id)})
+                self.socket.send(message)
+                probe.input_sent(paddle_x, len(message))
                 messages_sent += 1
 
                 time.sleep(1/60) # 60 FPS
-
-        except (pickle.UnpicklingError, ConnectionAbortedError, ConnectionResetError):
-            self.connected = False
+            else:
+                # Fim da sessão: sai como um jogador que fecha a janela, respondendo ao
+                # próximo estado para não juntar o "quit" com a última raquete
+                self.socket.recv(4096)
+                self.socket.send(pickle.dumps("quit"))
+
+        except (pickle.UnpicklingError, EOFError, KeyError, OSError):
+            # Timeout, conexão derrubada (BrokenPipe, reset) ou estado inesperado do servidor
+            failed = True
         finally:
+            probe.finish()
             if self.socket:
                 self.socket.close()
             self.connected = False
 
-        return True, messages_sent, messages_received
+        return not failed, messages_sent, messages_received
 
 
 # Classe gerenciadora do teste de carga 
 class LoadTestManager:
-    def __init__(self, host=SERVER_HOST, port=SERVER_PORT):
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, server_pid=None):
         self.host = host
         self.port = port
+        # Sem PID, os recursos são medidos na máquina inteira
+        self.server_pid = server_pid
         self.results = {
             'successful_clients': 0,
             'failed_clients': 0,
@@ -118,7 +159,6 @@ class LoadTestManager:
         }
         self.test_start_time = None
         self.test_report = []
-        self.monitoring_active = False
 
     def add_to_report(self, message):
         """Adiciona uma mensagem ao log do teste."""
@@ -133,28 +173,49 @@ class LoadTestManager:
             return
 
         clients = [d['num_clients'] for d in self.results['step_details']]
-        avg_cpu = [d['avg_cpu'] for d in self.results['step_details']]
-        max_cpu = [d['max_cpu'] for d in self.results['step_details']]
-        avg_mem = [d['avg_mem'] for d in self.results['step_details']]
+        resources = [d['recursos'] for d in self.results['step_details']]
         success_rate = [d['success_rate'] for d in self.results['step_details']]
+        latency = [d['metricas']['latencia_ms'] for d in self.results['step_details']]
+        jitter_p99 = [d['metricas']['jitter_ms']['p99'] for d in self.results['step_details']]
 
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10), sharex=True)
+        fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(12, 14), sharex=True)
         fig.suptitle(f'Análise de Performance - Teste de Carga ({test_type.replace("_", " ").title()})', fontsize=16)
 
-        ax1.plot(clients, avg_cpu, 'o-', label='CPU Média (%)', color='royalblue')
-        ax1.plot(clients, max_cpu, 's--', label='CPU Pico (%)', color='darkorange', alpha=0.8)
-        ax1.plot(clients, avg_mem, '^-', label='Memória Média (%)', color='forestgreen')
-        ax1.set_ylabel("Uso de Recurso (%)")
-        ax1.set_title("Consumo de Recursos vs. Clientes Simultâneos")
-        ax1.legend()
+        ax1.plot(clients, [r['cpu_media'] for r in resources], 'o-', label='CPU Média (%)', color='royalblue')
+        ax1.plot(clients, [r['cpu_pico'] for r in resources], 's--', label='CPU Pico (%)', color='darkorange', alpha=0.8)
+        if resources[0]['escopo'] == 'processo':
+            ax1.plot(clients, [r['cpu_thread_media'] for r in resources], 'v:', label='CPU Média por Thread (%)', color='purple')
+            ax1.set_ylabel("CPU do Servidor (% de um núcleo)")
+            ax1.set_title("Consumo de Recursos do Processo do Servidor vs. Clientes Simultâneos")
+            ax1b = ax1.twinx()
+            ax1b.plot(clients, [r['rss_pico_mb'] for r in resources], '^-', label='RSS Pico (MB)', color='forestgreen')
+            ax1b.plot(clients, [r['threads_pico'] for r in resources], 'x-', label='Threads (pico)', color='gray')
+            ax1b.set_ylabel("RSS (MB) / Threads")
+            ax1b.legend(loc='upper right')
+            ax1.legend(loc='upper left')
+        else:
+            ax1.plot(clients, [r['mem_media'] for r in resources], '^-', label='Memória Média (%)', color='forestgreen')
+            ax1.set_ylabel("Uso de Recurso (%)")
+            ax1.set_title("Consumo de Recursos (Máquina Inteira) vs. Clientes Simultâneos")
+            ax1.legend()
         ax1.grid(True, linestyle='--', alpha=0.6)
 
         ax2.plot(clients, success_rate, 'o-', label='Taxa de Sucesso', color='crimson')
-        ax2.set_xlabel("Número de Clientes Simultâneos")
         ax2.set_ylabel("Taxa de Sucesso (%)")
         ax2.set_title("Estabilidade do Servidor vs. Clientes Simultâneos")
         ax2.set_ylim(0, 105)
         ax2.grid(True, linestyle='--', alpha=0.6)
+
+        ax3.plot(clients, [l['p50'] for l in latency], 'o-', label='Latência p50', color='royalblue')
+        ax3.plot(clients, [l['p95'] for l in latency], 's-', label='Latência p95', color='darkorange')
+        ax3.plot(clients, [l['p99'] for l in latency], '^-', label='Latência p99', color='crimson')
+        ax3.plot(clients, [l['max'] for l in latency], 'x:', label='Latência máx.', color='gray', alpha=0.7)
+        ax3.plot(clients, jitter_p99, 'd--', label='Jitter p99', color='purple')
+        ax3.set_xlabel("Número de Clientes Simultâneos")
+        ax3.set_ylabel("Tempo (ms)")
+        ax3.set_title("Latência Entrada->Eco e Jitter de Snapshots vs. Clientes Simultâneos")
+        ax3.legend()
+        ax3.grid(True, linestyle='--', alpha=0.6)
         
         plt.tight_layout(rect=[0, 0.03, 1, 0.95])
 
@@ -186,63 +247,104 @@ class LoadTestManager:
             for step_data in self.results['step_details']:
                 f.write(f"Etapa com {step_data['num_clients']} Clientes:\n")
                 f.write(f"  - Sucesso: {step_data['success_rate']:.1f}% ({step_data['successful_clients']}/{step_data['num_clients']})\n")
-                f.write(f"  - Recursos (na máquina local):\n")
-                f.write(f"    - CPU Média: {step_data['avg_cpu']:.1f}% | CPU Pico: {step_data['max_cpu']:.1f}%\n")
-                f.write(f"    - Memória Média: {step_data['avg_mem']:.1f}%\n\n")
+                resources = step_data['recursos']
+                if resources['escopo'] == 'processo':
+                    f.write(f"  - Recursos (processo do servidor, PID {resources['pid']}):\n")
+                    f.write(f"    - CPU Média: {resources['cpu_media']:.1f}% | CPU Pico: {resources['cpu_pico']:.1f}% (100% = um núcleo)\n")
+                    f.write(f"    - RSS Médio: {resources['rss_medio_mb']:.1f} MB | RSS Pico: {resources['rss_pico_mb']:.1f} MB\n")
+                    f.write(f"    - Threads: {resources['threads_media']:.0f} (média) | {resources['threads_pico']} (pico) | "
+                            f"Descritores abertos (pico): {resources['fds_pico']}\n")
+                    f.write(f"    - Trocas de contexto/s: {resources['ctx_voluntarias_por_s']:.0f} voluntárias | "
+                            f"{resources['ctx_involuntarias_por_s']:.0f} involuntárias\n")
+                    top = ", ".join(f"TID {tid}: {cpu:.1f}%" for tid, cpu in resources['cpu_thread_top'])
+                    f.write(f"    - CPU por thread: {resources['cpu_thread_media']:.2f}% (média) | Mais ocupadas: {top}\n")
+                else:
+                    f.write(f"  - Recursos (na máquina local):\n")
+                    f.write(f"    - CPU Média: {resources['cpu_media']:.1f}% | CPU Pico: {resources['cpu_pico']:.1f}%\n")
+                    f.write(f"    - Memória Média: {resources['mem_media']:.1f}%\n")
+                metrics = step_data['metricas']
+                f.write(f"  - Rede (medida pelos bots):\n")
+                for label, key in (("Latência entrada->eco", 'latencia_ms'),
+                                   ("Intervalo entre snapshots", 'intervalo_ms'),
+                                   ("Jitter de snapshots", 'jitter_ms')):
+                    values = metrics[key]
+                    f.write(f"    - {label}: p50 {values['p50']:.1f} ms | p95 {values['p95']:.1f} ms | "
+                            f"p99 {values['p99']:.1f} ms | max {values['max']:.1f} ms\n")
+                f.write(f"    - Snapshots/s por bot: {metrics['taxa_snapshots']:.1f} (alvo {metrics['taxa_alvo']})\n")
+                f.write(f"    - Bytes/s por bot: {metrics['bytes_por_segundo_rx']:.0f} recebidos | "
+                        f"{metrics['bytes_por_segundo_tx']:.0f} enviados\n")
+                events = ", ".join(f"{name}: {count}" for name, count in sorted(metrics['eventos'].items()))
+                f.write(f"  - Ciclo de vida das partidas: {events or 'nenhum evento'}\n\n")
             f.write("\nLOG DETALHADO DA EXECUÇÃO:\n" + "-" * 40 + "\n")
             for line in self.test_report:
                 f.write(line + "\n")
         
         self.add_to_report(f"Relatório de texto salvo em: {filepath}")
 
-    def run_gradual_load_test(self, max_clients, step, step_duration):
-        """Executa o teste de carga gradual com monitoramento de recursos."""
+    def run_gradual_load_test(self, max_clients, step, step_duration, mode="threads", processes=1,
+                              profile_mix=DEFAULT_MIX):
+        """
+        Executa o teste de carga gradual com monitoramento de recursos.
+        mode="threads" usa uma thread por cliente; mode="async" usa o gerador asyncio
+        (carga_async.py), opcionalmente dividido em vários processos.
+        profile_mix define a proporção dos perfis de bot (perfis_bot.py).
+        """
         self.test_start_time = time.time()
         
         if max_clients % 2 != 0: max_clients += 1
         if step % 2 != 0: step += 1
         
         self.add_to_report(f"🚀 Iniciando teste de carga gradual com monitoramento...")
+        self.add_to_report(f"Perfis de bot: {profile_mix}")
         
         for num_clients in range(step, max_clients + 1, step):
             self.add_to_report(f"\nEtapa: {num_clients} clientes por {step_duration}s...")
             step_results = {'successful_clients': 0, 'failed_clients': 0}
-            resource_readings = {'cpu': [], 'mem': []}
-            
-            def _monitor_resources(readings_dict):
-                while self.monitoring_active:
-                    readings_dict['cpu'].append(psutil.cpu_percent(interval=None))
-                    readings_dict['mem'].append(psutil.virtual_memory().percent)
-                    time.sleep(1)
-
-            self.monitoring_active = True
-            monitor_thread = threading.Thread(target=_monitor_resources, args=(resource_readings,))
-            monitor_thread.start()
-
-            def client_worker(client_id):
-                simulator = GameClientSimulator(self.host, self.port, client_id)
-                success, _, _ = simulator.simulate_game_session(step_duration)
-                if success: step_results['successful_clients'] += 1
-                else: step_results['failed_clients'] += 1
-            
-            threads = [threading.Thread(target=client_worker, args=(f"bot_{i}",)) for i in range(num_clients)]
-            for t in threads: t.start()
-            for t in threads: t.join()
-
-            self.monitoring_active = False
-            monitor_thread.join()
-            
-            avg_cpu = sum(resource_readings['cpu']) / len(resource_readings['cpu']) if resource_readings['cpu'] else 0
-            max_cpu = max(resource_readings['cpu']) if resource_readings['cpu'] else 0
-            avg_mem = sum(resource_readings['mem']) / len(resource_readings['mem']) if resource_readings['mem'] else 0
+            step_metrics = LoadMetrics()
+            monitor = ServerProcessMonitor(self.server_pid)
+            monitor.start()
+
+            if mode == "async":
+                async_stats = run_async_load(self.host, self.port, num_clients, step_duration, processes,
+                                             mix=profile_mix)
+                step_results['successful_clients'] = async_stats['successful_clients']
+                step_results['failed_clients'] = async_stats['failed_clients']
+                step_metrics.merge(LoadMetrics.from_dict(async_stats['metricas']))
+            else:
+                simulators = []
+                profiles = assign_profiles(num_clients, parse_mix(profile_mix))
+                def client_worker(client_id, profile):
+                    simulator = GameClientSimulator(self.host, self.port, client_id, profile)
+                    simulators.append(simulator)
+                    success, _, _ = simulator.simulate_game_session(step_duration)
+                    if success: step_results['successful_clients'] += 1
+                    else: step_results['failed_clients'] += 1
+                
+                threads = [threading.Thread(target=client_worker, args=(f"bot_{i}", profile))
+                           for i, profile in enumerate(profiles)]
+                for t in threads: t.start()
+                for t in threads: t.join()
+                for simulator in simulators:
+                    step_metrics.merge(simulator.metrics)
+
+            resources = monitor.stop()
             success_rate = (step_results['successful_clients'] / num_clients) * 100
             
             self.add_to_report(f"  Sucesso: {success_rate:.1f}% ({step_results['successful_clients']}/{num_clients})")
-            self.add_to_report(f"  CPU: {avg_cpu:.1f}% (Média), {max_cpu:.1f}% (Pico) | Memória: {avg_mem:.1f}% (Média)")
+            if resources['escopo'] == 'processo':
+                self.add_to_report(f"  Servidor: CPU {resources['cpu_media']:.1f}% (Média), {resources['cpu_pico']:.1f}% (Pico) | "
+                                   f"RSS {resources['rss_pico_mb']:.1f} MB | Threads {resources['threads_pico']}")
+            else:
+                self.add_to_report(f"  CPU: {resources['cpu_media']:.1f}% (Média), {resources['cpu_pico']:.1f}% (Pico) | "
+                                   f"Memória: {resources['mem_media']:.1f}% (Média)")
+            metrics_summary = step_metrics.summary()
+            latency = metrics_summary['latencia_ms']
+            self.add_to_report(f"  Latência: p50 {latency['p50']:.1f} ms | p95 {latency['p95']:.1f} ms | "
+                               f"p99 {latency['p99']:.1f} ms | Snapshots/s: {metrics_summary['taxa_snapshots']:.1f}")
 
             self.results['step_details'].append({
                 'num_clients': num_clients, 'successful_clients': step_results['successful_clients'],
-                'success_rate': success_rate, 'avg_cpu': avg_cpu, 'max_cpu': max_cpu, 'avg_mem': avg_mem
+                'success_rate': success_rate, 'recursos': resources, 'metricas': metrics_summary
             })
             self.results['successful_clients'] += step_results['successful_clients']
             self.results['failed_clients'] += step_results['failed_clients']
@@ -263,26 +365,51 @@ def main():
     print("Simulador de Carga para Servidor de Jogo com Análise de Performance 🎮")
     print("=" * 60)
     
-    manager = LoadTestManager()
-    
     print(f"Servidor configurado: {SERVER_HOST}:{SERVER_PORT}")
-    print("IMPORTANTE: Certifique-se de que o servidor de jogo está rodando!")
+    server_process = None
     
     try:
+        launch = input("Iniciar o servidor localmente pelo teste? (s/N): ").strip().lower() == "s"
+        if launch:
+            server_process = launch_server(SERVER_HOST, SERVER_PORT)
+            server_pid = server_process.pid
+            print(f"Servidor iniciado (PID {server_pid}).")
+        else:
+            print("IMPORTANTE: Certifique-se de que o servidor de jogo está rodando!")
+            pid_text = input("PID do servidor (vazio = detectar pela porta): ").strip()
+            server_pid = int(pid_text) if pid_text else find_server_pid(SERVER_PORT)
+            if server_pid:
+                print(f"Monitorando o processo do servidor (PID {server_pid}).")
+            else:
+                print("AVISO: PID do servidor não encontrado. Os recursos serão medidos na máquina inteira.")
+        manager = LoadTestManager(server_pid=server_pid)
+
         max_clients = int(input(f"Máximo de clientes (padrão {DEFAULT_MAX_CLIENTS}): ") or DEFAULT_MAX_CLIENTS)
         step = int(input(f"Incremento por etapa (padrão {DEFAULT_STEP}): ") or DEFAULT_STEP)
         step_duration = int(input(f"Duração de cada etapa/seg (padrão {DEFAULT_STEP_DURATION}): ") or DEFAULT_STEP_DURATION)
+        mode = input("Modo de geração de carga - threads ou async (padrão threads): ").strip().lower() or "threads"
+        processes = 1
+        if mode == "async":
+            processes = int(input("Número de processos para o modo async (padrão 1): ") or 1)
+        elif mode != "threads":
+            raise ValueError(mode)
+        profile_mix = input(f"Mistura de perfis de bot (padrão {DEFAULT_MIX}): ").strip() or DEFAULT_MIX
+        parse_mix(profile_mix)
         
         print(f"\n🚀 Iniciando teste: 0 até {max_clients} clientes, incremento de {step}, {step_duration}s por etapa.")
         print("Pressione Ctrl+C para interromper o teste a qualquer momento.\n")
         
-        manager.run_gradual_load_test(max_clients, step, step_duration)
+        manager.run_gradual_load_test(max_clients, step, step_duration, mode, processes, profile_mix)
     
     except KeyboardInterrupt:
         print("\n\nTeste interrompido pelo usuário.")
-    except ValueError:
-        print("\nEntrada inválida. Por favor, insira apenas números.")
+    except ValueError as e:
+        print(f"\nEntrada inválida ({e}). Use números, 'threads' ou 'async' para o modo e perfis conhecidos.")
+    except RuntimeError as e:
+        print(f"\nErro ao iniciar o servidor: {e}")
     finally:
+        if server_process:
+            stop_server(server_process)
         print("\nPrograma finalizado.")
 
 if __name__ == "__main__":